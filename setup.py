@@ -1,4 +1,18 @@
 import setuptools
+import sys
+
+from setuptools.command.build_py import build_py
+
+
+class BuildPy(build_py):
+    """
+    Leave out the asyncio client on Pythons that cannot compile async generators
+    """
+    def find_package_modules(self, package, package_dir):
+        modules = build_py.find_package_modules(self, package, package_dir)
+        if sys.version_info < (3, 6):
+            modules = [module for module in modules if module[:2] != ('viptela_python', 'aio')]
+        return modules
 
 with open("README.md", "r") as fh:
     long_description = fh.read()
@@ -18,6 +32,8 @@ setuptools.setup(
         'Intended Audience :: System Administrators',
         'Intended Audience :: Developers',
         'Programming Language :: Python :: 2.7',
+        'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3.6',
         'License :: OSI Approved :: GNU General Public License v3 or later'
         ' (GPLv3+)',
         'Operating System :: OS Independent',
@@ -26,7 +42,13 @@ setuptools.setup(
     ),
     install_requires=[
         "requests",
+        "futures; python_version < '3'",
     ],
-    python_requires='~=2.7'
+    extras_require={
+        'async': ["aiohttp; python_version >= '3.6'"],
+        'columnar': ['numpy'],
+    },
+    python_requires='>=2.7',
+    cmdclass={'build_py': BuildPy},
 )
 
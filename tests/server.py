@@ -0,0 +1,169 @@
+import json
+import threading
+
+from collections import namedtuple
+from types import GeneratorType
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qsl, urlsplit
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qsl, urlsplit
+
+from viptela_python.viptela import Viptela
+
+# Request received by FakeVManage, path is without /dataservice and query string
+FakeRequest = namedtuple('FakeRequest', ['method', 'path', 'query', 'headers', 'body'])
+
+
+def json_body(request):
+    """
+    Decode the JSON body of a FakeRequest
+    :param request: FakeRequest
+    :return: decoded document
+    """
+    return json.loads(request.body.decode('utf-8'))
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _handle(self):
+        fake = self.server.fake
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        url = urlsplit(self.path)
+        path = url.path[len('/dataservice'):] if url.path.startswith('/dataservice') else url.path
+        request = FakeRequest(self.command, path, dict(parse_qsl(url.query)), dict(self.headers), body)
+        with fake.lock:
+            fake.requests.append(request)
+            handler = fake.routes.get((self.command, path))
+        if handler is None:
+            reply = (404, {'error': {'message': 'Not found', 'details': path}})
+        elif callable(handler):
+            reply = handler(request)
+        else:
+            reply = handler
+        self._reply(reply)
+
+    def _reply(self, reply):
+        if not isinstance(reply, tuple):
+            reply = (200, reply)
+        status, body = reply[:2]
+        headers = dict(reply[2]) if len(reply) > 2 else dict()
+        if isinstance(body, GeneratorType):
+            self._reply_chunked(status, headers, body)
+            return
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body)
+            headers.setdefault('Content-Type', 'application/json')
+        if not isinstance(body, bytes):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _reply_chunked(self, status, headers, chunks):
+        # A generator body is sent chunk by chunk, so it can sleep between chunks
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for chunk in chunks:
+            if chunk:
+                self.wfile.write('{0:x}\r\n'.format(len(chunk)).encode('ascii') + chunk + b'\r\n')
+                self.wfile.flush()
+        self.wfile.write(b'0\r\n\r\n')
+
+    do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+
+class FakeVManage(object):
+    """
+    Stand-in for vManage serving canned replies over plain HTTP on a free
+    local port. A route is a reply, or a callable taking a FakeRequest and
+    returning one. A reply is a JSON document, or a (status, body, headers)
+    tuple whose body is a document, text, bytes or a generator of byte
+    chunks sent with chunked transfer encoding.
+    """
+    def __init__(self):
+        self.routes = dict()
+        self.requests = []
+        self.lock = threading.Lock()
+        self.logins = 0
+        self.session_id = 1
+        self.server = _ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self.server.fake = self
+        self.port = self.server.server_address[1]
+        self.base_url = 'http://127.0.0.1:{0}/dataservice'.format(self.port)
+        self.route('POST', '/j_security_check', self._login)
+        self._thread = None
+
+    def _login(self, request):
+        with self.lock:
+            self.logins += 1
+        return (200, '', {'Set-Cookie': 'JSESSIONID={0}; Path=/'.format(self.session_id)})
+
+    def route(self, method, path, reply):
+        """
+        Set the reply of a path
+        :param method: HTTP method
+        :param path: path after /dataservice, without query string
+        :param reply: reply, or callable taking a FakeRequest and returning one
+        :return: None
+        """
+        with self.lock:
+            self.routes[(method, path)] = reply
+
+    def received(self, method=None, path=None):
+        """
+        Requests received so far
+        :param method: Only requests with this method
+        :param path: Only requests to this path
+        :return: list of FakeRequest
+        """
+        with self.lock:
+            return [request for request in self.requests
+                    if (method is None or request.method == method) and (path is None or request.path == path)]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, args=(0.05,))
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def client(self, cls=Viptela, **kwargs):
+        """
+        Client pointed at the fake, not logged in
+        :param cls: Viptela or a subclass
+        :param kwargs: Extra arguments of the client
+        :return: client object
+        """
+        kwargs.setdefault('auto_login', False)
+        client = cls('user', 'password', '127.0.0.1', self.port, **kwargs)
+        client.base_url = self.base_url
+        return client
@@ -0,0 +1,217 @@
+import asyncio
+import time
+import unittest
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from viptela_python.exceptions import JobTimeoutError, LoginCredentialsError
+from viptela_python.inventory import DeviceInventory
+from viptela_python.cache import ResponseCache
+from viptela_python.ratelimit import AdaptiveRateLimiter
+from viptela_python.retry import CircuitBreaker, RetryPolicy
+from . test_ratelimit import RecordingLimiter
+from . server import FakeVManage, json_body
+
+if aiohttp is not None:
+    from viptela_python.aio import AsyncViptela
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+@unittest.skipIf(aiohttp is None, 'aiohttp is not installed')
+class AsyncViptelaTest(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeVManage().start()
+        self.fake.route('GET', '/device/arp', lambda request: {'data': [{'device': request.query['deviceId']}]})
+        self.fake.route('GET', '/device', {'data': [
+            {'uuid': 'u1', 'system-ip': '1.1.1.1', 'host-name': 'edge1', 'site-id': '100'},
+            {'uuid': 'u2', 'system-ip': '1.1.1.2', 'host-name': 'edge2', 'site-id': '100'},
+        ]})
+
+    def tearDown(self):
+        self.fake.stop()
+
+    def client(self, **kwargs):
+        kwargs.setdefault('auto_login', True)
+        return self.fake.client(cls=AsyncViptela, **kwargs)
+
+    def test_login_and_getters(self):
+        async def main():
+            async with self.client() as client:
+                result = (await client.get_arp_table('1.1.1.1'))[0]
+                devices = [device async for device in client.iter_all_devices()]
+                return client.login_result, result, devices
+
+        login_result, result, devices = run(main())
+        self.assertTrue(login_result.ok)
+        self.assertEqual(result.data, [{'device': '1.1.1.1'}])
+        self.assertEqual([device['uuid'] for device in devices], ['u1', 'u2'])
+        self.assertEqual(self.fake.logins, 1)
+        self.assertEqual(self.fake.received('GET', '/device/arp')[0].headers.get('Cookie'), 'JSESSIONID=1')
+
+    def test_bad_credentials(self):
+        self.fake.route('POST', '/j_security_check', (200, '<html>login</html>', {'Content-Type': 'text/html'}))
+
+        async def main():
+            async with self.client():
+                pass
+
+        self.assertRaises(LoginCredentialsError, run, main())
+
+    def test_map_devices(self):
+        async def main():
+            async with self.client() as client:
+                return [item async for item in client.map_devices('get_arp_table', range(30), max_workers=5)]
+
+        results = dict(run(main()))
+        self.assertEqual(sorted(results), list(range(30)))
+        self.assertEqual(results[7].data, [{'device': '7'}])
+
+    def test_reauth_on_expired_session(self):
+        async def main():
+            async with self.client() as client:
+                self.fake.session_id = 2
+                self.fake.route('GET', '/device/arp', lambda request: (
+                    {'data': [1]} if request.headers.get('Cookie') == 'JSESSIONID=2'
+                    else (200, '<html>login</html>', {'Content-Type': 'text/html'})))
+                return [item async for item in client.map_devices('get_arp_table', range(10))]
+
+        results = dict(run(main()))
+        self.assertTrue(all(result.data == [1] for result in results.values()))
+        self.assertEqual(self.fake.logins, 2)
+
+    def test_upgrade_devices(self):
+        self.fake.route('GET', '/device/action/install/devices/vedge', {'data': [
+            {'uuid': 'u1', 'version': '20.1', 'availableVersions': []},
+        ]})
+        self.fake.route('POST', '/device/action/install', {'id': 'install-1'})
+
+        async def main():
+            async with self.client() as client:
+                return await client.upgrade_devices('20.1', [('1.1.1.1', 'u1'), ('1.1.1.2', 'u2')])
+
+        waves = run(main())
+        self.assertEqual([wave[0].data for wave in waves], ['install-1'])
+        payload = json_body(self.fake.received('POST', '/device/action/install')[0])
+        self.assertEqual(payload['devices'], [{'deviceIP': '1.1.1.2', 'deviceId': 'u2'}])
+
+    def test_get_inventory(self):
+        async def main():
+            async with self.client() as client:
+                return await client.get_inventory()
+
+        inventory = run(main())
+        self.assertIsInstance(inventory, DeviceInventory)
+        self.assertEqual(sorted(inventory.uuids()), ['u1', 'u2'])
+        self.assertEqual(inventory.get('edge2').system_ip, '1.1.1.2')
+        self.assertRaises(ValueError, inventory.refresh)
+
+    def test_wait_for_jobs(self):
+        polls = dict()
+
+        def status(request):
+            action_id = request.path.rsplit('/', 1)[1]
+            polls[action_id] = polls.get(action_id, 0) + 1
+            done = polls[action_id] >= 2
+            return {'data': [{'uuid': action_id + '-device', 'statusId': 'success' if done else 'in_progress'}],
+                    'summary': {'status': 'done' if done else 'in_progress'}}
+
+        self.fake.route('GET', '/device/action/status/a', status)
+        self.fake.route('GET', '/device/action/status/b', status)
+
+        async def main():
+            async with self.client() as client:
+                return [update async for update in client.wait_for_jobs(['a', 'b'], interval=0.01)]
+
+        updates = run(main())
+        finished = [(update.action_id, update.status) for update in updates if update.done]
+        self.assertEqual(sorted(finished), [('a', 'success'), ('b', 'success')])
+
+        async def timeout():
+            async with self.client() as client:
+                async for update in client.wait_for_jobs('c', interval=0.01, timeout=0.05):
+                    pass
+
+        self.fake.route('GET', '/device/action/status/c', {'data': [{'uuid': 'x', 'statusId': 'in_progress'}]})
+        self.assertRaises(JobTimeoutError, run, timeout())
+
+    def test_cancelled_trial_request_is_released(self):
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0)
+        breaker.record(False)
+
+        async def slow(*args, **kwargs):
+            await asyncio.sleep(10)
+
+        async def main():
+            async with self.client(auto_login=False, circuit_breaker=breaker) as client:
+                client._request_authenticated = slow
+                task = asyncio.ensure_future(client.get_arp_table('1.1.1.1'))
+                await asyncio.sleep(0.01)
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+                del client._request_authenticated
+                return (await client.get_arp_table('1.1.1.1'))[0]
+
+        self.assertEqual(run(main()).data, [{'device': '1.1.1.1'}])
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_rate_limiter_latency_is_time_to_headers(self):
+        def slow_body(request):
+            def chunks():
+                yield b'{"data": ['
+                time.sleep(0.3)
+                yield b'1]}'
+            return 200, chunks(), {'Content-Type': 'application/json'}
+
+        self.fake.route('GET', '/device/arp', slow_body)
+        limiter = RecordingLimiter(latency_threshold=0.2, latency_smoothing=1, cooldown=0)
+
+        async def main():
+            async with self.client(rate_limiter=limiter) as client:
+                return (await client.get_arp_table('1.1.1.1'))[0]
+
+        self.assertEqual(run(main()).data, [1])
+        self.assertLess(limiter.records[-1][2], 0.2)
+        self.assertEqual(limiter.rate('GET'), 20)
+
+    def test_policies(self):
+        client = self.client(cache=True, retry=True, circuit_breaker=True, rate_limiter=True, auto_reauth=False)
+        self.assertIsInstance(client.cache, ResponseCache)
+        self.assertIsInstance(client.retry, RetryPolicy)
+        self.assertIsInstance(client.circuit_breaker, CircuitBreaker)
+        self.assertIsInstance(client.rate_limiter, AdaptiveRateLimiter)
+        self.assertFalse(client.auto_reauth)
+
+        replies = [(500, {'error': {'message': 'Server error', 'details': ''}}), {'data': [1]}]
+        self.fake.route('GET', '/device/arp', lambda request: replies.pop(0))
+
+        async def main():
+            async with self.client(retry=RetryPolicy(backoff_factor=0.01)) as client:
+                return (await client.get_arp_table('1.1.1.1'))[0]
+
+        self.assertEqual(run(main()).data, [1])
+        self.assertEqual(len(self.fake.received('GET', '/device/arp')), 2)
+
+    def test_get_raw_is_not_available(self):
+        client = self.client(auto_login=False)
+        self.assertRaises(TypeError, client.get_raw, '/template/config/running/u0')
+
+    def test_attach_template_is_not_available(self):
+        client = self.client(auto_login=False)
+        self.assertRaises(TypeError, client.attach_template, 'template', [])
+
+
+if __name__ == '__main__':
+    unittest.main()
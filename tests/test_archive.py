@@ -0,0 +1,130 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from viptela_python.archive import INDEX_NAME, PACK_NAME, ConfigArchive, chunk_lines
+from . server import FakeVManage
+
+
+def config(seed, lines=400):
+    rng = random.Random(seed)
+    return ''.join('interface ge0/{0}\n description link-{1}\n'.format(i, rng.randint(0, 3)) for i in range(lines))
+
+
+class ChunkLinesTest(unittest.TestCase):
+    def test_blocks_rebuild_the_config(self):
+        text = config(1)
+        blocks = chunk_lines(text)
+        self.assertEqual(b''.join(blocks), text.encode('utf-8'))
+        self.assertTrue(all(block.endswith(b'\n') for block in blocks))
+        self.assertTrue(all(len(block.splitlines()) <= 256 for block in blocks))
+        self.assertEqual(chunk_lines(''), [])
+        self.assertEqual(chunk_lines('no newline'), [b'no newline'])
+
+    def test_bounds(self):
+        blocks = chunk_lines('x\n' * 1000, average_lines=1000000, min_lines=4, max_lines=10)
+        self.assertEqual(len(blocks), 100)
+        blocks = chunk_lines(config(2), average_lines=1, min_lines=4)
+        self.assertTrue(all(len(block.splitlines()) == 4 for block in blocks))
+
+    def test_edit_is_local(self):
+        lines = config(3).splitlines(True)
+        before = chunk_lines(''.join(lines))
+        lines.insert(300, ' shutdown\n')
+        after = chunk_lines(''.join(lines))
+        self.assertLessEqual(len(set(after) - set(before)), 2)
+
+
+class ConfigArchiveTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.archive = ConfigArchive(self.directory)
+
+    def tearDown(self):
+        self.archive.close()
+        shutil.rmtree(self.directory)
+
+    def pack_size(self):
+        return os.path.getsize(os.path.join(self.directory, PACK_NAME))
+
+    def test_store_and_get(self):
+        self.assertTrue(self.archive.store('u1', config(1), timestamp=100))
+        self.assertFalse(self.archive.store('u1', config(1), timestamp=150))
+        self.assertTrue(self.archive.store('u1', config(2), timestamp=200))
+        self.assertEqual(self.archive.versions('u1'), [100, 200])
+        self.assertIsNone(self.archive.get('u1', 99))
+        self.assertEqual(self.archive.get('u1', 150), config(1))
+        self.assertEqual(self.archive.get('u1', 200), config(2))
+        self.assertEqual(self.archive.get('u1'), config(2))
+        self.assertIsNone(self.archive.get('u2'))
+        self.assertEqual(self.archive.devices(), ['u1'])
+
+    def test_out_of_order_versions(self):
+        self.archive.store('u1', config(2), timestamp=200)
+        self.archive.store('u1', config(1), timestamp=100)
+        self.assertEqual(self.archive.versions('u1'), [100, 200])
+        self.assertEqual(self.archive.get('u1', 199), config(1))
+
+    def test_blocks_are_stored_once(self):
+        self.archive.store('u1', config(1), timestamp=100)
+        size = self.pack_size()
+        self.assertEqual(size, len(config(1)))
+        self.archive.store('u2', config(1), timestamp=100)
+        self.assertEqual(self.pack_size(), size)
+        edited = config(1).replace('ge0/200\n', 'ge0/200\n shutdown\n')
+        self.archive.store('u1', edited, timestamp=200)
+        self.assertLess(self.pack_size() - size, len(config(1)) / 4)
+        self.assertEqual(self.archive.get('u1'), edited)
+        self.assertEqual(self.archive.get('u2'), config(1))
+
+    def test_reopen(self):
+        self.archive.store('u1', config(1), timestamp=100)
+        self.archive.store('u1', config(2), timestamp=200)
+        self.archive.close()
+        self.archive = ConfigArchive(self.directory)
+        self.assertEqual(self.archive.versions('u1'), [100, 200])
+        self.assertEqual(self.archive.get('u1', 100), config(1))
+        self.assertFalse(self.archive.store('u1', config(2), timestamp=300))
+
+    def test_torn_writes_are_dropped(self):
+        self.archive.store('u1', config(1), timestamp=100)
+        size = self.pack_size()
+        self.archive.close()
+        with open(os.path.join(self.directory, PACK_NAME), 'ab') as fileobj:
+            fileobj.write(b'block without index record')
+        with open(os.path.join(self.directory, INDEX_NAME), 'ab') as fileobj:
+            fileobj.write(b'torn')
+        with open(os.path.join(self.directory, 'manifests', 'u1.jsonl'), 'a') as fileobj:
+            fileobj.write('{"time": 2')
+
+        self.archive = ConfigArchive(self.directory)
+        self.assertEqual(self.pack_size(), size)
+        self.assertEqual(self.archive.versions('u1'), [100])
+        self.archive.store('u1', config(2), timestamp=200)
+        self.assertEqual(self.archive.get('u1'), config(2))
+        self.assertEqual(self.archive.get('u1', 100), config(1))
+
+
+class ArchiveRunningConfigsTest(unittest.TestCase):
+    def test_archive_running_configs(self):
+        directory = tempfile.mkdtemp()
+        try:
+            with FakeVManage() as fake, ConfigArchive(directory) as archive:
+                fake.route('GET', '/template/config/running/u1', {'config': config(1)})
+                fake.route('GET', '/template/config/running/u2', {'config': config(1)})
+                fake.route('GET', '/template/config/running/u3', (500, {'error': {'message': 'x', 'details': ''}}))
+                client = fake.client()
+                outcomes = dict((device_id, stored) for device_id, result, stored
+                                in archive.archive_running_configs(client, ['u1', 'u2', 'u3']))
+                self.assertEqual(outcomes, {'u1': True, 'u2': True, 'u3': None})
+                self.assertEqual(archive.get('u2'), config(1))
+                again = list(archive.archive_running_configs(client, ['u1']))
+                self.assertFalse(again[0][2])
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+
+from viptela_python.exceptions import JobTimeoutError
+from . server import FakeVManage, json_body
+
+SERVER_ERROR = (500, {'error': {'message': 'Server error', 'details': ''}})
+
+
+def device(i):
+    return {'csv-deviceId': 'u{0}'.format(i), 'uuid': 'u{0}'.format(i), 'csv-deviceIP': '10.0.0.{0}'.format(i),
+            'csv-host-name': 'edge{0}'.format(i)}
+
+
+class TemplateAttachTest(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeVManage().start()
+        self.fake.route('POST', '/template/device/config/input/', {'data': []})
+        self.fake.route('POST', '/template/device/config/duplicateip', {'data': []})
+        jobs = []
+
+        def attach(request):
+            jobs.append('job-{0}'.format(len(jobs) + 1))
+            return {'id': jobs[-1]}
+
+        self.fake.route('POST', '/template/device/config/attachfeature', attach)
+        self.client = self.fake.client()
+
+    def tearDown(self):
+        self.fake.stop()
+
+    def test_unreadable_job_fails_its_devices(self):
+        self.fake.route('GET', '/device/action/status/job-1', {'data': [
+            {'uuid': 'u0', 'statusId': 'success'}, {'uuid': 'u1', 'statusId': 'success'}]})
+        self.fake.route('GET', '/device/action/status/job-2', SERVER_ERROR)
+        attach = self.client.attach_template('t1', [device(i) for i in range(4)], chunk_size=2, max_workers=1,
+                                             interval=0.001)
+        attach.run()
+        self.assertEqual(sorted(attach.succeeded), ['u0', 'u1'])
+        self.assertEqual(sorted(attach.failed), ['u2', 'u3'])
+        self.assertEqual(attach.outcomes['u2'].step, 'status')
+        self.assertEqual(attach.outcomes['u2'].detail.status_code, 500)
+        self.assertNotIn(None, attach.outcomes)
+
+    def test_input_without_uuid(self):
+        # Input as returned by /template/device/config/input has no uuid key
+        devices = [dict((key, value) for key, value in device(i).items() if key != 'uuid') for i in range(2)]
+        self.fake.route('GET', '/device/action/status/job-1', {'data': [
+            {'uuid': 'u0', 'statusId': 'success'}, {'uuid': 'u1', 'statusId': 'success'}]})
+        attach = self.client.attach_template('t1', devices, interval=0.001)
+        attach.run()
+        self.assertEqual(sorted(attach.succeeded), ['u0', 'u1'])
+        payload = json_body(self.fake.received('POST', '/template/device/config/input/')[0])
+        self.assertEqual(payload['deviceIds'], ['u0', 'u1'])
+
+    def test_success_and_failure(self):
+        self.fake.route('GET', '/device/action/status/job-1', {'data': [
+            {'uuid': 'u0', 'statusId': 'success'}, {'uuid': 'u1', 'statusId': 'failure'}]})
+        outcomes = self.client.attach_template('t1', [device(0), device(1)], interval=0.001).run()
+        self.assertEqual((outcomes['u0'].status, outcomes['u0'].step, outcomes['u0'].action_id),
+                         ('success', 'attach', 'job-1'))
+        self.assertEqual(outcomes['u1'].status, 'failed')
+        self.assertEqual(outcomes['u1'].detail, {'uuid': 'u1', 'statusId': 'failure'})
+
+    def test_chunks(self):
+        self.fake.route('GET', '/device/action/status/job-1', {'data': [], 'summary': {'status': 'done'}})
+        self.fake.route('GET', '/device/action/status/job-2', {'data': [], 'summary': {'status': 'done'}})
+        self.fake.route('GET', '/device/action/status/job-3', {'data': [], 'summary': {'status': 'done'}})
+        attach = self.client.attach_template('t1', [device(i) for i in range(5)], chunk_size=2, interval=0.001)
+        self.assertEqual(sorted(attach.submit()), ['job-1', 'job-2', 'job-3'])
+        sizes = sorted(len(json_body(request)['deviceTemplateList'][0]['device'])
+                       for request in self.fake.received('POST', '/template/device/config/attachfeature'))
+        self.assertEqual(sizes, [1, 2, 2])
+
+    def test_duplicates_are_left_out(self):
+        self.fake.route('POST', '/template/device/config/duplicateip', {'data': [{'csv-deviceIP': '10.0.0.1'}]})
+        self.fake.route('GET', '/device/action/status/job-1', {'data': [{'uuid': 'u0', 'statusId': 'success'}]})
+        attach = self.client.attach_template('t1', [device(0), device(1)], interval=0.001)
+        attach.run()
+        self.assertEqual((attach.outcomes['u1'].status, attach.outcomes['u1'].step), ('failed', 'duplicate_ip'))
+        sent = json_body(self.fake.received('POST', '/template/device/config/attachfeature')[0])
+        self.assertEqual([entry['csv-deviceId'] for entry in sent['deviceTemplateList'][0]['device']], ['u0'])
+        self.assertEqual(attach.succeeded, ['u0'])
+
+    def test_failed_step(self):
+        self.fake.route('POST', '/template/device/config/input/', SERVER_ERROR)
+        attach = self.client.attach_template('t1', [device(0)])
+        attach.run()
+        self.assertEqual((attach.outcomes['u0'].status, attach.outcomes['u0'].step), ('failed', 'config_input'))
+        self.assertEqual(attach.action_ids, [])
+
+    def test_timeout_fails_unfinished_devices(self):
+        self.fake.route('GET', '/device/action/status/job-1', {'data': [
+            {'uuid': 'u0', 'statusId': 'success'}, {'uuid': 'u1', 'statusId': 'in_progress'}]})
+        attach = self.client.attach_template('t1', [device(0), device(1), device(2)], interval=0.01, timeout=0.05)
+        outcomes = attach.run()
+        self.assertEqual(outcomes['u0'].status, 'success')
+        for device_id in ('u1', 'u2'):
+            self.assertEqual((outcomes[device_id].status, outcomes[device_id].step), ('failed', 'timeout'))
+            self.assertIsInstance(outcomes[device_id].detail, JobTimeoutError)
+        self.assertEqual(sorted(attach.failed), ['u1', 'u2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
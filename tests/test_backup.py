@@ -0,0 +1,116 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from viptela_python.backup import MANIFEST_NAME, ConfigBackup, read_config
+from viptela_python.exceptions import ResponseError
+from . server import FakeVManage
+
+
+class ConfigBackupTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fake = FakeVManage().start()
+        self.configs = dict()
+        for i in range(3):
+            for kind in ('running', 'attached'):
+                self.set_config('u{0}'.format(i), kind, '{0} config of edge{1}'.format(kind, i))
+        self.devices = [{'uuid': 'u{0}'.format(i), 'host-name': 'edge{0}'.format(i), 'lastupdated': 1000 + i}
+                        for i in range(3)]
+        self.fake.route('GET', '/device', {'data': self.devices})
+        self.client = self.fake.client()
+
+    def tearDown(self):
+        self.fake.stop()
+        shutil.rmtree(self.directory)
+
+    def set_config(self, device_uuid, kind, text):
+        self.fake.route('GET', '/template/config/{0}/{1}'.format(kind, device_uuid), {'config': text})
+
+    def downloads(self):
+        return len([request for request in self.fake.received('GET') if request.path.startswith('/template/config/')])
+
+    def run_backup(self, devices=None, **kwargs):
+        backup = ConfigBackup(self.client, self.directory, max_workers=3, **kwargs)
+        return backup, dict(backup.run(devices))
+
+    def test_first_run(self):
+        backup, results = self.run_backup()
+        self.assertEqual(sorted(results), ['u0', 'u1', 'u2'])
+        self.assertEqual(results['u1'].data, {'running': 'changed', 'attached': 'changed'})
+        self.assertEqual(read_config(backup.path('u1', 'attached')), 'attached config of edge1')
+        with open(os.path.join(self.directory, MANIFEST_NAME)) as fileobj:
+            manifest = json.load(fileobj)
+        self.assertEqual(manifest['u2']['host-name'], 'edge2')
+        self.assertEqual(manifest['u2']['modified'], 1002)
+        self.assertEqual(len(manifest['u2']['running']), 64)
+        self.assertEqual(self.downloads(), 6)
+        self.assertEqual([name for name in os.listdir(self.directory) if name.startswith('.')], [])
+
+    def test_unmodified_devices_are_not_downloaded(self):
+        self.run_backup(skip_unmodified=True)
+        self.devices[1]['lastupdated'] = 2000
+        self.set_config('u1', 'running', 'new running config of edge1')
+        backup, results = self.run_backup(skip_unmodified=True)
+        self.assertEqual(results['u0'].data, {'running': 'skipped', 'attached': 'skipped'})
+        self.assertEqual(results['u1'].data, {'running': 'changed', 'attached': 'unchanged'})
+        self.assertEqual(read_config(backup.path('u1')), 'new running config of edge1')
+        self.assertEqual(self.downloads(), 6 + 2)
+        self.assertEqual(backup.manifest['u1']['modified'], 2000)
+
+    def test_devices_without_update_time_are_downloaded(self):
+        self.run_backup(skip_unmodified=True)
+        backup, results = self.run_backup(['u0', 'u1'], skip_unmodified=True)
+        self.assertEqual(results['u0'].data, {'running': 'unchanged', 'attached': 'unchanged'})
+        self.assertEqual(self.downloads(), 6 + 4)
+
+    def test_unmodified_devices_are_downloaded_by_default(self):
+        self.run_backup()
+        self.set_config('u0', 'running', 'running config of edge0 changed from the CLI')
+        backup, results = self.run_backup(attached=False)
+        self.assertEqual(results['u0'].data, {'running': 'changed'})
+        self.assertEqual(results['u1'].data, {'running': 'unchanged'})
+        self.assertEqual(self.downloads(), 6 + 3)
+
+    def test_device_list_is_fetched_whole(self):
+        self.run_backup()
+        self.assertEqual(len(self.fake.received('GET', '/device')), 1)
+
+    def test_device_list_error(self):
+        self.fake.route('GET', '/device', (500, {'error': {'message': 'Failed', 'details': ''}}))
+        backup = ConfigBackup(self.client, self.directory)
+        with self.assertRaises(ResponseError) as raised:
+            list(backup.run())
+        self.assertEqual(raised.exception.result.status_code, 500)
+        self.assertEqual(self.downloads(), 0)
+
+    def test_missing_backup_is_downloaded_again(self):
+        backup, results = self.run_backup()
+        os.remove(backup.path('u0', 'attached'))
+        backup, results = self.run_backup()
+        self.assertEqual(results['u0'].data, {'running': 'unchanged', 'attached': 'changed'})
+        self.assertTrue(os.path.exists(backup.path('u0', 'attached')))
+
+    def test_error(self):
+        self.fake.route('GET', '/template/config/running/u2', (500, {'error': {'message': 'Failed', 'details': ''}}))
+        backup, results = self.run_backup()
+        self.assertFalse(results['u2'].ok)
+        self.assertEqual(results['u2'].status_code, 500)
+        self.assertNotIn('u2', backup.manifest)
+        self.assertTrue(results['u0'].ok)
+
+    def test_get_raw(self):
+        response = self.client.get_raw('/template/config/running/u0')
+        try:
+            self.assertEqual(json.loads(b''.join(response.iter_content(4)).decode('utf-8')),
+                             {'config': 'running config of edge0'})
+        finally:
+            response.close()
+        headers = self.fake.received('GET', '/template/config/running/u0')[0].headers
+        self.assertEqual(headers['Content-Type'], 'application/json')
+
+
+if __name__ == '__main__':
+    unittest.main()
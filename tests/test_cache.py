@@ -0,0 +1,195 @@
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from viptela_python.cache import DiskCache, ResponseCache
+from . server import FakeVManage
+
+
+def gzipped(document):
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb') as fileobj:
+        fileobj.write(json.dumps(document).encode('utf-8'))
+    return buffer.getvalue()
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def test_ttls_only_cover_listing_endpoints(self):
+        cache = ResponseCache()
+        self.assertEqual(cache.ttl('/device'), 60)
+        self.assertEqual(cache.ttl('/system/device/vedges'), 300)
+        self.assertEqual(cache.ttl('/template/device'), 300)
+        self.assertEqual(cache.ttl('/template/feature'), 300)
+        self.assertEqual(cache.ttl('/template/policy/vedge'), 300)
+        self.assertIsNone(cache.ttl('/template/device/object/1234'))
+        self.assertIsNone(cache.ttl('/template/device/config/attached/1234'))
+        self.assertIsNone(cache.ttl('/template/feature/object/1234'))
+        self.assertIsNone(cache.ttl('/device/arp?deviceId=1.1.1.1'))
+        self.assertIsNone(cache.ttl('/device/action/status/job-1'))
+
+    def test_custom_ttls_come_first(self):
+        cache = ResponseCache(ttls={r'^/device$': 5, r'^/device/arp$': 1})
+        self.assertEqual(cache.ttl('/device'), 5)
+        self.assertEqual(cache.ttl('/device/arp?deviceId=1'), 1)
+
+    def test_expiry(self):
+        cache = ResponseCache(ttls={r'^/short$': 0.05})
+        cache.set('/short', 'value', 10)
+        self.assertEqual(cache.get('/short'), 'value')
+        time.sleep(0.06)
+        self.assertIsNone(cache.get('/short'))
+        self.assertEqual(cache.size, 0)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_ttl_override(self):
+        cache = ResponseCache(ttls={r'^/path$': 60})
+        cache.set('/path', 'value', 10, ttl=0.05)
+        self.assertEqual(cache.get('/path'), 'value')
+        time.sleep(0.06)
+        self.assertIsNone(cache.get('/path'))
+        cache.set('/path', 'value', 10, ttl=-1)
+        cache.set('/other', 'value', 10, ttl=60)
+        self.assertEqual(len(cache), 0)
+
+    def test_lru_bounded_by_size(self):
+        cache = ResponseCache(max_bytes=100, ttls={r'^/': 60})
+        cache.set('/a', 'a', 40)
+        cache.set('/b', 'b', 40)
+        cache.get('/a')
+        cache.set('/c', 'c', 40)
+        self.assertEqual(cache.get('/b'), None)
+        self.assertEqual(cache.get('/a'), 'a')
+        self.assertEqual(cache.get('/c'), 'c')
+        self.assertEqual(cache.size, 80)
+        cache.set('/huge', 'huge', 101)
+        self.assertIsNone(cache.get('/huge'))
+
+    def test_invalidation(self):
+        cache = ResponseCache()
+        for path in ('/device', '/system/device/vedges', '/template/device', '/group/map/devices'):
+            cache.set(path, path, 1)
+        # Read-only POSTs leave the cache alone
+        self.assertEqual(cache.invalidate_after('/template/device/config/input/'), 0)
+        self.assertEqual(cache.invalidate_after('/device/action/install'), 2)
+        self.assertIsNone(cache.get('/device'))
+        self.assertEqual(cache.get('/template/device'), '/template/device')
+        self.assertEqual(cache.invalidate_after('/template/device/config/attachfeature'), 1)
+        self.assertEqual(cache.invalidate(r'^/group/'), 1)
+        self.assertEqual(len(cache), 0)
+
+
+class ClientCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeVManage().start()
+        self.fake.route('GET', '/device', {'data': [{'uuid': 'u1'}]})
+        self.fake.route('GET', '/template/device', {'data': [{'templateId': 't1'}]})
+        self.fake.route('GET', '/template/device/object/t1', {'templateName': 'branch'})
+        self.fake.route('POST', '/template/device/config/attachfeature', {'id': 'attach-1'})
+        self.client = self.fake.client(cache=True)
+
+    def tearDown(self):
+        self.fake.stop()
+
+    def test_hits_skip_the_server(self):
+        for i in range(3):
+            self.assertEqual(self.client.get_all_devices()[0].data, [{'uuid': 'u1'}])
+        self.assertEqual(len(self.fake.received('GET', '/device')), 1)
+
+    def test_detail_paths_are_not_cached(self):
+        for i in range(2):
+            self.client.get_template_device_object('t1')
+        self.assertEqual(len(self.fake.received('GET', '/template/device/object/t1')), 2)
+
+    def test_callers_get_independent_data(self):
+        first = self.client.get_all_devices()[0]
+        first.data.append({'uuid': 'added by a caller'})
+        first.data[0]['uuid'] = 'changed by a caller'
+        second = self.client.get_all_devices()[0]
+        self.assertEqual(second.data, [{'uuid': 'u1'}])
+        self.assertIsNot(first.data, second.data)
+
+    def test_mutation_invalidates(self):
+        self.client.get_template_device()
+        self.client.attach_feature_to_devices('t1', [{'csv-deviceId': 'u1'}])
+        self.client.get_template_device()
+        self.assertEqual(len(self.fake.received('GET', '/template/device')), 2)
+
+    def test_errors_are_not_cached(self):
+        self.fake.route('GET', '/device', (500, {'error': {'message': 'Server error', 'details': ''}}))
+        self.client.get_all_devices()
+        self.client.get_all_devices()
+        self.assertEqual(len(self.fake.received('GET', '/device')), 2)
+
+
+class DiskCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fake = FakeVManage().start()
+        self.devices = [{'uuid': 'u1'}]
+        self.fake.route('GET', '/device', lambda request: (
+            200, gzipped({'data': self.devices}), {'Content-Type': 'application/json', 'Content-Encoding': 'gzip'}))
+
+    def tearDown(self):
+        self.fake.stop()
+        shutil.rmtree(self.directory)
+
+    def client(self, ttl=60):
+        ttls = {r'^/device$': ttl}
+        return self.fake.client(cache=ResponseCache(ttls=ttls, disk=DiskCache(self.directory, ttls=ttls)))
+
+    def files(self):
+        return [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith('.vpc')]
+
+    def test_shared_between_clients(self):
+        self.assertEqual(self.client().get_all_devices()[0].data, [{'uuid': 'u1'}])
+        result = self.client().get_all_devices()[0]
+        self.assertEqual(result.data, [{'uuid': 'u1'}])
+        self.assertEqual(len(self.fake.received('GET', '/device')), 1)
+        # The stored body is decoded, so it must not claim an encoding
+        self.assertEqual(result.response.headers.get('Content-Type'), 'application/json')
+        self.assertNotIn('Content-Encoding', result.response.headers)
+
+    def test_memory_copy_expires_with_the_disk_entry(self):
+        self.client(ttl=0.3).get_all_devices()
+        time.sleep(0.2)
+        client = self.client(ttl=0.3)
+        client.get_all_devices()
+        self.assertEqual(len(self.fake.received('GET', '/device')), 1)
+        time.sleep(0.15)
+        self.devices = [{'uuid': 'u2'}]
+        self.assertEqual(client.get_all_devices()[0].data, [{'uuid': 'u2'}])
+        self.assertEqual(len(self.fake.received('GET', '/device')), 2)
+
+    def test_damaged_files_are_misses(self):
+        client = self.client()
+        client.get_all_devices()
+        filename = self.files()[0]
+        with open(filename, 'rb') as fileobj:
+            content = fileobj.read()
+        key = client._disk_cache_key(client.base_url + '/device')
+        self.assertIsNotNone(DiskCache(self.directory).get(key))
+        for damaged in (content[:-1], content + b'x', content[:10], b'VPC0' + content[4:]):
+            with open(filename, 'wb') as fileobj:
+                fileobj.write(damaged)
+            self.assertIsNone(DiskCache(self.directory).get(key))
+
+    def test_prune_and_invalidate(self):
+        disk = DiskCache(self.directory, ttls={r'^/device$': 0.05, r'^/template/device$': 60})
+        client = self.fake.client(cache=ResponseCache(disk=disk))
+        self.fake.route('GET', '/template/device', {'data': []})
+        client.get_all_devices()
+        client.get_template_device()
+        self.assertEqual(len(self.files()), 2)
+        time.sleep(0.06)
+        self.assertEqual(disk.prune(), 1)
+        self.assertEqual(disk.invalidate(r'^/template/'), 1)
+        self.assertEqual(self.files(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import json
+import unittest
+
+from viptela_python.codec import CODECS, DEFAULT_CODEC, JSONCodec, get_codec
+from . server import FakeVManage, json_body
+
+
+class RecordingCodec(JSONCodec):
+    name = 'recording'
+
+    def __init__(self):
+        self.dumped = []
+
+    def dumps(self, obj):
+        self.dumped.append(obj)
+        return json.dumps(obj)
+
+
+class CodecTest(unittest.TestCase):
+    def test_round_trip_every_installed_codec(self):
+        document = {'data': [{'uuid': u'é', 'n': 1, 'f': 1.5, 'none': None, 'ok': True}]}
+        for name, cls in CODECS.items():
+            if not cls.available():
+                continue
+            codec = get_codec(name)
+            encoded = codec.dumps(document)
+            self.assertEqual(codec.loads(encoded), document, name)
+            if isinstance(encoded, bytes):
+                encoded = encoded.decode('utf-8')
+            self.assertEqual(json.loads(encoded), document, name)
+            self.assertEqual(codec.loads(bytearray(json.dumps(document).encode('utf-8'))), document, name)
+
+    def test_get_codec(self):
+        self.assertIs(get_codec(None), DEFAULT_CODEC)
+        self.assertEqual(get_codec('json').name, 'json')
+        self.assertIn(get_codec('auto').name, CODECS)
+        codec = RecordingCodec()
+        self.assertIs(get_codec(codec), codec)
+        self.assertRaises(ValueError, get_codec, 'yaml')
+
+    def test_unavailable_codec(self):
+        missing = [name for name, cls in CODECS.items() if not cls.available()]
+        if not missing:
+            self.skipTest('every codec is installed')
+        self.assertRaises(ValueError, get_codec, missing[0])
+
+    def test_client_encodes_payloads_with_its_codec(self):
+        codec = RecordingCodec()
+        with FakeVManage() as fake:
+            fake.route('PUT', '/settings/configuration/banner', {'data': []})
+            client = fake.client(codec=codec)
+            client.set_banner('Authorised use only')
+            request = fake.received('PUT')[0]
+        self.assertEqual(codec.dumped, [{'mode': 'on', 'bannerDetail': 'Authorised use only'}])
+        self.assertEqual(json_body(request), codec.dumped[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import threading
+import time
+import unittest
+
+from viptela_python.collector import StatisticsCollector, poll_phase
+
+
+class FakeViptela(object):
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def get_tunnel_statistics(self, device_id):
+        with self.lock:
+            self.calls.append(device_id)
+        time.sleep(self.delay)
+        return [object()]
+
+
+class StatisticsCollectorTest(unittest.TestCase):
+    def test_poll_phase(self):
+        phase = poll_phase('1.1.1.1', 'get_tunnel_statistics', 300)
+        self.assertTrue(0 <= phase < 300)
+        self.assertEqual(phase, poll_phase('1.1.1.1', 'get_tunnel_statistics', 300))
+        self.assertNotEqual(phase, poll_phase('1.1.1.2', 'get_tunnel_statistics', 300))
+
+    def test_polls_each_device_once_per_interval(self):
+        viptela = FakeViptela()
+        samples = []
+        collector = StatisticsCollector(viptela, ['get_tunnel_statistics'], ['a', 'b'], interval=0.1,
+                                        sink=samples.append)
+        collector.run(duration=0.55)
+        for device_id in ('a', 'b'):
+            self.assertIn(viptela.calls.count(device_id), (5, 6))
+        self.assertEqual(len(samples), collector.polls)
+
+    def test_readded_device_is_not_polled_twice(self):
+        viptela = FakeViptela()
+        collector = StatisticsCollector(viptela, ['get_tunnel_statistics'], ['a'], interval=0.1)
+        collector.update_devices([])
+        collector.update_devices(['a'])
+        self.assertEqual(len(collector._schedule), 2)
+        collector.run(duration=0.55)
+        self.assertIn(viptela.calls.count('a'), (5, 6))
+        self.assertEqual(collector.overruns, 0)
+
+    def test_removed_device_is_not_polled(self):
+        viptela = FakeViptela()
+        collector = StatisticsCollector(viptela, ['get_tunnel_statistics'], ['a', 'b'], interval=0.1)
+        collector.update_devices(['b'])
+        collector.run(duration=0.35)
+        self.assertNotIn('a', viptela.calls)
+        self.assertTrue(viptela.calls)
+
+    def test_busy_poll_is_an_overrun(self):
+        viptela = FakeViptela(delay=0.25)
+        overruns = []
+        collector = StatisticsCollector(viptela, ['get_tunnel_statistics'], ['a'], interval=0.1,
+                                        on_overrun=overruns.append)
+        collector.run(duration=0.35)
+        self.assertTrue(overruns)
+        self.assertEqual(collector.overruns, len(overruns))
+        self.assertIn(collector.polls + collector.overruns, (3, 4))
+        self.assertEqual(overruns[0].device_id, 'a')
+
+
+if __name__ == '__main__':
+    unittest.main()
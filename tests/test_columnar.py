@@ -0,0 +1,92 @@
+import unittest
+from array import array
+
+from viptela_python.columnar import FLOAT, INT, MISSING, OBJECT, STRING, ColumnarTable
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+ROWS = [
+    {'vdevice-name': '1.1.1.1', 'ifname': 'ge0/0', 'tx-octets': 10, 'rx-octets': 1.5},
+    {'vdevice-name': '1.1.1.2', 'ifname': 'ge0/0', 'tx-octets': 20},
+    {'vdevice-name': '1.1.1.1', 'ifname': 'ge0/1', 'rx-octets': 2.5, 'admin-up': True},
+]
+
+
+class ColumnarTableTest(unittest.TestCase):
+    backend = 'array'
+
+    def table(self, rows, **kwargs):
+        return ColumnarTable.from_rows(rows, backend=self.backend, **kwargs)
+
+    def test_kinds(self):
+        table = self.table(ROWS)
+        self.assertEqual(table.kinds, {'vdevice-name': STRING, 'ifname': STRING, 'tx-octets': INT,
+                                       'rx-octets': FLOAT, 'admin-up': OBJECT})
+        self.assertEqual(table.categories['vdevice-name'], ['1.1.1.1', '1.1.1.2'])
+        self.assertEqual(list(table.codes('vdevice-name')), [0, 1, 0])
+        self.assertEqual(len(table), 3)
+
+    def test_round_trip(self):
+        self.assertEqual(self.table(ROWS).to_rows(), ROWS)
+        self.assertEqual([self.table(ROWS).row(i) for i in range(3)], ROWS)
+
+    def test_missing_int_stays_int(self):
+        rows = [{'a': 1, 'b': 'x'}, {'b': 'y'}]
+        table = self.table(rows)
+        self.assertEqual(table.kinds['a'], INT)
+        self.assertEqual(table.to_rows(), rows)
+        self.assertIs(type(table.to_rows()[0]['a']), int)
+        self.assertEqual(table.row(1), {'b': 'y'})
+        self.assertEqual(list(table['a']), [1, None] if self.backend == 'array' else [1, numpy.ma.masked])
+
+    def test_column_seen_late(self):
+        rows = [{'b': 'x'}, {'b': 'y', 'a': 2}, {'a': 3.5}]
+        table = self.table(rows)
+        self.assertEqual(table.kinds['a'], FLOAT)
+        self.assertEqual(table.to_rows(), rows)
+        self.assertEqual(list(table.codes('b')), [0, 1, MISSING])
+
+    def test_mixed_kinds(self):
+        rows = [{'a': 'x'}, {'a': 2}, {'a': None}, {'a': 2 ** 70}]
+        table = self.table(rows)
+        self.assertEqual(table.kinds['a'], OBJECT)
+        self.assertEqual(table.to_rows(), [{'a': 'x'}, {'a': 2}, {}, {'a': 2 ** 70}])
+
+    def test_columns(self):
+        table = self.table(iter(ROWS), columns=['ifname', 'missing'])
+        self.assertEqual(sorted(table.names), ['ifname', 'missing'])
+        self.assertEqual(table.to_rows(), [{'ifname': 'ge0/0'}, {'ifname': 'ge0/0'}, {'ifname': 'ge0/1'}])
+
+    def test_take_and_sum_by(self):
+        table = self.table(ROWS)
+        taken = table.take([2, 1])
+        self.assertEqual(taken.to_rows(), [ROWS[2], ROWS[1]])
+        self.assertEqual(table.sum_by('vdevice-name', 'tx-octets'), {'1.1.1.1': 10, '1.1.1.2': 20})
+        self.assertEqual(table.sum_by('vdevice-name', 'rx-octets'), {'1.1.1.1': 4.0, '1.1.1.2': 0})
+
+    def test_typed_storage(self):
+        table = self.table(ROWS)
+        if self.backend == 'array':
+            self.assertIsInstance(table.columns['tx-octets'], array)
+            self.assertEqual(table.columns['tx-octets'].typecode, 'q')
+        else:
+            self.assertEqual(table.columns['tx-octets'].dtype, numpy.int64)
+            self.assertEqual(table.columns['vdevice-name'].dtype, numpy.int32)
+        self.assertTrue(table.nbytes >= 3 * 8 * 2)
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class NumpyColumnarTableTest(ColumnarTableTest):
+    backend = 'numpy'
+
+    def test_take_mask(self):
+        table = self.table(ROWS)
+        taken = table.take(table.codes('vdevice-name') == 0)
+        self.assertEqual(taken.to_rows(), [ROWS[0], ROWS[2]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+
+from viptela_python.viptela import Viptela
+from . server import FakeVManage, json_body
+
+
+def device_record(i):
+    # /device record: deviceId is the system IP, uuid is the device uuid
+    return {'uuid': 'u{0}'.format(i), 'deviceId': '1.1.1.{0}'.format(i), 'system-ip': '1.1.1.{0}'.format(i)}
+
+
+class ActionDevicesTest(unittest.TestCase):
+    def test_normalise(self):
+        devices = Viptela._action_devices([
+            ('1.1.1.1', 'u1'),
+            ['1.1.1.2', 'u2'],
+            device_record(3),
+            {'deviceIP': '1.1.1.4', 'deviceId': 'u4'},
+        ])
+        self.assertEqual(devices, [('1.1.1.1', 'u1'), ('1.1.1.2', 'u2'), ('1.1.1.3', 'u3'), ('1.1.1.4', 'u4')])
+
+
+class DeviceActionWavesTest(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeVManage().start()
+        self.fake.route('GET', '/device/action/install/devices/vedge', {'data': [
+            {'uuid': 'u0', 'version': '20.3', 'availableVersions': []},
+            {'uuid': 'u1', 'version': '20.1', 'availableVersions': ['20.3']},
+            {'uuid': 'u2', 'version': '20.1', 'availableVersions': []},
+        ]})
+        actions = []
+
+        def action(request):
+            actions.append('action-{0}'.format(len(actions) + 1))
+            return {'id': actions[-1]}
+
+        self.fake.route('POST', '/device/action/install', action)
+        self.fake.route('POST', '/device/action/changepartition', action)
+        self.client = self.fake.client()
+
+    def tearDown(self):
+        self.fake.stop()
+
+    def payloads(self, action):
+        return [json_body(request) for request in self.fake.received('POST', '/device/action/' + action)]
+
+    def test_upgrade_skips_installed_device_records(self):
+        waves = self.client.upgrade_devices('20.3', [device_record(i) for i in range(7)], chunk_size=2)
+        self.assertEqual([wave[0].data for wave in waves], ['action-1', 'action-2', 'action-3'])
+        payloads = self.payloads('install')
+        self.assertEqual([[device['deviceId'] for device in payload['devices']] for payload in payloads],
+                         [['u2', 'u3'], ['u4', 'u5'], ['u6']])
+        self.assertEqual(payloads[0]['devices'][0], {'deviceIP': '1.1.1.2', 'deviceId': 'u2'})
+        self.assertEqual(payloads[0]['input']['version'], '20.3')
+
+    def test_upgrade_without_skip(self):
+        self.client.upgrade_devices('20.3', [device_record(i) for i in range(3)], skip_installed=False)
+        self.assertEqual(len(self.payloads('install')[0]['devices']), 3)
+        self.assertEqual(self.fake.received('GET', '/device/action/install/devices/vedge'), [])
+
+    def test_activate_skips_active(self):
+        self.client.activate_devices('20.3', [device_record(i) for i in range(3)])
+        devices = self.payloads('changepartition')[0]['devices']
+        self.assertEqual([device['deviceId'] for device in devices], ['u1', 'u2'])
+        self.assertEqual(devices[0]['version'], '20.3')
+
+    def test_nothing_to_do(self):
+        self.assertEqual(self.client.activate_devices('20.3', [device_record(0)]), [])
+        self.assertEqual(self.payloads('changepartition'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+
+from viptela_python.inventory import DeviceInventory, device_record
+from . server import FakeVManage
+
+
+def device(i, **changes):
+    document = {'uuid': 'u{0}'.format(i), 'system-ip': '1.1.1.{0}'.format(i), 'host-name': 'edge{0}'.format(i),
+                'site-id': str(100 + i % 2), 'device-model': 'vedge-cloud', 'device-type': 'vedge',
+                'version': '20.3', 'reachability': 'reachable', 'status': 'normal'}
+    document.update(changes)
+    return document
+
+
+class DeviceRecordTest(unittest.TestCase):
+    def test_keys(self):
+        record = device_record(device(1))
+        self.assertEqual((record.uuid, record.system_ip, record.host_name, record.site_id, record.model),
+                         ('u1', '1.1.1.1', 'edge1', '101', 'vedge-cloud'))
+        # /system/device style keys
+        record = device_record({'uuid': 'u2', 'deviceId': '1.1.1.2', 'hostName': 'edge2', 'siteId': 102,
+                                'deviceModel': 'vedge-1000', 'personality': 'vedge'})
+        self.assertEqual((record.system_ip, record.host_name, record.site_id, record.model, record.device_type),
+                         ('1.1.1.2', 'edge2', '102', 'vedge-1000', 'vedge'))
+        self.assertIsNone(record.version)
+
+    def test_shared_values_are_interned(self):
+        first = device_record(device(1, version=''.join(['20', '.3'])))
+        second = device_record(device(3, version=''.join(['20.', '3'])))
+        self.assertIs(first.version, second.version)
+        self.assertIs(first.site_id, second.site_id)
+
+
+class DeviceInventoryTest(unittest.TestCase):
+    def test_indexes(self):
+        inventory = DeviceInventory(devices=[device(i) for i in range(4)])
+        self.assertEqual(len(inventory), 4)
+        self.assertIn('u2', inventory)
+        self.assertEqual(inventory.get('u1').host_name, 'edge1')
+        self.assertEqual(inventory.get('1.1.1.2').uuid, 'u2')
+        self.assertEqual(inventory.get('edge3').uuid, 'u3')
+        self.assertIsNone(inventory.get('unknown'))
+        self.assertEqual(sorted(inventory.uuids(inventory.site(100))), ['u0', 'u2'])
+        self.assertEqual(sorted(inventory.uuids(inventory.site('101'))), ['u1', 'u3'])
+        self.assertEqual(len(inventory.model('vedge-cloud')), 4)
+        self.assertEqual(sorted(inventory.system_ips()), ['1.1.1.0', '1.1.1.1', '1.1.1.2', '1.1.1.3'])
+        self.assertEqual(len(list(inventory)), 4)
+
+    def test_refresh_applies_changes_only(self):
+        inventory = DeviceInventory(devices=[device(i) for i in range(4)])
+        unchanged = inventory.get('u0')
+        added, changed, removed = inventory.refresh(devices=[
+            device(0), device(1, **{'host-name': 'renamed', 'site-id': '200'}), device(2), device(4)])
+        self.assertEqual([record.uuid for record in added], ['u4'])
+        self.assertEqual([record.uuid for record in changed], ['u1'])
+        self.assertEqual([record.uuid for record in removed], ['u3'])
+        self.assertIs(inventory.get('u0'), unchanged)
+        self.assertIsNone(inventory.get('edge1'))
+        self.assertEqual(inventory.get('renamed').uuid, 'u1')
+        self.assertEqual(inventory.uuids(inventory.site(200)), ['u1'])
+        self.assertEqual(sorted(inventory.uuids(inventory.site(101))), [])
+        self.assertNotIn('101', inventory.by_site_id)
+        self.assertIsNone(inventory.get('1.1.1.3'))
+
+    def test_refresh_without_prune(self):
+        inventory = DeviceInventory(devices=[device(i) for i in range(3)])
+        self.assertEqual(inventory.refresh(devices=[device(0)], prune=False), ([], [], []))
+        self.assertEqual(len(inventory), 3)
+
+    def test_devices_without_uuid_are_ignored(self):
+        inventory = DeviceInventory(devices=[{'system-ip': '1.1.1.1'}, device(1)])
+        self.assertEqual(inventory.uuids(), ['u1'])
+
+    def test_refresh_needs_devices_or_client(self):
+        self.assertRaises(ValueError, DeviceInventory().refresh)
+
+
+class ClientInventoryTest(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeVManage().start()
+        self.devices = [device(i) for i in range(3)]
+        self.fake.route('GET', '/device', lambda request: {'data': self.devices})
+        self.fake.route('GET', '/system/device/vedges', {'data': [
+            {'uuid': 'u9', 'deviceIP': '1.1.1.9', 'host-name': 'edge9', 'deviceModel': 'vedge-1000'}]})
+        self.client = self.fake.client()
+
+    def tearDown(self):
+        self.fake.stop()
+
+    def test_get_inventory(self):
+        inventory = self.client.get_inventory()
+        self.assertEqual(sorted(inventory.uuids()), ['u0', 'u1', 'u2'])
+        del self.devices[0]
+        added, changed, removed = inventory.refresh()
+        self.assertEqual([record.uuid for record in removed], ['u0'])
+
+    def test_sources_are_pruned_separately(self):
+        inventory = self.client.get_inventory()
+        added, changed, removed = inventory.refresh('vedges')
+        self.assertEqual([record.uuid for record in added], ['u9'])
+        self.assertEqual(len(inventory), 4)
+        self.assertEqual(inventory.get('u9').model, 'vedge-1000')
+
+
+if __name__ == '__main__':
+    unittest.main()
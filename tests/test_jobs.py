@@ -0,0 +1,89 @@
+import unittest
+
+from viptela_python.exceptions import JobTimeoutError
+from viptela_python.jobs import JobWaiter, device_key, device_status
+from . server import FakeVManage
+
+SERVER_ERROR = (500, {'error': {'message': 'Server error', 'details': ''}})
+
+
+def job(*statuses, **kwargs):
+    """
+    Status document of a job with one device per status
+    """
+    document = {'data': [{'uuid': 'd{0}'.format(i), 'statusId': status} for i, status in enumerate(statuses)]}
+    if 'summary' in kwargs:
+        document['summary'] = {'status': kwargs['summary']}
+    return document
+
+
+class JobHelpersTest(unittest.TestCase):
+    def test_device_status_and_key(self):
+        self.assertEqual(device_status({'statusId': 'In Progress'}), 'in_progress')
+        self.assertEqual(device_status({'status': 'Success'}), 'success')
+        self.assertEqual(device_key({'deviceIP': '1.1.1.1'}), '1.1.1.1')
+        self.assertEqual(device_key({'uuid': 'u1', 'system-ip': '1.1.1.1'}), 'u1')
+
+
+class JobWaiterTest(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeVManage().start()
+        self.client = self.fake.client()
+
+    def tearDown(self):
+        self.fake.stop()
+
+    def sequence(self, action_id, *replies):
+        replies = list(replies)
+        self.fake.route('GET', '/device/action/status/' + action_id,
+                        lambda request: replies.pop(0) if len(replies) > 1 else replies[0])
+
+    def test_updates_on_change_only(self):
+        self.sequence('a', job('in_progress', 'in_progress'), job('in_progress', 'in_progress'),
+                      job('success', 'in_progress'), job('success', 'failure'))
+        self.sequence('b', job('success', summary='done'))
+        updates = list(self.client.wait_for_jobs(['a', 'b'], interval=0.001))
+        self.assertEqual([(update.action_id, update.device_id, update.status, update.done)
+                          for update in updates if update.action_id == 'a'],
+                         [('a', 'd0', 'in_progress', False), ('a', 'd1', 'in_progress', False),
+                          ('a', 'd0', 'success', False), ('a', 'd1', 'failure', True)])
+        self.assertEqual([update.done for update in updates if update.action_id == 'b'], [True])
+
+    def test_wait(self):
+        self.sequence('a', job('in_progress'), job('success'))
+        self.assertEqual(self.client.wait_for_jobs('a', interval=0.001).wait(), {'a': {'d0': 'success'}})
+
+    def test_timeout(self):
+        self.sequence('a', job('in_progress'))
+        waiter = self.client.wait_for_jobs('a', interval=0.01, timeout=0.05)
+        with self.assertRaises(JobTimeoutError) as context:
+            waiter.wait()
+        self.assertEqual(context.exception.pending, ['a'])
+
+    def test_transient_errors_are_retried(self):
+        self.sequence('a', SERVER_ERROR, SERVER_ERROR, job('success'))
+        waiter = self.client.wait_for_jobs('a', interval=0.001, max_errors=3)
+        self.assertEqual(waiter.wait(), {'a': {'d0': 'success'}})
+        self.assertEqual(waiter.errors, {})
+
+    def test_failing_job_is_given_up(self):
+        self.sequence('a', SERVER_ERROR)
+        self.sequence('b', job('in_progress'), job('success'))
+        # No timeout, so this only returns because the failing job is dropped
+        waiter = self.client.wait_for_jobs(['a', 'b'], interval=0.001, max_errors=3)
+        failed = [update for update in waiter if update.action_id == 'a']
+        self.assertEqual(len(failed), 1)
+        self.assertEqual((failed[0].device_id, failed[0].status, failed[0].done), (None, 'error', True))
+        self.assertEqual(failed[0].entry.status_code, 500)
+        self.assertIs(waiter.errors['a'], failed[0].entry)
+        self.assertEqual(waiter.pending, set())
+        self.assertEqual(len(self.fake.received('GET', '/device/action/status/a')), 3)
+
+    def test_errors_must_be_consecutive(self):
+        self.sequence('a', SERVER_ERROR, SERVER_ERROR, job('in_progress'), SERVER_ERROR, SERVER_ERROR, job('success'))
+        updates = list(JobWaiter(self.client, 'a', interval=0.001, max_errors=3))
+        self.assertEqual([update.status for update in updates], ['in_progress', 'success'])
+
+
+if __name__ == '__main__':
+    unittest.main()
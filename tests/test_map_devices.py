@@ -0,0 +1,78 @@
+import threading
+import time
+import unittest
+
+from . server import FakeVManage
+
+
+class MapDevicesTest(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeVManage().start()
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+        def arp(request):
+            with self.lock:
+                self.active += 1
+                self.peak = max(self.peak, self.active)
+            time.sleep(0.01)
+            with self.lock:
+                self.active -= 1
+            if request.query['deviceId'] == 'bad':
+                return (400, {'error': {'message': 'Unknown device', 'details': 'bad'}})
+            return {'data': [{'device': request.query['deviceId']}]}
+
+        self.fake.route('GET', '/device/arp', arp)
+        self.client = self.fake.client(pool_maxsize=20)
+
+    def tearDown(self):
+        self.fake.stop()
+
+    def test_every_device_once(self):
+        device_ids = ['10.0.0.{0}'.format(i) for i in range(60)]
+        results = dict(self.client.map_devices('get_arp_table', device_ids, max_workers=8))
+        self.assertEqual(sorted(results), sorted(device_ids))
+        for device_id, result in results.items():
+            self.assertTrue(result.ok)
+            self.assertEqual(result.data, [{'device': device_id}])
+
+    def test_concurrency_is_bounded(self):
+        list(self.client.map_devices('get_arp_table', range(40), max_workers=4))
+        self.assertLessEqual(self.peak, 4)
+        self.assertGreater(self.peak, 1)
+
+    def test_failures_are_results(self):
+        def broken(device_id):
+            raise RuntimeError(device_id)
+
+        results = dict(self.client.map_devices('get_arp_table', ['ok', 'bad']))
+        self.assertTrue(results['ok'].ok)
+        self.assertEqual(results['bad'].status_code, 400)
+
+        results = dict(self.client.map_devices(broken, [1, 2]))
+        self.assertFalse(results[1].ok)
+        self.assertIsInstance(results[1].error, RuntimeError)
+
+    def test_lazy_device_ids_and_early_stop(self):
+        consumed = []
+
+        def device_ids():
+            for i in range(1000):
+                consumed.append(i)
+                yield i
+
+        results = self.client.map_devices('get_arp_table', device_ids(), max_workers=2)
+        next(results)
+        results.close()
+        # Only a bounded number of calls is queued ahead of the consumer
+        self.assertLess(len(consumed), 10)
+
+    def test_extra_arguments(self):
+        self.fake.route('GET', '/template/config/attached/uuid-1', {'config': 'attached'})
+        results = dict(self.client.map_devices('get_running_config', ['uuid-1'], attached=True))
+        self.assertEqual(results['uuid-1'].data, 'attached')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import time
+import unittest
+
+from viptela_python.ratelimit import AdaptiveRateLimiter, TokenBucket
+from . server import FakeVManage
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_reserve(self):
+        bucket = TokenBucket(10, burst=2)
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertAlmostEqual(bucket.reserve(), 0.1, places=2)
+        self.assertAlmostEqual(bucket.reserve(), 0.2, places=2)
+
+    def test_set_rate(self):
+        bucket = TokenBucket(10, burst=1)
+        bucket.reserve()
+        bucket.set_rate(1)
+        self.assertAlmostEqual(bucket.reserve(), 1, places=1)
+
+
+class AdaptiveRateLimiterTest(unittest.TestCase):
+    def test_kind(self):
+        limiter = AdaptiveRateLimiter()
+        self.assertEqual(limiter.kind('get'), 'read')
+        self.assertEqual(limiter.kind('POST'), 'write')
+        self.assertEqual(limiter.kind('POST', '/statistics/interface'), 'read')
+        self.assertEqual(limiter.kind('POST', '/statistics/interface/page?scrollId=x'), 'read')
+        self.assertEqual(limiter.kind('POST', '/template/device/config/input/'), 'read')
+        self.assertEqual(limiter.kind('POST', '/template/device/config/attachfeature'), 'write')
+        self.assertEqual(limiter.kind('PUT', '/statistics/settings'), 'write')
+        self.assertEqual(AdaptiveRateLimiter(read_only_posts=()).kind('POST', '/statistics/interface'), 'write')
+
+    def test_throttle_and_recovery(self):
+        limiter = AdaptiveRateLimiter(read_rate=20, recovery=1.0, cooldown=0)
+        limiter.record('GET', 429, 0.1)
+        self.assertEqual(limiter.rate('GET'), 10)
+        self.assertEqual(limiter.rate('POST'), 5)
+        time.sleep(0.05)
+        limiter.record('GET', 200, 0.1)
+        self.assertTrue(10 < limiter.rate('GET') <= 20)
+
+    def test_slow_responses(self):
+        limiter = AdaptiveRateLimiter(write_rate=4, latency_threshold=1, latency_smoothing=1, cooldown=0)
+        limiter.record('POST', 200, 2, '/statistics/interface')
+        self.assertEqual(limiter.rate('POST'), 4)
+        limiter.record('POST', 200, 2)
+        self.assertEqual(limiter.rate('POST'), 2)
+        self.assertEqual(limiter.rate('POST', '/statistics/interface'), 10)
+
+
+class RecordingLimiter(AdaptiveRateLimiter):
+    def __init__(self, **kwargs):
+        super(RecordingLimiter, self).__init__(**kwargs)
+        self.records = []
+
+    def record(self, method, status_code, latency, path=None):
+        self.records.append((method, status_code, latency, path))
+        super(RecordingLimiter, self).record(method, status_code, latency, path)
+
+
+class ClientRateLimitTest(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeVManage().start()
+
+    def tearDown(self):
+        self.fake.stop()
+
+    def test_body_download_is_not_latency(self):
+        def slow_body(request):
+            def chunks():
+                yield b'{"data": ['
+                time.sleep(0.3)
+                yield b'{"uuid": "u1"}]}'
+            return 200, chunks(), {'Content-Type': 'application/json'}
+
+        self.fake.route('GET', '/device', slow_body)
+        limiter = RecordingLimiter(latency_threshold=0.2, latency_smoothing=1, cooldown=0)
+        client = self.fake.client(rate_limiter=limiter)
+        self.assertEqual(client.get_all_devices()[0].data, [{'uuid': 'u1'}])
+        method, status_code, latency, path = limiter.records[-1]
+        self.assertEqual((method, status_code, path), ('GET', 200, '/device'))
+        self.assertLess(latency, 0.2)
+        self.assertEqual(limiter.rate('GET'), 20)
+
+    def test_statistics_use_the_read_bucket(self):
+        self.fake.route('POST', '/statistics/interface', {'data': [], 'pageInfo': {'moreEntries': False}})
+        limiter = RecordingLimiter()
+        client = self.fake.client(rate_limiter=limiter)
+        client.get_statistics('interface', {'query': {}})
+        path = limiter.records[-1][3]
+        self.assertEqual(limiter.kind('POST', path), 'read')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+if numpy is not None:
+    from viptela_python.rates import CounterRates
+
+
+def interfaces(name, tx, rx=0, lastupdated=None, device='1.1.1.1'):
+    row = {'vdevice-name': device, 'vpn-id': 0, 'ifname': name, 'tx-octets': tx, 'rx-octets': rx}
+    if lastupdated is not None:
+        row['lastupdated'] = lastupdated
+    return row
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class CounterRatesTest(unittest.TestCase):
+    def test_rates(self):
+        rates = CounterRates.for_interfaces()
+        self.assertEqual(len(rates.update([interfaces('ge0/0', 1000, 10), interfaces('ge0/1', 0)], 100)), 0)
+        sample = rates.update([interfaces('ge0/0', 4000, 40), interfaces('ge0/2', 10)], 110)
+        self.assertEqual(len(sample), 1)
+        self.assertEqual(sample.key(0), {'vdevice-name': '1.1.1.1', 'vpn-id': '0', 'ifname': 'ge0/0'})
+        self.assertEqual(sample.deltas['tx-octets'].tolist(), [3000])
+        self.assertEqual(sample.rates['tx-octets'].tolist(), [300])
+        self.assertEqual(sample.talkers(), [(sample.key(0), 303.0)])
+        self.assertEqual(sample.resets.tolist(), [False])
+
+    def test_time_column(self):
+        rates = CounterRates.for_interfaces()
+        rates.update([interfaces('ge0/0', 0, lastupdated=1000000)], 0)
+        sample = rates.update([interfaces('ge0/0', 500, lastupdated=1005000)], 0)
+        self.assertEqual(sample.interval.tolist(), [5])
+        self.assertEqual(sample.rates['tx-octets'].tolist(), [100])
+
+    def test_reset_below_wrap_point(self):
+        rates = CounterRates.for_interfaces()
+        rates.update([interfaces('ge0/0', 3e9), interfaces('ge0/1', 1000)], 0)
+        sample = rates.update([interfaces('ge0/0', 5000), interfaces('ge0/1', 9000)], 300)
+        self.assertEqual(sample.deltas['tx-octets'].tolist(), [5000, 8000])
+        self.assertEqual(sample.resets.tolist(), [True, False])
+        self.assertEqual(sample.talkers(1)[0][0]['ifname'], 'ge0/1')
+
+    def test_wrap(self):
+        rates = CounterRates.for_interfaces()
+        rates.update([interfaces('ge0/0', 2 ** 32 - 1000)], 0)
+        sample = rates.update([interfaces('ge0/0', 5000)], 300)
+        self.assertEqual(sample.deltas['tx-octets'].tolist(), [6000])
+        self.assertEqual(sample.resets.tolist(), [False])
+
+    def test_implausible_wrap_is_a_reset(self):
+        rates = CounterRates.for_interfaces(max_rate=100)
+        rates.update([interfaces('ge0/0', 2 ** 32 - 1000)], 0)
+        sample = rates.update([interfaces('ge0/0', 5000)], 10)
+        self.assertEqual(sample.deltas['tx-octets'].tolist(), [5000])
+        self.assertEqual(sample.resets.tolist(), [True])
+
+    def test_counter_bits(self):
+        rates = CounterRates.for_interfaces(counter_bits=64)
+        rates.update([interfaces('ge0/0', 2 ** 32 - 1000)], 0)
+        self.assertEqual(rates.update([interfaces('ge0/0', 5000)], 300).resets.tolist(), [True])
+
+        rates = CounterRates.for_interfaces(counter_bits=16)
+        rates.update([interfaces('ge0/0', 65000)], 0)
+        self.assertEqual(rates.update([interfaces('ge0/0', 100)], 300).deltas['tx-octets'].tolist(), [636])
+
+        rates = CounterRates.for_interfaces(counter_bits=None)
+        rates.update([interfaces('ge0/0', 2 ** 32 - 1000)], 0)
+        self.assertEqual(rates.update([interfaces('ge0/0', 5000)], 300).resets.tolist(), [True])
+
+    def test_interleaved_devices(self):
+        rates = CounterRates.for_interfaces()
+        rates.update([interfaces('ge0/0', 1000, device='1.1.1.1')], 0)
+        rates.update([interfaces('ge0/0', 5000, device='2.2.2.2'), interfaces('ge0/1', 0, device='2.2.2.2')], 5)
+        self.assertEqual(len(rates), 3)
+        sample = rates.update([interfaces('ge0/0', 2000, device='1.1.1.1')], 10)
+        self.assertEqual(len(sample), 1)
+        self.assertEqual(sample.key(0)['vdevice-name'], '1.1.1.1')
+        self.assertEqual(sample.rates['tx-octets'].tolist(), [100])
+        sample = rates.update([interfaces('ge0/0', 6000, device='2.2.2.2'),
+                               interfaces('ge0/1', 20, device='2.2.2.2')], 15)
+        self.assertEqual(sample.deltas['tx-octets'].tolist(), [1000, 20])
+        self.assertEqual(len(rates), 3)
+
+    def test_longer_keys_are_inserted_whole(self):
+        rates = CounterRates.for_interfaces()
+        rates.update([interfaces('ge0/0', 0, device='1.1.1.1')], 0)
+        rates.update([interfaces('loopback1000', 0, device='10.100.100.100')], 5)
+        sample = rates.update([interfaces('loopback1000', 50, device='10.100.100.100')], 10)
+        self.assertEqual(sample.key(0), {'vdevice-name': '10.100.100.100', 'vpn-id': '0', 'ifname': 'loopback1000'})
+
+    def test_max_age(self):
+        rates = CounterRates.for_interfaces(max_age=60)
+        rates.update([interfaces('ge0/0', 0, device='1.1.1.1')], 0)
+        rates.update([interfaces('ge0/0', 0, device='2.2.2.2')], 50)
+        rates.update([interfaces('ge0/0', 100, device='2.2.2.2')], 100)
+        self.assertEqual(len(rates), 1)
+        self.assertEqual(len(rates.update([interfaces('ge0/0', 100, device='1.1.1.1')], 110)), 0)
+
+    def test_missing_counter(self):
+        rates = CounterRates.for_interfaces()
+        rates.update([interfaces('ge0/0', 1000), interfaces('ge0/1', 1000)], 0)
+        row = interfaces('ge0/1', 2000)
+        del row['rx-octets']
+        sample = rates.update([interfaces('ge0/0', 2000), row], 10)
+        self.assertEqual(sample.deltas['rx-octets'][0], 0)
+        self.assertTrue(numpy.isnan(sample.deltas['rx-octets'][1]))
+        self.assertEqual([rate for key, rate in sample.talkers()], [100.0, 100.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import time
+import unittest
+
+from viptela_python.exceptions import LoginCredentialsError
+from viptela_python.viptela import session_expired
+from . server import FakeVManage, json_body
+
+LOGIN_PAGE = (200, '<html><body>login</body></html>', {'Content-Type': 'text/html'})
+
+
+class ReauthTest(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeVManage().start()
+
+        def guarded(reply):
+            def handler(request):
+                time.sleep(0.005)
+                if request.headers.get('Cookie') != 'JSESSIONID={0}'.format(self.fake.session_id):
+                    return LOGIN_PAGE
+                return reply(request) if callable(reply) else reply
+            return handler
+
+        self.fake.route('GET', '/device/arp', guarded({'data': [{'ok': 1}]}))
+        self.fake.route('GET', '/device', guarded({'data': [{'uuid': 'u{0}'.format(i)} for i in range(100)]}))
+        self.fake.route('PUT', '/settings/configuration/banner', guarded(lambda request: {'data': json_body(request)}))
+
+    def tearDown(self):
+        self.fake.stop()
+
+    def test_single_login_for_concurrent_expired_requests(self):
+        client = self.fake.client(thread_safe=True, pool_maxsize=50)
+        client.login()
+        self.fake.session_id = 2
+        results = list(client.map_devices('get_arp_table', range(200), max_workers=50))
+        self.assertTrue(all(result.ok and result.data == [{'ok': 1}] for device_id, result in results))
+        self.assertEqual(self.fake.logins, 2)
+
+    def test_streamed_and_body_requests_are_replayed(self):
+        client = self.fake.client()
+        client.login()
+        self.fake.session_id = 2
+        self.assertEqual(len(list(client.iter_all_devices())), 100)
+        self.fake.session_id = 3
+        result = client.set_banner('hello')[0]
+        self.assertEqual(result.data, {'mode': 'on', 'bannerDetail': 'hello'})
+        self.assertEqual(self.fake.logins, 3)
+
+    def test_auto_reauth_off(self):
+        client = self.fake.client(auto_reauth=False)
+        client.login()
+        self.fake.session_id = 2
+        result = client.get_arp_table('1.1.1.1')[0]
+        self.assertEqual(result.response.headers['Content-Type'], 'text/html')
+        self.assertEqual(self.fake.logins, 1)
+
+    def test_failed_relogin_raises(self):
+        client = self.fake.client()
+        client.login()
+        self.fake.session_id = 2
+        self.fake.route('POST', '/j_security_check', LOGIN_PAGE)
+        self.assertRaises(LoginCredentialsError, client.get_arp_table, '1.1.1.1')
+
+    def test_session_expired(self):
+        class Response(object):
+            def __init__(self, status_code, content_type, content):
+                self.status_code = status_code
+                self.headers = {'Content-Type': content_type}
+                self.content = content
+
+        self.assertTrue(session_expired(Response(401, 'application/json', b'')))
+        self.assertTrue(session_expired(Response(200, 'text/html;charset=UTF-8', b'')))
+        self.assertTrue(session_expired(Response(200, '', b'  <HTML><body>')))
+        self.assertFalse(session_expired(Response(200, '', b'  <HTML><body>'), check_body=False))
+        self.assertFalse(session_expired(Response(200, 'application/json', b'{"data": []}')))
+        self.assertFalse(session_expired(Response(500, 'text/html', b'<html>')))
+
+
+if __name__ == '__main__':
+    unittest.main()
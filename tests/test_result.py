@@ -0,0 +1,94 @@
+import json
+import unittest
+
+import requests
+
+from viptela_python.codec import JSONCodec
+from viptela_python.viptela import Result, failed_result, parse_response
+from . server import FakeVManage
+
+
+class CountingCodec(JSONCodec):
+    def __init__(self):
+        self.loads_calls = 0
+
+    def loads(self, data):
+        self.loads_calls += 1
+        return super(CountingCodec, self).loads(data)
+
+
+def make_response(method, status_code, body):
+    response = requests.Response()
+    response.status_code = status_code
+    response.reason = 'Reason'
+    response._content = body if isinstance(body, bytes) else json.dumps(body).encode('utf-8')
+    response.encoding = 'utf-8'
+    response.request = requests.Request(method, 'http://vmanage/dataservice/x').prepare()
+    return response
+
+
+class ResultTest(unittest.TestCase):
+    def test_body_decoded_once_on_first_access(self):
+        codec = CountingCodec()
+        result = parse_response(make_response('GET', 200, {'data': [{'a': 1}]}), codec)
+        self.assertTrue(result.ok)
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(codec.loads_calls, 0)
+
+        self.assertEqual(result.data, [{'a': 1}])
+        self.assertEqual(result.error, '')
+        self.assertEqual(result[4], [{'a': 1}])
+        self.assertEqual(list(result)[4], [{'a': 1}])
+        self.assertEqual(result.document, {'data': [{'a': 1}]})
+        self.assertEqual(codec.loads_calls, 1)
+
+    def test_get_payload_keys(self):
+        result = parse_response(make_response('GET', 200, {'config': 'system\n'}))
+        self.assertEqual(result.data, 'system\n')
+        result = parse_response(make_response('GET', 200, {'data': [], 'header': {}}))
+        self.assertEqual(result.data, {'data': [], 'header': {}})
+        self.assertEqual(result.error, 'No data received from device')
+
+    def test_post_payloads(self):
+        self.assertEqual(parse_response(make_response('POST', 200, {'id': 'job-1'})).data, 'job-1')
+        self.assertEqual(parse_response(make_response('POST', 200, {'data': [1]})).data, [1])
+        self.assertEqual(parse_response(make_response('POST', 200, b'')).data, '')
+        self.assertEqual(parse_response(make_response('POST', 200, b'<html>')).data, '<html>')
+
+    def test_http_error(self):
+        body = {'error': {'message': 'Bad input', 'details': 'Missing deviceId'}}
+        result = parse_response(make_response('GET', 400, body))
+        self.assertFalse(result.ok)
+        self.assertEqual(result.error, 'Bad input')
+        self.assertEqual(result.reason, 'Missing deviceId')
+        self.assertEqual(result.data, {})
+
+    def test_tuple_behaviour(self):
+        result = parse_response(make_response('GET', 200, {'data': [1, 2]}))
+        ok, status_code, error, reason, data, response, text = result
+        self.assertEqual((ok, status_code, data), (True, 200, [1, 2]))
+        self.assertEqual(result._asdict()['data'], [1, 2])
+        self.assertEqual(result[:2], (True, 200))
+        self.assertIn('deferred data', repr(result))
+        self.assertIsNotNone(result.body)
+
+    def test_failed_result(self):
+        error = IOError('unreachable')
+        result = failed_result(error)
+        self.assertIsInstance(result, Result)
+        self.assertFalse(result.ok)
+        self.assertIs(result.error, error)
+        self.assertIsNone(result.body)
+        self.assertIsNone(result.document)
+
+    def test_get_through_client(self):
+        with FakeVManage() as fake:
+            fake.route('GET', '/device', {'header': {}, 'data': [{'uuid': 'a'}]})
+            result, url, payload = fake.client().get_all_devices()
+        self.assertTrue(result.ok)
+        self.assertEqual(result.data, [{'uuid': 'a'}])
+        self.assertTrue(url.endswith('/dataservice/device'))
+
+
+if __name__ == '__main__':
+    unittest.main()
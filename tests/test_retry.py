@@ -0,0 +1,148 @@
+import time
+import unittest
+
+from requests.exceptions import ChunkedEncodingError, ConnectionError
+
+from viptela_python.exceptions import CircuitOpenError, LoginCredentialsError
+from viptela_python.retry import CircuitBreaker, RetryBudget, RetryPolicy
+from . server import FakeVManage
+
+SERVER_ERROR = (500, {'error': {'message': 'Server error', 'details': ''}})
+LOGIN_PAGE = (200, '<html><body>login</body></html>', {'Content-Type': 'text/html'})
+
+
+class Response(object):
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class RetryPolicyTest(unittest.TestCase):
+    def test_backoff(self):
+        policy = RetryPolicy(backoff_factor=0.5, max_backoff=3, jitter=False)
+        self.assertEqual([policy.backoff(attempt) for attempt in range(5)], [0.5, 1, 2, 3, 3])
+        self.assertEqual(policy.backoff(0, Response(503, {'Retry-After': '2'})), 2)
+        self.assertEqual(policy.backoff(0, Response(503, {'Retry-After': '120'})), 3)
+        jittered = RetryPolicy(backoff_factor=1)
+        self.assertTrue(all(0 <= jittered.backoff(2) <= 4 for i in range(20)))
+
+    def test_methods_and_status_codes(self):
+        policy = RetryPolicy(total=2, jitter=False)
+        self.assertIsNotNone(policy.delay('GET', 0, response=Response(503)))
+        self.assertIsNone(policy.delay('GET', 2, response=Response(503)))
+        self.assertIsNone(policy.delay('GET', 0, response=Response(404)))
+        self.assertIsNone(policy.delay('POST', 0, response=Response(503)))
+        self.assertIsNone(policy.delay('POST', 0, error=ConnectionError('reset'), not_sent=False))
+        self.assertIsNotNone(policy.delay('POST', 0, error=ConnectionError('refused'), not_sent=True))
+
+    def test_budget(self):
+        policy = RetryPolicy(total=10, jitter=False, budget=RetryBudget(ratio=0.5, min_retries=1))
+        self.assertIsNotNone(policy.delay('GET', 0, response=Response(503)))
+        self.assertIsNone(policy.delay('GET', 1, response=Response(503)))
+        # Two new requests earn one retry
+        policy.delay('GET', 0, response=Response(200))
+        self.assertIsNotNone(policy.delay('GET', 0, response=Response(503)))
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def test_states(self):
+        breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=0.05)
+        breaker.record(False)
+        self.assertEqual(breaker.state, 'closed')
+        breaker.record(False)
+        self.assertEqual(breaker.state, 'open')
+        self.assertRaises(CircuitOpenError, breaker.before_request)
+        time.sleep(0.06)
+        self.assertTrue(breaker.before_request())
+        # Only one trial request at a time
+        self.assertRaises(CircuitOpenError, breaker.before_request)
+        breaker.record(True)
+        self.assertEqual(breaker.state, 'closed')
+        self.assertFalse(breaker.before_request())
+
+    def test_release(self):
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0)
+        breaker.record(False)
+        self.assertTrue(breaker.before_request())
+        breaker.release()
+        self.assertTrue(breaker.before_request())
+
+
+class ClientRetryTest(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeVManage().start()
+
+    def tearDown(self):
+        self.fake.stop()
+
+    def test_retries_server_errors(self):
+        replies = [SERVER_ERROR, SERVER_ERROR, {'data': [1]}]
+        self.fake.route('GET', '/device/arp', lambda request: replies.pop(0))
+        client = self.fake.client(retry=RetryPolicy(backoff_factor=0.01))
+        self.assertEqual(client.get_arp_table('1.1.1.1')[0].data, [1])
+        self.assertEqual(len(self.fake.received('GET', '/device/arp')), 3)
+
+    def test_post_is_not_retried(self):
+        self.fake.route('POST', '/template/device/config/attachfeature', SERVER_ERROR)
+        client = self.fake.client(retry=RetryPolicy(backoff_factor=0.01))
+        client.attach_feature_to_devices('t1', [{'csv-deviceId': 'u1'}])
+        self.assertEqual(len(self.fake.received('POST', '/template/device/config/attachfeature')), 1)
+
+    def test_open_circuit_fails_fast(self):
+        self.fake.route('GET', '/device/arp', SERVER_ERROR)
+        client = self.fake.client(circuit_breaker=CircuitBreaker(failure_threshold=3, recovery_timeout=60))
+        for i in range(3):
+            client.get_arp_table('1.1.1.1')
+        self.assertRaises(CircuitOpenError, client.get_arp_table, '1.1.1.1')
+        self.assertEqual(len(self.fake.received('GET', '/device/arp')), 3)
+
+    def test_half_open_recovers_after_unexpected_error(self):
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0.05)
+        client = self.fake.client(circuit_breaker=breaker)
+        client.login()
+        self.fake.route('GET', '/device/arp', SERVER_ERROR)
+        client.get_arp_table('1.1.1.1')
+        self.assertEqual(breaker.state, 'open')
+
+        # The trial request fails re-logging in
+        time.sleep(0.06)
+        self.fake.session_id = 2
+        self.fake.route('GET', '/device/arp', LOGIN_PAGE)
+        self.fake.route('POST', '/j_security_check', LOGIN_PAGE)
+        self.assertRaises(LoginCredentialsError, client.get_arp_table, '1.1.1.1')
+        self.assertEqual(breaker.state, 'open')
+
+        # The trial request breaks reading the body
+        time.sleep(0.06)
+
+        def broken(*args, **kwargs):
+            raise ChunkedEncodingError('Connection broken')
+
+        client._send_authenticated = broken
+        self.assertRaises(ChunkedEncodingError, client.get_arp_table, '1.1.1.1')
+        del client._send_authenticated
+
+        time.sleep(0.06)
+        self.fake.route('GET', '/device/arp', {'data': [1]})
+        self.assertEqual(client.get_arp_table('1.1.1.1')[0].data, [1])
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_interrupted_trial_is_released(self):
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0)
+        client = self.fake.client(circuit_breaker=breaker)
+        breaker.record(False)
+
+        def interrupted(*args, **kwargs):
+            raise KeyboardInterrupt()
+
+        client._send_authenticated = interrupted
+        self.assertRaises(KeyboardInterrupt, client.get_arp_table, '1.1.1.1')
+        self.assertEqual(breaker.failures, 1)
+        del client._send_authenticated
+        self.fake.route('GET', '/device/arp', {'data': [1]})
+        self.assertEqual(client.get_arp_table('1.1.1.1')[0].data, [1])
+        self.assertEqual(breaker.state, 'closed')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import threading
+import time
+import unittest
+
+from viptela_python.snapshot import SnapshotStore
+from . server import FakeVManage
+
+DEVICES = ['1.1.1.{0}'.format(i) for i in range(4)]
+
+
+class SnapshotStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeVManage().start()
+        self.rx_pkts = dict((device_id, 100) for device_id in DEVICES)
+        self.delay = 0
+
+        def reply(document):
+            def handler(request):
+                time.sleep(self.delay)
+                return document(request.query['deviceId']) if callable(document) else document
+            return handler
+
+        self.fake.route('GET', '/device/bgp/neighbors', reply(lambda device_id: {'data': [
+            {'peer-addr': '10.0.0.1', 'state': 'established', 'as': '65000', 'vpn-id': '1'},
+            {'peer-addr': '10.0.0.2', 'state': 'idle' if device_id == '1.1.1.1' else 'established', 'as': 'x'},
+        ]}))
+        self.fake.route('GET', '/device/omp/peers', reply(lambda device_id: {'data': [
+            {'peer': '2.2.2.{0}'.format(i), 'state': 'up', 'type': 'vsmart'}
+            for i in range(0 if device_id == '1.1.1.2' else 2)
+        ]}))
+        self.fake.route('GET', '/device/omp/summary', reply(lambda device_id: (
+            (500, {'error': {'message': 'Timed out', 'details': ''}}) if device_id == '1.1.1.3'
+            else {'data': [{'operstate': 'UP', 'vsmart-peers': 2}]})))
+        self.fake.route('GET', '/device/tunnel/statistics', reply(lambda device_id: {'data': [
+            {'dest-ip': '3.3.3.3', 'local-color': 'mpls', 'remote-color': 'mpls', 'rx_pkts': self.rx_pkts[device_id]},
+        ]}))
+        self.client = self.fake.client()
+        self.store = SnapshotStore()
+
+    def tearDown(self):
+        self.store.close()
+        self.fake.stop()
+
+    def test_collect_and_query(self):
+        snapshot_id = self.store.collect(self.client, DEVICES, max_workers=2, batch_size=3)
+        self.assertEqual(self.store.latest(), snapshot_id)
+        self.assertIsNotNone(self.store.snapshots()[0]['finished'])
+        down = self.store.bgp_neighbours_down()
+        self.assertEqual([(row['device_id'], row['peer_addr'], row['peer_as']) for row in down],
+                         [('1.1.1.1', '10.0.0.2', None)])
+        self.assertEqual([tuple(row) for row in self.store.omp_peers_below(2)], [('1.1.1.2', 0)])
+        self.assertEqual([(row['collection'], row['device_id']) for row in self.store.failed_devices()],
+                         [('omp_summary', '1.1.1.3')])
+        self.assertEqual(len(self.store.query('SELECT * FROM bgp_neighbours')), 8)
+
+    def test_tunnels_down_and_history(self):
+        first = self.store.collect(self.client, DEVICES)
+        self.rx_pkts['1.1.1.0'] = 200
+        self.rx_pkts['1.1.1.1'] = 200
+        self.store.collect(self.client, DEVICES)
+        self.assertEqual(sorted(row['device_id'] for row in self.store.tunnels_down()), ['1.1.1.2', '1.1.1.3'])
+        self.assertEqual([row['rx_pkts'] for row in self.store.history('tunnel_statistics', '1.1.1.0')], [100, 200])
+        self.assertRaises(ValueError, self.store.history, 'unknown', '1.1.1.0')
+        self.assertEqual(self.store.prune(keep=1), 1)
+        self.assertEqual(self.store.query('SELECT * FROM tunnel_statistics WHERE snapshot_id = ?', (first,)), [])
+
+    def test_queries_are_not_blocked_while_collecting(self):
+        previous = self.store.collect(self.client, DEVICES, collections=['omp_summary'])
+        self.delay = 0.2
+        collector = threading.Thread(target=self.store.collect, args=(self.client, DEVICES),
+                                     kwargs={'collections': ['bgp_neighbours'], 'max_workers': 1})
+        collector.start()
+        try:
+            time.sleep(0.1)
+            started = time.time()
+            latest = self.store.latest()
+            self.assertLess(time.time() - started, 0.1)
+            # The snapshot being collected is not finished, so it is not the latest
+            self.assertEqual(latest, previous)
+            self.assertTrue(collector.is_alive())
+        finally:
+            collector.join()
+        self.assertEqual(len(self.store.query('SELECT * FROM bgp_neighbours')), 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import datetime
+import unittest
+
+from viptela_python.exceptions import ResponseError
+from viptela_python.statistics import page_info, split_range, statistics_query
+from viptela_python.viptela import HTTP_RESPONSE_CODES, parse_http_error
+from . server import FakeVManage, json_body
+
+
+class Response(object):
+    def __init__(self, status_code, content, reason='Error'):
+        self.status_code = status_code
+        self.content = content
+        self.text = content.decode('utf-8')
+        self.reason = reason
+        self.ok = status_code < 400
+
+
+class Page(object):
+    def __init__(self, document):
+        self.document = document
+
+
+def page(rows, scroll_id=None, more=False):
+    document = {'data': rows}
+    if scroll_id is not None:
+        document['pageInfo'] = {'scrollId': scroll_id, 'hasMoreData': more}
+    return document
+
+
+class StatisticsHelpersTest(unittest.TestCase):
+    def test_split_range(self):
+        self.assertEqual(split_range(0, 99, 4), [(0, 24), (25, 49), (50, 74), (75, 99)])
+        self.assertEqual(split_range(0, 10, 3), [(0, 2), (3, 6), (7, 10)])
+        # No more sub-ranges than seconds
+        self.assertEqual(split_range(10, 11, 4), [(10, 10), (11, 11)])
+        self.assertEqual(split_range(5, 5, 0), [(5, 5)])
+        self.assertEqual(split_range(datetime.datetime(1970, 1, 1, 0, 0, 10), 19.5, 2), [(10, 14), (15, 19)])
+        self.assertRaises(ValueError, split_range, '2020-01-01T00:00:00 UTC', 10, 2)
+
+    def test_statistics_query(self):
+        query = statistics_query(0, datetime.datetime(1970, 1, 2), {'vdevice_name': '1.1.1.1'}, size=10)
+        self.assertEqual(query['size'], 10)
+        self.assertEqual(query['query']['rules'], [
+            {'value': ['1970-01-01T00:00:00 UTC', '1970-01-02T00:00:00 UTC'], 'field': 'entry_time',
+             'type': 'date', 'operator': 'between'},
+            {'value': ['1.1.1.1'], 'field': 'vdevice_name', 'type': 'string', 'operator': 'in'},
+        ])
+
+    def test_page_info(self):
+        def result(document):
+            return Page(document)
+
+        self.assertEqual(page_info(result({'pageInfo': {'scrollId': 's', 'hasMoreData': 'true'}})), ('s', True))
+        self.assertEqual(page_info(result({'pageInfo': {'scrollId': 's', 'hasMoreData': False}})), ('s', False))
+        self.assertEqual(page_info(result({'pageInfo': {'hasMoreData': True}})), (None, False))
+        self.assertEqual(page_info(result([])), (None, False))
+
+    def test_parse_http_error_without_error_document(self):
+        result = parse_http_error(Response(500, b'{}'))
+        self.assertFalse(result.ok)
+        self.assertEqual(result.reason, HTTP_RESPONSE_CODES[500])
+        self.assertIsInstance(result.error, KeyError)
+        self.assertEqual(result.data, {})
+
+        result = parse_http_error(Response(400, b'{"error": {"message": "Bad", "details": "Invalid"}}'))
+        self.assertEqual((result.error, result.reason), ('Bad', 'Invalid'))
+        result = parse_http_error(Response(502, b'<html>'))
+        self.assertEqual(result.reason, HTTP_RESPONSE_CODES[502])
+
+
+class IterStatisticsTest(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeVManage().start()
+
+    def tearDown(self):
+        self.fake.stop()
+
+    def test_paging(self):
+        self.fake.route('POST', '/statistics/interface', page([{'i': 0}, {'i': 1}], 's1', True))
+        pages = {'s1': page([{'i': 2}], 's2', 'true'), 's2': page([{'i': 3}], 's3', 'false')}
+        self.fake.route('POST', '/statistics/interface/page', lambda request: pages[request.query['scrollId']])
+        for prefetch in (True, False):
+            client = self.fake.client()
+            rows = list(client.iter_statistics('interface', 0, 60, page_size=2, prefetch=prefetch))
+            self.assertEqual(rows, [{'i': 0}, {'i': 1}, {'i': 2}, {'i': 3}])
+        requests = self.fake.received('POST', '/statistics/interface/page')
+        self.assertEqual([request.query['scrollId'] for request in requests], ['s1', 's2', 's1', 's2'])
+        self.assertEqual(json_body(requests[0])['size'], 2)
+
+    def test_empty_page_ends_scroll(self):
+        self.fake.route('POST', '/statistics/interface', page([], 's1', True))
+        self.assertEqual(list(self.fake.client().iter_statistics('interface', 0, 60)), [])
+        self.assertEqual(self.fake.received('POST', '/statistics/interface/page'), [])
+
+    def test_failed_query_raises(self):
+        self.fake.route('POST', '/statistics/interface', (500, {}))
+        client = self.fake.client()
+        with self.assertRaises(ResponseError) as raised:
+            list(client.iter_statistics('interface', 0, 60))
+        self.assertEqual(raised.exception.result.status_code, 500)
+
+    def test_ranges(self):
+        def query(request):
+            between = json_body(request)['query']['rules'][0]['value']
+            return page([{'range': between}])
+
+        self.fake.route('POST', '/statistics/interface', query)
+        client = self.fake.client()
+        rows = list(client.iter_statistics_ranges('interface', 0, 39, parts=4))
+        self.assertEqual(sorted(row['range'][0] for row in rows), [
+            '1970-01-01T00:00:00 UTC', '1970-01-01T00:00:10 UTC',
+            '1970-01-01T00:00:20 UTC', '1970-01-01T00:00:30 UTC',
+        ])
+        self.assertEqual(sorted(row['range'][1] for row in rows)[0], '1970-01-01T00:00:09 UTC')
+
+    def test_ranges_error(self):
+        self.fake.route('POST', '/statistics/interface', (500, {}))
+        client = self.fake.client()
+        self.assertRaises(ResponseError, list, client.iter_statistics_ranges('interface', 0, 39, parts=2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import json
+import random
+import unittest
+
+from viptela_python.exceptions import ResponseError
+from viptela_python.stream import JSONArrayStreamer, iter_json_array
+from . server import FakeVManage
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def random_value(rng, depth=0):
+    kind = rng.randint(0, 5 if depth < 3 else 3)
+    if kind == 0:
+        return rng.randint(-10 ** 6, 10 ** 6)
+    if kind == 1:
+        return rng.random() * 1e5
+    if kind == 2:
+        return rng.choice([True, False, None])
+    if kind == 3:
+        return u''.join(rng.choice(u'ab"\\\n{}[],: é☃') for i in range(rng.randint(0, 8)))
+    if kind == 4:
+        return [random_value(rng, depth + 1) for i in range(rng.randint(0, 4))]
+    return dict((u''.join(rng.choice(u'xy"\\{') for i in range(3)), random_value(rng, depth + 1))
+                for i in range(rng.randint(0, 4)))
+
+
+class JSONArrayStreamerTest(unittest.TestCase):
+    def test_every_chunk_boundary(self):
+        items = [
+            {'uuid': 'a', 'host-name': 'edge "1" [dc]', 'n': 1},
+            {'nested': {'list': [1, [2, {'x': '}'}]], 'escaped': '\\"'}},
+            'text with ] and }',
+            12.5e3,
+            None,
+            True,
+            [],
+            {},
+        ]
+        document = json.dumps({'header': {'data': ['not', 'this']}, 'data': items, 'after': [1]}).encode('utf-8')
+        # Split the document at every possible offset, and feed it a byte at a time
+        for cut in range(1, len(document)):
+            self.assertEqual(list(iter_json_array([document[:cut], document[cut:]])), items, cut)
+        self.assertEqual(list(iter_json_array(chunked(document, 1))), items)
+
+    def test_random_documents_and_chunk_sizes(self):
+        rng = random.Random(7)
+        for trial in range(300):
+            items = [random_value(rng) for i in range(rng.randint(0, 6))]
+            document = {'header': random_value(rng), 'data': items, 'tail': random_value(rng)}
+            encoded = json.dumps(document, indent=rng.choice([None, 2]), ensure_ascii=rng.random() < 0.5)
+            chunks = chunked(encoded.encode('utf-8'), rng.randint(1, 20))
+            self.assertEqual(list(iter_json_array(chunks)), items)
+
+    def test_top_level_array(self):
+        document = json.dumps([1, 'two', {'three': 3}, 4]).encode('utf-8')
+        self.assertEqual(list(iter_json_array(chunked(document, 3), key=None)), [1, 'two', {'three': 3}, 4])
+
+    def test_scalar_at_end_of_document(self):
+        streamer = JSONArrayStreamer(key=None)
+        self.assertEqual(streamer.feed(b'[1, 2'), [1])
+        self.assertRaises(ValueError, streamer.close)
+
+    def test_missing_key_and_empty_array(self):
+        self.assertEqual(list(iter_json_array([b'{"other": [1, 2]}'])), [])
+        self.assertEqual(list(iter_json_array([b'{"data": []}'])), [])
+
+    def test_truncated_and_malformed_documents(self):
+        self.assertRaises(ValueError, list, iter_json_array([b'{"data": [{"a": 1}, {"b"']))
+        self.assertRaises(ValueError, list, iter_json_array([b'[1, 2]']))
+        self.assertRaises(ValueError, list, iter_json_array([b'{"data" [1]}']))
+
+    def test_buffer_only_holds_the_current_item(self):
+        streamer = JSONArrayStreamer()
+        streamer.feed(b'{"data": [')
+        for i in range(1000):
+            self.assertEqual(streamer.feed(json.dumps({'i': i, 'pad': 'x' * 100}).encode('utf-8') + b','),
+                             [{'i': i, 'pad': 'x' * 100}])
+            self.assertLess(len(streamer._buffer), 200)
+        streamer.feed(b']}')
+        self.assertTrue(streamer.done)
+
+
+class StreamingGetterTest(unittest.TestCase):
+    def test_iter_all_devices(self):
+        devices = [{'uuid': str(i), 'host-name': 'edge{0}'.format(i)} for i in range(2000)]
+        with FakeVManage() as fake:
+            fake.route('GET', '/device', {'header': {}, 'data': devices})
+            self.assertEqual(list(fake.client().iter_all_devices()), devices)
+
+    def test_error_status_raises(self):
+        with FakeVManage() as fake:
+            fake.route('GET', '/device', (500, {'error': {'message': 'Server error', 'details': 'down'}}))
+            with self.assertRaises(ResponseError) as context:
+                list(fake.client().iter_all_devices())
+        self.assertEqual(context.exception.result.status_code, 500)
+        self.assertEqual(context.exception.result.error, 'Server error')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+
+from viptela_python.attach import template_input
+from viptela_python.exceptions import TemplateValidationError
+from . server import FakeVManage, json_body
+
+
+def devices(count=2):
+    return [{'csv-deviceId': 'u{0}'.format(i), 'uuid': 'u{0}'.format(i), 'csv-deviceIP': '10.0.0.{0}'.format(i),
+             'csv-host-name': 'edge{0}'.format(i), '//system/site-id': '100'} for i in range(count)]
+
+
+class TemplateInputTest(unittest.TestCase):
+    def test_native_input_is_used_as_is(self):
+        native = devices()
+        self.assertIs(template_input(native), native)
+
+    def test_string_input(self):
+        self.assertEqual(template_input(repr(devices())), devices())
+        self.assertRaises(ValueError, template_input, '__import__("os")')
+
+
+class TemplateMethodsTest(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeVManage().start()
+        self.fake.route('PUT', '/template/device/t1', {'data': []})
+        self.fake.route('POST', '/template/device/config/input/', {'data': []})
+        self.fake.route('POST', '/template/device/config/duplicateip', {'data': []})
+        self.fake.route('POST', '/template/device/config/attachfeature', {'id': 'attach-1'})
+        self.client = self.fake.client()
+
+    def tearDown(self):
+        self.fake.stop()
+
+    def payload(self, method, path):
+        return json_body(self.fake.received(method, path)[-1])
+
+    def test_steps_payloads(self):
+        input_devices = devices()
+        self.client.set_policy_in_template2('t1', input_devices)
+        self.assertEqual(self.payload('POST', '/template/device/config/input/'),
+                         {'deviceIds': ['u0', 'u1'], 'isEdited': True, 'isMasterEdited': True, 'templateId': 't1'})
+        self.client.set_policy_in_template3('t1', input_devices)
+        self.assertEqual(self.payload('POST', '/template/device/config/duplicateip')['device'][1],
+                         {'csv-deviceId': 'u1', 'csv-deviceIP': '10.0.0.1', 'csv-host-name': 'edge1'})
+        result = self.client.attach_feature_to_devices('t1', input_devices)[0]
+        self.assertEqual(result.data, 'attach-1')
+        template = self.payload('POST', '/template/device/config/attachfeature')['deviceTemplateList'][0]
+        self.assertEqual(template['templateId'], 't1')
+        self.assertEqual(template['device'][0], dict(devices()[0], **{'csv-templateId': 't1'}))
+        # The caller's dicts are left alone
+        self.assertEqual(input_devices, devices())
+
+    def test_string_input_sends_the_same_payloads(self):
+        self.client.attach_feature_to_devices('t1', devices())
+        native = self.payload('POST', '/template/device/config/attachfeature')
+        self.client.attach_feature_to_devices('t1', repr(devices()))
+        self.assertEqual(self.payload('POST', '/template/device/config/attachfeature'), native)
+
+    def test_set_policy_in_template(self):
+        definition = {'templateName': 'branch', 'generalTemplates': []}
+        self.client.set_policy_in_template('t1', definition, 'policy-1')
+        self.assertEqual(self.payload('PUT', '/template/device/t1'), dict(definition, policyId='policy-1'))
+        self.assertNotIn('policyId', definition)
+        self.client.set_policy_in_template('t1', repr(definition), 'policy-2')
+        self.assertEqual(self.payload('PUT', '/template/device/t1')['policyId'], 'policy-2')
+
+    def test_attach_devices_to_template(self):
+        steps = self.client.attach_devices_to_template('t1', repr(devices()))
+        self.assertEqual([step[1].rsplit('/', 1)[-1] for step in steps], ['', 'duplicateip', 'attachfeature'])
+        self.assertTrue(all(step[0].ok for step in steps))
+
+    def test_attach_devices_stops_at_failed_step(self):
+        self.fake.route('POST', '/template/device/config/duplicateip',
+                        (400, {'error': {'message': 'Bad input', 'details': ''}}))
+        steps = self.client.attach_devices_to_template('t1', devices())
+        self.assertEqual(len(steps), 2)
+        self.assertFalse(steps[-1][0].ok)
+        self.assertEqual(self.fake.received('POST', '/template/device/config/attachfeature'), [])
+
+    def test_attach_devices_validates(self):
+        clashing = devices()
+        clashing[1]['csv-deviceIP'] = clashing[0]['csv-deviceIP']
+        self.assertRaises(TemplateValidationError, self.client.attach_devices_to_template, 't1', clashing)
+        self.assertEqual(self.fake.received('POST'), [])
+        self.client.attach_devices_to_template('t1', clashing, validate=False)
+        self.assertEqual(len(self.fake.received('POST', '/template/device/config/attachfeature')), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
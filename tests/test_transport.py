@@ -0,0 +1,71 @@
+import socket
+import threading
+import unittest
+
+from viptela_python.transport import SESSION_HEADERS, PooledHTTPAdapter, SharedSession, keepalive_socket_options
+from . server import FakeVManage
+
+
+class TransportTest(unittest.TestCase):
+    def test_keepalive_socket_options(self):
+        options = keepalive_socket_options(idle=30, interval=5, count=3)
+        self.assertIn((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1), options)
+        if hasattr(socket, 'TCP_KEEPINTVL'):
+            self.assertIn((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 5), options)
+
+    def test_adapter_pool_settings(self):
+        adapter = PooledHTTPAdapter(socket_options=keepalive_socket_options(), pool_maxsize=25, pool_block=True)
+        self.assertEqual(adapter.poolmanager.connection_pool_kw['maxsize'], 25)
+        self.assertTrue(adapter.poolmanager.connection_pool_kw['block'])
+        self.assertIn((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+                      adapter.poolmanager.connection_pool_kw['socket_options'])
+
+    def test_client_session(self):
+        with FakeVManage() as fake:
+            client = fake.client(pool_maxsize=30)
+            adapter = client.session.get_adapter('https://vmanage')
+            self.assertIsInstance(adapter, PooledHTTPAdapter)
+            self.assertEqual(adapter._pool_maxsize, 30)
+            for name, value in SESSION_HEADERS.items():
+                self.assertEqual(client.session.headers[name], value)
+            self.assertIs(fake.client(tcp_keepalive=False).session.get_adapter('https://x').socket_options, None)
+
+    def test_shared_session_per_thread(self):
+        with FakeVManage() as fake:
+            fake.route('GET', '/device/arp', lambda request: {'data': [request.headers.get('Cookie')]})
+            client = fake.client(thread_safe=True)
+            self.assertIsInstance(client.session, SharedSession)
+            client.login()
+
+            sessions = []
+            cookies = []
+
+            def worker():
+                sessions.append(client.session.session)
+                cookies.append(client.get_arp_table('1.1.1.1')[0].data)
+
+            threads = [threading.Thread(target=worker) for i in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        # Each thread has its own session, sharing the login cookie and the pools
+        self.assertEqual(len(set(id(session) for session in sessions)), 4)
+        self.assertEqual(cookies, [['JSESSIONID=1']] * 4)
+        adapters = set(id(session.get_adapter('http://x')) for session in sessions)
+        self.assertEqual(len(adapters), 1)
+
+    def test_connections_are_reused(self):
+        with FakeVManage() as fake:
+            fake.route('GET', '/device/arp', {'data': []})
+            client = fake.client()
+            for i in range(5):
+                client.get_arp_table(i)
+            pools = client.session.get_adapter(fake.base_url).poolmanager.pools
+            pool = pools[list(pools.keys())[0]]
+            self.assertEqual((pool.num_connections, pool.num_requests), (1, 5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+from viptela_python.upload import MultipartFileStream, file_md5, find_software_image, lazy_md5
+from . server import FakeVManage
+
+IMAGE = os.urandom(3000)
+IMAGE_MD5 = hashlib.md5(IMAGE).hexdigest()
+
+
+class UploadTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'viptela-20.3-x86_64.tar.gz')
+        with open(self.filename, 'wb') as fileobj:
+            fileobj.write(IMAGE)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+class MultipartFileStreamTest(UploadTestCase):
+    def test_body(self):
+        progress = []
+        body = MultipartFileStream(self.filename, progress=lambda sent, total, speed: progress.append(sent))
+        self.assertEqual(len(body), body.size)
+        chunks = []
+        for chunk in iter(lambda: body.read(1000), b''):
+            chunks.append(chunk)
+        data = b''.join(chunks)
+        self.assertEqual(len(data), body.size)
+        self.assertEqual(len(body), 0)
+        boundary = body.content_type.split('boundary=')[1]
+        self.assertTrue(data.startswith('--{0}\r\n'.format(boundary).encode('ascii')))
+        self.assertIn(b'filename="viptela-20.3-x86_64.tar.gz"', data)
+        self.assertIn(b'\r\n\r\n' + IMAGE + '\r\n--{0}--\r\n'.format(boundary).encode('ascii'), data)
+        self.assertEqual(progress[-1], body.size)
+
+        body.seek(0)
+        self.assertEqual(body.read(), data)
+        self.assertRaises(Exception, body.seek, 10)
+        body.close()
+
+    def test_md5(self):
+        self.assertEqual(file_md5(self.filename), IMAGE_MD5)
+        md5 = lazy_md5(self.filename)
+        self.assertEqual(md5(), IMAGE_MD5)
+        os.remove(self.filename)
+        # Read once only
+        self.assertEqual(md5(), IMAGE_MD5)
+
+
+class FindSoftwareImageTest(unittest.TestCase):
+    def setUp(self):
+        self.calls = 0
+
+    def md5(self):
+        self.calls += 1
+        return IMAGE_MD5.upper()
+
+    def test_name_and_version_must_match(self):
+        other_platform = {'availableFiles': 'viptela-20.3-mips64.tar.gz', 'versionName': '20.3'}
+        renamed = {'availableFiles': 'viptela-20.3-x86_64.tar.gz', 'versionName': '20.1'}
+        image = {'availableFiles': 'a.tar.gz, viptela-20.3-x86_64.tar.gz', 'versionName': '20.3'}
+        self.assertIsNone(find_software_image([other_platform, renamed], '/tmp/viptela-20.3-x86_64.tar.gz', '20.3'))
+        self.assertIs(find_software_image([other_platform, image], '/tmp/viptela-20.3-x86_64.tar.gz', '20.3'),
+                      image)
+        self.assertIs(find_software_image([renamed], 'viptela-20.3-x86_64.tar.gz'), renamed)
+        self.assertIsNone(find_software_image(None, 'viptela-20.3-x86_64.tar.gz'))
+
+    def test_checksum_decides(self):
+        other = {'availableFiles': 'viptela-20.3-x86_64.tar.gz', 'versionName': '20.3', 'md5': 'ff' * 16}
+        renamed = {'availableFiles': 'upload.tar.gz', 'versionName': '20.3', 'md5': IMAGE_MD5}
+        images = [dict(other) for i in range(5)] + [renamed]
+        self.assertIs(find_software_image(images, 'viptela-20.3-x86_64.tar.gz', '20.3', md5=self.md5), renamed)
+        self.assertEqual(self.calls, 1)
+        self.assertIsNone(find_software_image([other], 'viptela-20.3-x86_64.tar.gz', '20.3', md5=self.md5))
+        # Without a local checksum the name and version decide
+        self.assertIs(find_software_image([other], 'viptela-20.3-x86_64.tar.gz', '20.3'), other)
+
+
+class FirmwareUploadTest(UploadTestCase):
+    def setUp(self):
+        super(FirmwareUploadTest, self).setUp()
+        self.fake = FakeVManage().start()
+        self.fake.route('POST', '/device/action/software/package', {'vedge': 'ok'})
+        self.client = self.fake.client()
+
+    def tearDown(self):
+        self.fake.stop()
+        super(FirmwareUploadTest, self).tearDown()
+
+    def test_upload(self):
+        self.fake.route('GET', '/device/action/software', {'data': [
+            {'availableFiles': 'viptela-20.3-mips64.tar.gz', 'versionName': '20.3'}]})
+        result = self.client.firmware_upload(self.filename, '20.3')[0]
+        self.assertTrue(result.ok)
+        request = self.fake.received('POST', '/device/action/software/package')[0]
+        self.assertIn(IMAGE, request.body)
+        self.assertTrue(request.headers['Content-Type'].startswith('multipart/form-data; boundary='))
+
+    def test_skip_existing(self):
+        self.fake.route('GET', '/device/action/software', {'data': [
+            {'availableFiles': 'other.tar.gz', 'versionName': '20.3', 'md5': IMAGE_MD5}]})
+        result = self.client.firmware_upload(self.filename, '20.3')[0]
+        self.assertEqual(result.reason, 'Already uploaded')
+        self.assertEqual(self.fake.received('POST', '/device/action/software/package'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
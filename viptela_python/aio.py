@@ -0,0 +1,621 @@
+import asyncio
+import datetime
+import os
+import time
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from collections import namedtuple
+from . attach import check_template_input, template_input
+from . exceptions import LoginCredentialsError, LoginTimeoutError, ResponseError
+from . inventory import DeviceInventory
+from . jobs import JobWaiter
+from . statistics import STATISTICS_PAGE_SIZE, page_info, split_range, statistics_query
+from . stream import STREAM_CHUNK_SIZE, JSONArrayStreamer
+from . upload import MultipartFileStream, lazy_md5
+from . viptela import HTTP_SUCCESS_CODES, Viptela, _RangeError, failed_result, parse_response, session_expired
+
+_Request = namedtuple('Request', ['method', 'url'])
+
+
+class AsyncResponse(object):
+    """
+    requests-like view of an aiohttp response whose body has been read, so
+    parse_response can handle it unchanged
+    """
+    def __init__(self, response, content, method, elapsed=None):
+        """
+        Init method for AsyncResponse class
+        :param response: aiohttp response object
+        :param content: response body bytes
+        :param method: HTTP method of the request
+        :param elapsed: Seconds from sending the request to receiving the response headers
+        """
+        self.status_code = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+        self.url = str(response.url)
+        self.encoding = response.charset or 'utf-8'
+        self.content = content
+        self.request = _Request(method, self.url)
+        self.elapsed = datetime.timedelta(seconds=elapsed or 0)
+        self._text = None
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = self.content.decode(self.encoding, 'replace')
+        return self._text
+
+    def __repr__(self):
+        return '<AsyncResponse [{0}]>'.format(self.status_code)
+
+
+class AsyncViptela(Viptela):
+    """
+    Class for use with Viptela vManage API from asyncio. Every API method of
+    Viptela returns a coroutine, which yields the same Result named tuples.
+    Use as an async context manager to login and close the session. Helpers
+    that run requests on threads, such as attach_template, ConfigBackup,
+    SnapshotStore and StatisticsCollector, need a Viptela object instead.
+    """
+    def __init__(self, user, user_pass, vmanage_server, vmanage_server_port=8443,
+                 verify=False, disable_warnings=False, timeout=10, auto_login=True, codec='auto',
+                 limit=100, cache=None, auto_reauth=True, retry=None, circuit_breaker=None, rate_limiter=None):
+        """
+        Init method for AsyncViptela class
+        :param user: API user name
+        :param user_pass: API user password
+        :param vmanage_server: vManage server IP address or Hostname
+        :param vmanage_server_port: vManage API port
+        :param verify: Verify HTTPs certificate verification
+        :param disable_warnings: Disable console warnings if ssl cert invalid
+        :param timeout: Timeout for request response
+        :param auto_login: Automatically login to vManage server when entering the context
+        :param codec: JSON codec name ('auto', 'orjson', 'rapidjson', 'ujson', 'json') or codec object
+        :param limit: Maximum number of simultaneous connections
+        :param cache: ResponseCache for slow-changing inventory and template endpoints, True for the defaults
+        :param auto_reauth: Login again and replay requests when the session expires
+        :param retry: RetryPolicy for failed requests, True for the defaults
+        :param circuit_breaker: CircuitBreaker failing requests fast while vManage is down, True for the defaults
+        :param rate_limiter: AdaptiveRateLimiter pacing requests, shared by all tasks, True for the defaults
+        """
+        if aiohttp is None:
+            raise ImportError('AsyncViptela requires aiohttp, install viptela_python[async]')
+
+        self.limit = limit
+        super(AsyncViptela, self).__init__(
+            user, user_pass, vmanage_server, vmanage_server_port=vmanage_server_port,
+            verify=verify, disable_warnings=disable_warnings, timeout=timeout,
+            auto_login=False, codec=codec, cache=cache, auto_reauth=auto_reauth, retry=retry,
+            circuit_breaker=circuit_breaker, rate_limiter=rate_limiter
+        )
+        self.auto_login = auto_login
+        # asyncio locks are bound to the running loop, see _relogin
+        self._async_login_lock = None
+
+    def _create_session(self):
+        # The aiohttp session is bound to the running loop, see _ensure_session
+        return None
+
+    async def _ensure_session(self):
+        """
+        Create the aiohttp session on first use
+        :return: aiohttp client session
+        """
+        if self.session is None:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                ssl=None if self.verify else False
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                cookie_jar=aiohttp.CookieJar(unsafe=True)
+            )
+        return self.session
+
+    async def close(self):
+        """
+        Close the aiohttp session
+        :return: None
+        """
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        if self.auto_login:
+            try:
+                self.login_result = await self.login()
+            except Exception:
+                # __aexit__ is not called when entering fails
+                await self.close()
+                raise
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def _request(self, method, url, headers=None, timeout=10, **kwargs):
+        """
+        Perform a HTTP request and read the whole body
+        :param method: HTTP method
+        :param url: url to request
+        :param headers: HTTP headers
+        :param timeout: Timeout for request response
+        :return: AsyncResponse object
+        """
+        attempt = 0
+        while True:
+            breaker = self._circuit_breaker(url)
+            trial = breaker is not None and breaker.before_request()
+            started = time.time()
+            try:
+                if self.rate_limiter is not None:
+                    await asyncio.sleep(self.rate_limiter.reserve(method, url[len(self.base_url):]))
+                started = time.time()
+                response = await self._request_authenticated(method, url, headers, timeout, **kwargs)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                self._record_outcome(breaker, method, url, None, time.time() - started)
+                not_sent = isinstance(e, aiohttp.ClientConnectorError)
+                delay = self._retry_delay(method, attempt, error=e, not_sent=not_sent)
+                if delay is None:
+                    raise
+            except Exception:
+                self._record_outcome(breaker, method, url, None, time.time() - started)
+                raise
+            except BaseException:
+                # A cancelled trial request leaves no outcome
+                if trial:
+                    breaker.release()
+                raise
+            else:
+                self._record_outcome(breaker, method, url, response.status_code, response.elapsed.total_seconds())
+                delay = self._retry_delay(method, attempt, response=response)
+                if delay is None:
+                    return response
+
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _request_authenticated(self, method, url, headers=None, timeout=10, **kwargs):
+        """
+        Perform a HTTP request, logging in again and replaying it once if the session expired
+        :param method: HTTP method
+        :param url: url to request
+        :param headers: HTTP headers
+        :param timeout: Timeout for request response
+        :return: AsyncResponse object
+        """
+        generation = self._login_generation
+        response = await self._send_once(method, url, headers=headers, timeout=timeout, **kwargs)
+        if not self.auto_reauth or url.endswith('/j_security_check') or not session_expired(response):
+            return response
+
+        await self._relogin(generation)
+        return await self._send_once(method, url, headers=headers, timeout=timeout, **kwargs)
+
+    async def _send_once(self, method, url, headers=None, timeout=10, data=None, **kwargs):
+        if callable(data):
+            # Bodies that can only be sent once are rebuilt for every attempt
+            data = data()
+        if isinstance(timeout, tuple):
+            timeout = aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+        else:
+            timeout = aiohttp.ClientTimeout(total=timeout)
+        session = await self._ensure_session()
+        started = time.time()
+        async with session.request(method, url, headers=headers, data=data,
+                                   timeout=timeout, **kwargs) as response:
+            # Like requests, elapsed stops when the headers arrive
+            elapsed = time.time() - started
+            content = await response.read()
+            return AsyncResponse(response, content, method, elapsed)
+
+    async def _relogin(self, generation):
+        """
+        Login again unless another task already did since generation
+        :param generation: login generation the expired request was sent with
+        :return: None
+        """
+        if self._async_login_lock is None:
+            self._async_login_lock = asyncio.Lock()
+        async with self._async_login_lock:
+            if self._login_generation == generation:
+                self.login_result = await self.login()
+
+    async def _get(self, session, url, headers=None, timeout=10):
+        if headers is None:
+            headers = {'Connection': 'keep-alive', 'Content-Type': 'application/json'}
+
+        result = self._cached(url)
+        if result is None:
+            response = await self._request('GET', url, headers=headers, timeout=timeout)
+            result = parse_response(response, self.codec)
+            self._remember(url, result)
+        return (result, url, '')
+
+    async def _get_stream(self, session, url, key='data', headers=None, timeout=10):
+        if headers is None:
+            headers = {'Connection': 'keep-alive', 'Content-Type': 'application/json'}
+
+        session = await self._ensure_session()
+        timeout = aiohttp.ClientTimeout(total=None, sock_read=timeout)
+        for attempt in range(2):
+            generation = self._login_generation
+            async with session.get(url, headers=headers, timeout=timeout) as response:
+                if attempt == 0 and self.auto_reauth and response.content_type == 'text/html':
+                    # Session expired, login again below and replay
+                    await response.release()
+                else:
+                    if response.status not in HTTP_SUCCESS_CODES:
+                        content = await response.read()
+                        raise ResponseError(
+                            'Request to {0} failed with status {1}'.format(url, response.status),
+                            parse_response(AsyncResponse(response, content, 'GET'), self.codec)
+                        )
+                    streamer = JSONArrayStreamer(key=key, codec=self.codec)
+                    async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                        for item in streamer.feed(chunk):
+                            yield item
+                        if streamer.done:
+                            return
+                    for item in streamer.close():
+                        yield item
+                    return
+            await self._relogin(generation)
+
+    async def _put(self, session, url, headers=None, data=None, timeout=10):
+        if headers is None:
+            headers = {'Connection': 'keep-alive', 'Content-Type': 'application/json'}
+
+        if data is None:
+            data = dict()
+
+        response = await self._request('PUT', url, headers=headers, data=data, timeout=timeout)
+        result = parse_response(response, self.codec)
+        self._invalidate_after(url, result)
+        return (result, url, data)
+
+    async def _post(self, session, url, headers=None, data=None, timeout=10):
+        if headers is None:
+            headers = {'Connection': 'keep-alive', 'Content-Type': 'application/json'}
+
+        if data is None:
+            data = dict()
+
+        response = await self._request('POST', url, headers=headers, data=data, timeout=timeout)
+        result = parse_response(response, self.codec)
+        self._invalidate_after(url, result)
+        return (result, url, data)
+
+    async def _upload(self, session, url, files, headers=None, data=None, timeout=15):
+        if headers is None:
+            headers = {'Accept-Encoding': 'gzip'}
+
+        def form():
+            form = aiohttp.FormData()
+            for name, fileobj in files.items():
+                fileobj.seek(0)
+                form.add_field(name, fileobj, filename=os.path.basename(fileobj.name))
+            return form
+
+        response = await self._request('POST', url, headers=headers, data=form, timeout=timeout)
+        return (parse_response(response, self.codec), url, '')
+
+    async def _upload_stream(self, session, url, body, headers=None, timeout=(10, 3600)):
+        if headers is None:
+            headers = {'Accept-Encoding': 'gzip'}
+        headers = dict(headers, **{'Content-Type': body.content_type, 'Content-Length': str(body.size)})
+
+        def data():
+            body.rewind()
+            return body
+
+        response = await self._request('POST', url, headers=headers, data=data, timeout=timeout)
+        return (parse_response(response, self.codec), url, '')
+
+    async def firmware_upload(self, filename, version=None, progress=None, skip_existing=True,
+                              attempts=1, timeout=(10, 3600)):
+        """
+        Upload a software image to the vManage repository, streamed from disk
+        :param filename: path of the image
+        :param version: software version of the image, used to find it in the repository
+        :param progress: Callable called with (bytes sent, total bytes, bytes per second) as the upload goes
+        :param skip_existing: Do not upload an image the repository already has
+        :param attempts: Number of times the upload is tried when the connection fails
+        :param timeout: (connect, read) timeout of the upload
+        :return: Result named tuple
+        """
+        url = '{0}/device/action/software/package'.format(self.base_url)
+        body = MultipartFileStream(filename, progress=progress)
+        md5 = lazy_md5(filename)
+        try:
+            for attempt in range(attempts):
+                if skip_existing or attempt > 0:
+                    images = (await self.get_software_images())[0]
+                    uploaded = await asyncio.get_event_loop().run_in_executor(
+                        None, self._uploaded_image, filename, version, images, md5
+                    )
+                    if uploaded is not None:
+                        return (uploaded, url, '')
+                try:
+                    return await self._upload_stream(self.session, url, body, timeout=timeout)
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                    if attempt == attempts - 1:
+                        raise
+        finally:
+            body.close()
+
+    async def _delete(self, session, url, headers=None, data=None, timeout=10):
+        if headers is None:
+            headers = {'Connection': 'keep-alive', 'Content-Type': 'application/json'}
+
+        response = await self._request('DELETE', url, headers=headers, timeout=timeout)
+        result = parse_response(response, self.codec)
+        self._invalidate_after(url, result)
+        return (result, url, '')
+
+    async def login(self):
+        """
+        Login to vManage server
+        :return: Result named tuple
+        """
+        try:
+            (login_result, url, payload) = await self._post(
+                session=self.session,
+                url='{0}/j_security_check'.format(self.base_url),
+                headers={'Content-Type': 'application/x-www-form-urlencoded'},
+                data={'j_username': self.user, 'j_password': self.user_pass},
+                timeout=self.timeout
+            )
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            raise LoginTimeoutError('Could not connect to {0}'.format(self.vmanage_server))
+
+        if login_result.response.text.startswith('<html>'):
+            raise LoginCredentialsError('Could not login to device, check user credentials')
+        else:
+            self._login_generation += 1
+            return login_result
+
+    async def upgrade_devices(self, version, devices, chunk_size=200, skip_installed=True):
+        """
+        Upload firmware to many devices, one request per wave of chunk_size devices
+        :param version: Software version to install
+        :param devices: List of (ip_address, device_uuid) tuples, or device dicts
+        :param chunk_size: Maximum number of devices per request
+        :param skip_installed: Skip devices that check_firmware shows already have the version
+        :return: list of (Result, url, payload) tuples, one per wave, whose data is the action ID
+        """
+        firmware = (await self.check_firmware())[0] if skip_installed else None
+        waves = self._device_action_waves('install', version, devices, chunk_size, firmware)
+        return [await self._post(self.session, url, data=self.codec.dumps(payload)) for url, payload in waves]
+
+    async def activate_devices(self, version, devices, chunk_size=200, skip_active=True):
+        """
+        Change Partition on many devices, one request per wave of chunk_size devices
+        :param version: Software version to activate
+        :param devices: List of (ip_address, device_uuid) tuples, or device dicts
+        :param chunk_size: Maximum number of devices per request
+        :param skip_active: Skip devices that check_firmware shows already run the version
+        :return: list of (Result, url, payload) tuples, one per wave, whose data is the action ID
+        """
+        firmware = (await self.check_firmware())[0] if skip_active else None
+        waves = self._device_action_waves('changepartition', version, devices, chunk_size, firmware)
+        return [await self._post(self.session, url, data=self.codec.dumps(payload)) for url, payload in waves]
+
+    async def attach_devices_to_template(self, template_id, template, validate=True):
+        """
+        Run the config input, duplicate IP check and attach steps for a device
+        template, parsing the device list once and stopping at the first failed step
+        :param template_id: Device template ID
+        :param template: List of device input dicts, or its Python-literal string
+        :param validate: Validate the input locally before sending it, raising TemplateValidationError
+        :return: list of (Result, url, payload) tuples of the steps run
+        """
+        devices = template_input(template)
+        if validate:
+            check_template_input(devices)
+        steps = []
+        for step in (self.set_policy_in_template2, self.set_policy_in_template3, self.attach_feature_to_devices):
+            steps.append(await step(template_id, devices))
+            if not steps[-1][0].ok:
+                break
+        return steps
+
+    def get_raw(self, url_path, stream=True, timeout=None):
+        """
+        Not available on AsyncViptela, whose responses are read whole. Use a
+        Viptela object to stream large bodies to disk.
+        :return: None
+        """
+        raise TypeError('get_raw needs Viptela, AsyncViptela reads every response body whole')
+
+    def attach_template(self, template_id, template, **kwargs):
+        """
+        Not available on AsyncViptela, as TemplateAttach runs its requests on
+        threads. Use attach_devices_to_template per chunk and wait_for_jobs.
+        :return: None
+        """
+        raise TypeError(
+            'attach_template needs Viptela, use attach_devices_to_template and wait_for_jobs with AsyncViptela'
+        )
+
+    async def wait_for_jobs(self, action_ids, interval=2, max_interval=60, backoff=1.5, timeout=None,
+                            max_workers=4, max_errors=5):
+        """
+        Wait on device action jobs, such as those started by upgrade, activate or attach_feature_to_devices
+        :param action_ids: Action ID or list of action IDs
+        :param interval: Seconds between the first polls
+        :param max_interval: Maximum seconds between polls
+        :param backoff: Factor the interval grows by after a poll with no change
+        :param timeout: Seconds to wait before raising JobTimeoutError, None to wait forever
+        :param max_workers: Maximum number of concurrent status requests
+        :param max_errors: Consecutive failed status requests after which a job is failed, None to retry forever
+        :return: async generator of per-device JobUpdate tuples
+        """
+        waiter = JobWaiter(self, action_ids, interval=interval, max_interval=max_interval, backoff=backoff,
+                           timeout=timeout, max_workers=max_workers, max_errors=max_errors)
+        loop = asyncio.get_event_loop()
+        started = loop.time()
+        while waiter.pending:
+            updates = []
+            async for action_id, result in self.map_devices('check_status', list(waiter.pending),
+                                                            max_workers=max_workers):
+                updates.extend(waiter.record(action_id, result))
+            for update in updates:
+                yield update
+            if not waiter.pending:
+                return
+
+            if not updates:
+                interval = min(max_interval, interval * backoff)
+            await asyncio.sleep(waiter.delay(loop.time() - started, interval))
+
+    async def get_inventory(self, device_type=None):
+        """
+        Get devices as an indexed inventory
+        :param device_type: None for every device, or 'vedges' or 'controllers'
+        :return: DeviceInventory, bring it up to date later with refresh(devices=...)
+        """
+        if device_type is None:
+            result = (await self.get_all_devices())[0]
+        else:
+            result = (await self.get_device_by_type(device_type))[0]
+        if not result.ok:
+            raise ValueError('Could not get {0}: {1}'.format(device_type or 'devices', result.error))
+        inventory = DeviceInventory()
+        inventory.refresh(device_type, devices=result.data)
+        return inventory
+
+    async def map_devices(self, method, device_ids, max_workers=10, **kwargs):
+        """
+        Run a per-device getter for many devices with bounded concurrency
+        :param method: Getter name, e.g. 'get_arp_table', or bound method
+        :param device_ids: Iterable of device IDs
+        :param max_workers: Maximum number of concurrent requests
+        :param kwargs: Extra arguments passed to the getter
+        :return: async generator of (device_id, Result) tuples in completion order
+        """
+        if not callable(method):
+            method = getattr(self, method)
+
+        async def call(device_id):
+            try:
+                return (await method(device_id, **kwargs))[0]
+            except Exception as e:
+                return failed_result(e)
+
+        device_ids = iter(device_ids)
+        end = object()
+        pending = dict()
+
+        def submit():
+            device_id = next(device_ids, end)
+            if device_id is not end:
+                pending[asyncio.ensure_future(call(device_id))] = device_id
+
+        try:
+            for i in range(max_workers):
+                submit()
+            while pending:
+                done, not_done = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    device_id = pending.pop(task)
+                    submit()
+                    yield device_id, task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def iter_statistics(self, stat_type, start, end, conditions=None, page_size=STATISTICS_PAGE_SIZE,
+                              prefetch=True):
+        """
+        Iterate over the entries of a statistics query, following its scroll
+        across pages. The next page is fetched while the current one is consumed.
+        :param stat_type: Statistics type, e.g. 'interface', 'approute' or 'dpi'
+        :param start: Start of the range, seconds since the epoch, UTC datetime or formatted string
+        :param end: End of the range
+        :param conditions: Dict of field to value or list of values the entries must have
+        :param page_size: Entries per page
+        :param prefetch: Fetch the next page in the background
+        :return: async generator of entry dicts
+        """
+        query = statistics_query(start, end, conditions, size=page_size)
+        pending = None
+        try:
+            result = (await self.get_statistics(stat_type, query))[0]
+            while True:
+                if not result.ok:
+                    raise ResponseError(
+                        'Statistics query of {0} failed with status {1}'.format(stat_type, result.status_code),
+                        result
+                    )
+                scroll_id, more = page_info(result)
+                rows = result.data if isinstance(result.data, list) else []
+                more = more and bool(rows)
+                if more and prefetch:
+                    pending = asyncio.ensure_future(self.get_statistics_page(stat_type, query, scroll_id))
+                for row in rows:
+                    yield row
+                if not more:
+                    return
+                if pending is not None:
+                    result = (await pending)[0]
+                    pending = None
+                else:
+                    result = (await self.get_statistics_page(stat_type, query, scroll_id))[0]
+        finally:
+            if pending is not None:
+                pending.cancel()
+
+    async def iter_statistics_ranges(self, stat_type, start, end, parts=4, conditions=None,
+                                     page_size=STATISTICS_PAGE_SIZE, max_workers=None):
+        """
+        Iterate over the entries of a statistics query split into sub-ranges
+        queried concurrently. Entries come in no particular order.
+        :param stat_type: Statistics type, e.g. 'interface', 'approute' or 'dpi'
+        :param start: Start of the range, seconds since the epoch or UTC datetime
+        :param end: End of the range
+        :param parts: Number of sub-ranges
+        :param conditions: Dict of field to value or list of values the entries must have
+        :param page_size: Entries per page
+        :param max_workers: Maximum number of sub-ranges queried at once, defaults to parts
+        :return: async generator of entry dicts
+        """
+        ranges = split_range(start, end, parts)
+        rows = asyncio.Queue(maxsize=page_size * 2)
+        slots = asyncio.Semaphore(max_workers or len(ranges))
+        end_of_range = object()
+
+        async def query(sub_range):
+            try:
+                async with slots:
+                    async for row in self.iter_statistics(stat_type, sub_range[0], sub_range[1], conditions,
+                                                          page_size):
+                        await rows.put(row)
+            except Exception as e:
+                await rows.put(_RangeError(e))
+            await rows.put(end_of_range)
+
+        tasks = [asyncio.ensure_future(query(sub_range)) for sub_range in ranges]
+        try:
+            remaining = len(tasks)
+            while remaining:
+                row = await rows.get()
+                if row is end_of_range:
+                    remaining -= 1
+                elif isinstance(row, _RangeError):
+                    raise row.error
+                else:
+                    yield row
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,243 @@
+import binascii
+import bisect
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+# Index record: SHA-1 digest of the block, offset and length in the pack file
+_INDEX_RECORD = struct.Struct('>20sQI')
+
+PACK_NAME = 'blocks.pack'
+INDEX_NAME = 'blocks.idx'
+MANIFEST_DIR = 'manifests'
+
+
+def chunk_lines(text, average_lines=16, min_lines=4, max_lines=256):
+    """
+    Split a config into content-defined blocks of whole lines. A block ends
+    after a line whose checksum is a multiple of average_lines, so an edit
+    only changes the blocks around it and the other blocks of the config
+    stay identical to those of the previous version and of similar devices.
+    :param text: config text
+    :param average_lines: Average number of lines per block
+    :param min_lines: Minimum number of lines per block
+    :param max_lines: Maximum number of lines per block
+    :return: list of blocks as bytes
+    """
+    if not isinstance(text, bytes):
+        text = text.encode('utf-8')
+    blocks = []
+    lines = []
+    for line in text.splitlines(True):
+        lines.append(line)
+        if len(lines) >= max_lines or (
+                len(lines) >= min_lines and zlib.crc32(line) % average_lines == 0):
+            blocks.append(b''.join(lines))
+            lines = []
+    if lines:
+        blocks.append(b''.join(lines))
+    return blocks
+
+
+class ConfigArchive(object):
+    """
+    Content-addressed archive of device configs. Configs are split into
+    blocks with chunk_lines and each unique block is stored once in an
+    append-only pack file, read back through mmap. Each device has an
+    append-only manifest of (timestamp, block digests) versions, so its
+    config at any time is found by bisection and joined from the pack.
+    """
+    def __init__(self, directory, average_lines=16, min_lines=4, max_lines=256):
+        """
+        Init method for ConfigArchive class
+        :param directory: Directory holding the pack, index and manifests
+        :param average_lines: Average number of lines per block
+        :param min_lines: Minimum number of lines per block
+        :param max_lines: Maximum number of lines per block
+        """
+        self.directory = directory
+        self.average_lines = average_lines
+        self.min_lines = min_lines
+        self.max_lines = max_lines
+        self.pack_path = os.path.join(directory, PACK_NAME)
+        self.index_path = os.path.join(directory, INDEX_NAME)
+        self.manifest_dir = os.path.join(directory, MANIFEST_DIR)
+        self._lock = threading.RLock()
+        self._mmap = None
+        self._mapped_size = 0
+
+        if not os.path.isdir(self.manifest_dir):
+            os.makedirs(self.manifest_dir)
+
+        self.index = dict()
+        self._pack_size = 0
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'rb') as fileobj:
+                content = fileobj.read()
+            # A record cut short by a crash is ignored and overwritten
+            usable = len(content) - len(content) % _INDEX_RECORD.size
+            for position in range(0, usable, _INDEX_RECORD.size):
+                digest, offset, length = _INDEX_RECORD.unpack_from(content, position)
+                self.index[digest] = (offset, length)
+                self._pack_size = max(self._pack_size, offset + length)
+            if usable != len(content):
+                with open(self.index_path, 'r+b') as fileobj:
+                    fileobj.truncate(usable)
+        self._pack = open(self.pack_path, 'a+b')
+        self._pack.truncate(self._pack_size)
+        self._index = open(self.index_path, 'ab')
+
+        self._times = dict()
+        self._versions = dict()
+
+    def close(self):
+        """
+        Close the pack and index files
+        :return: None
+        """
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+            self._pack.close()
+            self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _manifest_path(self, device_id):
+        return os.path.join(self.manifest_dir, '{0}.jsonl'.format(device_id))
+
+    def _load(self, device_id):
+        """
+        Load the versions of a device from its manifest
+        :param device_id: Device's ID
+        :return: tuple of sorted timestamps and matching lists of block digests
+        """
+        if device_id not in self._times:
+            times = []
+            versions = []
+            path = self._manifest_path(device_id)
+            if os.path.exists(path):
+                with open(path) as fileobj:
+                    for line in fileobj:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            continue
+                        position = bisect.bisect_right(times, entry['time'])
+                        times.insert(position, entry['time'])
+                        versions.insert(position, [binascii.unhexlify(digest) for digest in entry['blocks']])
+            self._times[device_id] = times
+            self._versions[device_id] = versions
+        return self._times[device_id], self._versions[device_id]
+
+    def _write_block(self, block):
+        """
+        Add a block to the pack unless it is already there
+        :param block: block bytes
+        :return: SHA-1 digest of the block
+        """
+        digest = hashlib.sha1(block).digest()
+        if digest not in self.index:
+            offset = self._pack_size
+            self._pack.write(block)
+            self._pack.flush()
+            self._pack_size += len(block)
+            self._index.write(_INDEX_RECORD.pack(digest, offset, len(block)))
+            self._index.flush()
+            self.index[digest] = (offset, len(block))
+        return digest
+
+    def _read_block(self, digest):
+        offset, length = self.index[digest]
+        if offset + length > self._mapped_size:
+            # The pack grew since it was mapped
+            if self._mmap is not None:
+                self._mmap.close()
+            self._mmap = mmap.mmap(self._pack.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mapped_size = len(self._mmap)
+        return self._mmap[offset:offset + length]
+
+    def store(self, device_id, config, timestamp=None):
+        """
+        Archive a config of a device
+        :param device_id: Device's ID
+        :param config: config text
+        :param timestamp: Time the config was taken, defaults to now
+        :return: True if stored, False if identical to the version at that time
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        blocks = chunk_lines(config, self.average_lines, self.min_lines, self.max_lines)
+        with self._lock:
+            times, versions = self._load(device_id)
+            digests = [hashlib.sha1(block).digest() for block in blocks]
+            position = bisect.bisect_right(times, timestamp)
+            if position and versions[position - 1] == digests:
+                return False
+            for block in blocks:
+                self._write_block(block)
+            with open(self._manifest_path(device_id), 'a') as fileobj:
+                fileobj.write(json.dumps({'time': timestamp,
+                                          'blocks': [binascii.hexlify(digest).decode('ascii')
+                                                     for digest in digests]}))
+                fileobj.write('\n')
+            times.insert(position, timestamp)
+            versions.insert(position, digests)
+        return True
+
+    def versions(self, device_id):
+        """
+        Times of the archived configs of a device
+        :param device_id: Device's ID
+        :return: sorted list of timestamps
+        """
+        with self._lock:
+            return list(self._load(device_id)[0])
+
+    def devices(self):
+        """
+        Devices with archived configs
+        :return: list of device IDs
+        """
+        return sorted(name[:-len('.jsonl')] for name in os.listdir(self.manifest_dir) if name.endswith('.jsonl'))
+
+    def get(self, device_id, timestamp=None):
+        """
+        Reconstruct the config a device had at a given time
+        :param device_id: Device's ID
+        :param timestamp: Time, defaults to the latest version
+        :return: config text, or None if nothing was archived at that time
+        """
+        with self._lock:
+            times, versions = self._load(device_id)
+            position = len(times) if timestamp is None else bisect.bisect_right(times, timestamp)
+            if not position:
+                return None
+            return b''.join(self._read_block(digest) for digest in versions[position - 1]).decode('utf-8')
+
+    def archive_running_configs(self, viptela, device_ids, attached=False, max_workers=10):
+        """
+        Fetch and archive the running configs of many devices
+        :param viptela: Viptela object
+        :param device_ids: Iterable of device IDs
+        :param attached: Archive the attached config instead
+        :param max_workers: Maximum number of concurrent requests
+        :return: generator of (device_id, Result, stored) tuples, stored is None if the request failed
+        """
+        timestamp = time.time()
+        for device_id, result in viptela.map_devices('get_running_config', device_ids,
+                                                     max_workers=max_workers, attached=attached):
+            if result.ok and result.data:
+                yield device_id, result, self.store(device_id, result.data, timestamp)
+            else:
+                yield device_id, result, None
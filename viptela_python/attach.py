@@ -0,0 +1,284 @@
+import ast
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from . exceptions import JobTimeoutError, TemplateValidationError
+from . jobs import JobWaiter, TERMINAL_STATUSES
+
+try:
+    string_types = (basestring,)
+except NameError:
+    string_types = (str, bytes)
+
+# Outcome of attaching a template to one device. step is the last step run,
+# detail the failed Result of that step, the last job status entry, or the
+# JobTimeoutError if its job did not finish in time.
+AttachOutcome = namedtuple('AttachOutcome', ['device_id', 'status', 'step', 'action_id', 'detail'])
+
+# Problem found in device template input. others are the IDs of the devices
+# the value clashes with.
+ValidationProblem = namedtuple('ValidationProblem', ['device_id', 'kind', 'key', 'value', 'others'])
+
+# Keys every device input dict must have
+REQUIRED_KEYS = ('csv-deviceId', 'csv-deviceIP', 'csv-host-name')
+
+# Keys whose values must be unique across devices, with the problem kind reported
+UNIQUE_KEYS = (('csv-deviceIP', 'duplicate-ip'), ('csv-host-name', 'duplicate-host-name'))
+
+# Job statuses of a device that mean the template was attached
+SUCCESS_STATUSES = frozenset(['success', 'done'])
+
+
+def template_input(template):
+    """
+    Template input as native lists and dicts. The Python-literal string form
+    taken by the template methods before is still parsed for compatibility.
+    :param template: list or dict, or its Python-literal string
+    :return: list or dict
+    """
+    if isinstance(template, string_types):
+        return ast.literal_eval(template)
+    return template
+
+
+def attach_device_id(device):
+    """
+    Identifier of a device input dict
+    :param device: device input dict from /template/device/config/input
+    :return: device uuid
+    """
+    return device.get('csv-deviceId') or device.get('uuid')
+
+
+def validate_template_input(devices, required=None):
+    """
+    Check device template input locally, in one pass over the devices: system
+    IPs and host names must be unique, and every device must have the
+    required keys plus every csv-* key any other device has.
+    :param devices: List of device input dicts, or its Python-literal string
+    :param required: Extra keys every device must have, e.g. template variables
+    :return: list of ValidationProblem, empty if the input is valid
+    """
+    devices = template_input(devices)
+    required = frozenset(REQUIRED_KEYS + tuple(required or ()))
+    indexes = dict((key, dict()) for key, kind in UNIQUE_KEYS)
+    keysets = dict()
+    csv_keys = set()
+    for device in devices:
+        device_id = attach_device_id(device)
+        for key, index in indexes.items():
+            value = device.get(key)
+            if value not in (None, ''):
+                index.setdefault(value, []).append(device_id)
+        present = frozenset(key for key, value in device.items() if value is not None)
+        keysets.setdefault(present, []).append(device_id)
+        csv_keys.update(key for key in present if key.startswith('csv-'))
+
+    problems = []
+    expected = required | csv_keys
+    # Devices are grouped by key set, so each distinct set is only compared once
+    for present, device_ids in keysets.items():
+        for key in sorted(expected - present):
+            for device_id in device_ids:
+                problems.append(ValidationProblem(device_id, 'missing-key', key, None, []))
+    for key, kind in UNIQUE_KEYS:
+        for value, device_ids in indexes[key].items():
+            if len(device_ids) > 1:
+                for device_id in device_ids:
+                    others = [other for other in device_ids if other != device_id]
+                    problems.append(ValidationProblem(device_id, kind, key, value, others))
+    return problems
+
+
+def check_template_input(devices, required=None):
+    """
+    Raise if device template input fails local validation
+    :param devices: List of device input dicts, or its Python-literal string
+    :param required: Extra keys every device must have, e.g. template variables
+    :return: None
+    """
+    problems = validate_template_input(devices, required)
+    if problems:
+        raise TemplateValidationError(
+            '{0} problems in template input of {1} devices'.format(
+                len(problems), len(set(problem.device_id for problem in problems))),
+            problems
+        )
+
+
+class TemplateAttach(object):
+    """
+    Attaches a device template to many devices. Devices are split into
+    chunks of chunk_size, and each chunk runs the config input, duplicate IP
+    check and attach steps, up to max_workers chunks at a time. The whole
+    input is validated locally first, so clashes across chunks are caught
+    before anything is sent. Devices vManage reports as duplicates of
+    existing devices are left out of their chunk's attach. The attach
+    jobs are then tracked together with a JobWaiter, and the outcome is
+    reported per device.
+    """
+    def __init__(self, viptela, template_id, devices, chunk_size=100, max_workers=4,
+                 interval=2, max_interval=60, timeout=None, validate=True):
+        """
+        Init method for TemplateAttach class
+        :param viptela: Viptela object
+        :param template_id: Device template ID
+        :param devices: List of device input dicts, or its Python-literal string
+        :param chunk_size: Maximum number of devices per attach request
+        :param max_workers: Maximum number of chunks submitted concurrently
+        :param interval: Seconds between the first job status polls
+        :param max_interval: Maximum seconds between job status polls
+        :param timeout: Seconds to wait for the jobs, None to wait forever
+        :param validate: Validate the input locally before sending it, raising TemplateValidationError
+        """
+        self.viptela = viptela
+        self.template_id = template_id
+        self.devices = template_input(devices)
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.interval = interval
+        self.max_interval = max_interval
+        self.timeout = timeout
+        self.validate = validate
+        self.outcomes = dict()
+        self.action_ids = []
+
+    def chunks(self):
+        """
+        Split the devices into chunks
+        :return: list of lists of device input dicts
+        """
+        return [self.devices[i:i + self.chunk_size] for i in range(0, len(self.devices), self.chunk_size)]
+
+    def _fail(self, devices, step, detail):
+        return [AttachOutcome(attach_device_id(device), 'failed', step, None, detail) for device in devices]
+
+    def _fail_unfinished(self, action_id, step, detail):
+        """
+        Mark the devices of a job that have not finished as failed
+        :param action_id: Action ID of the job
+        :param step: step the devices failed at
+        :param detail: Result or exception
+        :return: None
+        """
+        for device_id, outcome in list(self.outcomes.items()):
+            if outcome.action_id == action_id and outcome.status not in ('success', 'failed'):
+                self.outcomes[device_id] = AttachOutcome(device_id, 'failed', step, action_id, detail)
+
+    @staticmethod
+    def _duplicates(result, devices):
+        """
+        Devices reported by the duplicate IP check
+        :param result: Result of the duplicate IP check
+        :param devices: device input dicts of the chunk
+        :return: set of device IDs
+        """
+        entries = result.data if isinstance(result.data, list) else []
+        keys = set()
+        for entry in entries:
+            if isinstance(entry, dict):
+                keys.update(entry.get(key) for key in ('csv-deviceId', 'csv-deviceIP', 'deviceIP', 'system-ip'))
+        return set(attach_device_id(device) for device in devices
+                   if attach_device_id(device) in keys or device.get('csv-deviceIP') in keys)
+
+    def _attach_chunk(self, devices):
+        """
+        Run the attach steps for one chunk
+        :param devices: device input dicts of the chunk
+        :return: list of AttachOutcome
+        """
+        result = self.viptela.set_policy_in_template2(self.template_id, devices)[0]
+        if not result.ok:
+            return self._fail(devices, 'config_input', result)
+
+        result = self.viptela.set_policy_in_template3(self.template_id, devices)[0]
+        if not result.ok:
+            return self._fail(devices, 'duplicate_ip', result)
+        duplicates = self._duplicates(result, devices)
+        outcomes = self._fail([device for device in devices if attach_device_id(device) in duplicates],
+                              'duplicate_ip', result)
+        devices = [device for device in devices if attach_device_id(device) not in duplicates]
+        if not devices:
+            return outcomes
+
+        result = self.viptela.attach_feature_to_devices(self.template_id, devices)[0]
+        if not result.ok or not result.data:
+            return outcomes + self._fail(devices, 'attach', result)
+        return outcomes + [AttachOutcome(attach_device_id(device), 'submitted', 'attach', result.data, None)
+                           for device in devices]
+
+    def _attach_chunk_safe(self, devices):
+        try:
+            return self._attach_chunk(devices)
+        except Exception as e:
+            return self._fail(devices, 'error', e)
+
+    def submit(self):
+        """
+        Run the attach steps for every chunk, without waiting for the jobs
+        :return: list of action IDs of the attach jobs
+        """
+        if self.validate:
+            check_template_input(self.devices)
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            for outcomes in executor.map(self._attach_chunk_safe, self.chunks()):
+                for outcome in outcomes:
+                    self.outcomes[outcome.device_id] = outcome
+                    if outcome.action_id is not None and outcome.action_id not in self.action_ids:
+                        self.action_ids.append(outcome.action_id)
+        finally:
+            executor.shutdown(wait=True)
+        return self.action_ids
+
+    def wait(self):
+        """
+        Track the attach jobs until they finish or the timeout expires.
+        Devices whose job did not finish in time are failed at the 'timeout'
+        step, with the JobTimeoutError as detail.
+        :return: dict of device ID to AttachOutcome
+        """
+        if not self.action_ids:
+            return self.outcomes
+        waiter = JobWaiter(self.viptela, self.action_ids, interval=self.interval, max_interval=self.max_interval,
+                           timeout=self.timeout, max_workers=self.max_workers)
+        try:
+            for update in waiter:
+                if update.device_id is None:
+                    # The job status could not be read, fail the devices still waiting on it
+                    self._fail_unfinished(update.action_id, 'status', update.entry)
+                    continue
+                if update.status in SUCCESS_STATUSES:
+                    status = 'success'
+                elif update.status in TERMINAL_STATUSES:
+                    status = 'failed'
+                else:
+                    status = update.status
+                self.outcomes[update.device_id] = AttachOutcome(
+                    update.device_id, status, 'attach', update.action_id, update.entry)
+        except JobTimeoutError as e:
+            for action_id in e.pending or ():
+                self._fail_unfinished(action_id, 'timeout', e)
+        return self.outcomes
+
+    def run(self):
+        """
+        Attach the template to every device and wait for the jobs
+        :return: dict of device ID to AttachOutcome
+        """
+        self.submit()
+        return self.wait()
+
+    @property
+    def succeeded(self):
+        """
+        :return: list of device IDs the template was attached to
+        """
+        return [device_id for device_id, outcome in self.outcomes.items() if outcome.status == 'success']
+
+    @property
+    def failed(self):
+        """
+        :return: list of device IDs the template could not be attached to
+        """
+        return [device_id for device_id, outcome in self.outcomes.items() if outcome.status == 'failed']
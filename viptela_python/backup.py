@@ -0,0 +1,205 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from . exceptions import ResponseError
+from . viptela import HTTP_SUCCESS_CODES, Result, parse_response
+
+# Bytes read from the socket at a time when streaming a config to disk
+BACKUP_CHUNK_SIZE = 64 * 1024
+
+MANIFEST_NAME = 'manifest.json'
+
+# Keys of device dicts holding when vManage last updated the device, in the order tried
+MODIFIED_KEYS = ('lastupdatedon', 'lastupdated')
+
+
+def read_config(path):
+    """
+    Read a backed up config
+    :param path: path of a .json.gz backup file
+    :return: config text
+    """
+    with gzip.open(path, 'rb') as fileobj:
+        document = json.loads(fileobj.read().decode('utf-8'))
+    return document.get('config', document)
+
+
+class ConfigBackup(object):
+    """
+    Backs up running and attached configs of many devices concurrently.
+    Configs are streamed from vManage straight into a gzip file while being
+    hashed, and only replace the previous backup if their SHA-256 changed.
+    With skip_unmodified, devices given as dicts whose last update time
+    vManage reports unchanged since their last backup are not downloaded.
+    Hashes and update times are kept in a manifest in the backup directory.
+    """
+    def __init__(self, viptela, directory, max_workers=10, attached=True, compresslevel=6,
+                 skip_unmodified=False):
+        """
+        Init method for ConfigBackup class
+        :param viptela: Viptela object
+        :param directory: Directory the backups and manifest are written to
+        :param max_workers: Maximum number of concurrent downloads
+        :param attached: Also back up the attached (template) config
+        :param compresslevel: gzip compression level
+        :param skip_unmodified: Do not download the configs of devices not updated since their last backup.
+                                vManage may not update that time when a config is changed outside of it,
+                                e.g. from the device CLI, so the backup can be left stale
+        """
+        self.viptela = viptela
+        self.directory = directory
+        self.max_workers = max_workers
+        self.kinds = ('running', 'attached') if attached else ('running',)
+        self.compresslevel = compresslevel
+        self.skip_unmodified = skip_unmodified
+        self.manifest_path = os.path.join(directory, MANIFEST_NAME)
+        self.manifest = self._load_manifest()
+        self._lock = threading.Lock()
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return dict()
+        with open(self.manifest_path) as fileobj:
+            return json.load(fileobj)
+
+    def save_manifest(self):
+        """
+        Write the manifest atomically
+        :return: None
+        """
+        with self._lock:
+            content = json.dumps(self.manifest, indent=2, sort_keys=True)
+        fd, path = tempfile.mkstemp(dir=self.directory, prefix='.manifest')
+        with os.fdopen(fd, 'w') as fileobj:
+            fileobj.write(content)
+        os.rename(path, self.manifest_path)
+
+    def path(self, device_uuid, kind='running'):
+        """
+        Path of the backup of a device config
+        :param device_uuid: Device's ID
+        :param kind: 'running' or 'attached'
+        :return: file path
+        """
+        return os.path.join(self.directory, '{0}.{1}.json.gz'.format(device_uuid, kind))
+
+    def _download(self, device_uuid, kind):
+        """
+        Stream one config to a temporary gzip file
+        :param device_uuid: Device's ID
+        :param kind: 'running' or 'attached'
+        :return: tuple of error Result or None, temporary path, SHA-256 hex digest
+        """
+        response = self.viptela.get_raw('/template/config/{0}/{1}'.format(kind, device_uuid))
+        try:
+            if response.status_code not in HTTP_SUCCESS_CODES:
+                return parse_response(response, self.viptela.codec), None, None
+            sha256 = hashlib.sha256()
+            fd, path = tempfile.mkstemp(dir=self.directory, prefix='.backup')
+            try:
+                with os.fdopen(fd, 'wb') as raw:
+                    with gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=self.compresslevel) as fileobj:
+                        for chunk in response.iter_content(chunk_size=BACKUP_CHUNK_SIZE):
+                            sha256.update(chunk)
+                            fileobj.write(chunk)
+            except Exception:
+                os.remove(path)
+                raise
+            return None, path, sha256.hexdigest()
+        finally:
+            response.close()
+
+    def _unmodified(self, device_uuid, previous, modified):
+        """
+        Check whether a device was not updated since its last backup
+        :param device_uuid: Device's ID
+        :param previous: manifest entry of the device
+        :param modified: last update time vManage reports for the device, None if unknown
+        :return: True if its backups can be kept without downloading
+        """
+        if not self.skip_unmodified or modified is None or previous.get('modified') != modified:
+            return False
+        return all(previous.get(kind) and os.path.exists(self.path(device_uuid, kind)) for kind in self.kinds)
+
+    def backup_device(self, device_uuid, host_name=None, modified=None):
+        """
+        Back up the configs of one device
+        :param device_uuid: Device's ID
+        :param host_name: Device's host name, recorded in the manifest
+        :param modified: Last update time vManage reports for the device, see MODIFIED_KEYS
+        :return: (Result, backup path, '') tuple, whose data maps each config kind to 'changed', 'unchanged'
+                 (downloaded, same content) or 'skipped' (not downloaded, device not updated)
+        """
+        with self._lock:
+            previous = dict(self.manifest.get(device_uuid, dict()))
+        entry = dict(previous, **{'host-name': host_name or previous.get('host-name')})
+        outcome = dict()
+
+        if self._unmodified(device_uuid, previous, modified):
+            outcome = dict((kind, 'skipped') for kind in self.kinds)
+            result = Result(ok=True, status_code=200, reason='Success', error='',
+                            data=outcome, response=None, text='')
+            return (result, self.path(device_uuid), '')
+
+        for kind in self.kinds:
+            error, path, digest = self._download(device_uuid, kind)
+            if error is not None:
+                return (error, self.path(device_uuid, kind), '')
+            if digest == previous.get(kind) and os.path.exists(self.path(device_uuid, kind)):
+                os.remove(path)
+                outcome[kind] = 'unchanged'
+            else:
+                os.rename(path, self.path(device_uuid, kind))
+                entry[kind] = digest
+                entry['{0}-time'.format(kind)] = time.time()
+                outcome[kind] = 'changed'
+
+        entry['modified'] = modified
+        with self._lock:
+            self.manifest[device_uuid] = entry
+        result = Result(ok=True, status_code=200, reason='Success', error='',
+                        data=outcome, response=None, text='')
+        return (result, self.path(device_uuid), '')
+
+    def run(self, devices=None):
+        """
+        Back up many devices
+        :param devices: List of device uuids or device dicts, defaults to all devices. Only devices
+                        given as dicts with a last update time can be skipped without downloading.
+        :return: generator of (device_uuid, Result) in completion order, the manifest is saved at the end
+        """
+        if devices is None:
+            # Fetched whole, so no request is held open while the configs download
+            result = self.viptela.get_all_devices()[0]
+            if not result.ok:
+                raise ResponseError('Listing devices failed with status {0}'.format(result.status_code), result)
+            devices = result.data
+        host_names = dict()
+        modified = dict()
+        uuids = []
+        for device in devices:
+            if isinstance(device, dict):
+                host_names[device.get('uuid')] = device.get('host-name')
+                for key in MODIFIED_KEYS:
+                    if device.get(key) is not None:
+                        modified[device.get('uuid')] = device[key]
+                        break
+                device = device.get('uuid')
+            uuids.append(device)
+
+        def backup(device_uuid):
+            return self.backup_device(device_uuid, host_names.get(device_uuid), modified.get(device_uuid))
+
+        try:
+            for device_uuid, result in self.viptela.map_devices(backup, uuids, max_workers=self.max_workers):
+                yield device_uuid, result
+        finally:
+            self.save_manifest()
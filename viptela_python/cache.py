@@ -0,0 +1,377 @@
+import hashlib
+import json
+import os
+import re
+import struct
+import tempfile
+import threading
+import time
+
+from collections import OrderedDict, namedtuple
+from requests.models import PreparedRequest, Response
+from requests.structures import CaseInsensitiveDict
+
+_clock = getattr(time, 'monotonic', time.time)
+
+# Default TTL in seconds of cacheable GET endpoints, by regex on the path after /dataservice
+# Only listing endpoints are cached, not the per-template detail paths under them
+CACHE_TTLS = OrderedDict([
+    (r'^/device$', 60),
+    (r'^/system/device/(vedges|controllers)$', 300),
+    (r'^/template/device$', 300),
+    (r'^/template/feature$', 300),
+    (r'^/template/policy/vedge$', 300),
+    (r'^/group/map/devices$', 300),
+])
+
+# Cached paths invalidated by a successful POST, PUT or DELETE, by regex on its path
+CACHE_INVALIDATIONS = OrderedDict([
+    # Template edits and attachments also change the template status of devices
+    (r'^/template/', r'^/(template/|device$|system/device/)'),
+    (r'^/device/action/', r'^/(device$|system/device/)'),
+    (r'^/group/', r'^/group/'),
+])
+
+# Paths of POST requests that only read state
+CACHE_READ_ONLY_POSTS = (
+    r'^/j_security_check$',
+    r'^/template/device/config/input/?$',
+    r'^/template/device/config/duplicateip$',
+)
+
+_Entry = namedtuple('Entry', ['value', 'size', 'expires'])
+
+# Disk cache file header: magic, format version, stored and expiry wall clock
+# times, status code, then the lengths of the key, path, headers and body
+_DISK_HEADER = struct.Struct('>4sBddHHHII')
+_DISK_MAGIC = b'VPC1'
+_DISK_VERSION = 2
+
+# Response headers kept in the disk cache. The body is stored decoded, so
+# Content-Encoding is not kept.
+DISK_CACHE_HEADERS = ('Content-Type',)
+
+# Response read back from the disk cache
+StoredResponse = namedtuple('StoredResponse', ['key', 'path', 'status_code', 'headers', 'content', 'stored', 'expires'])
+
+
+class ResponseCache(object):
+    """
+    TTL and LRU cache of GET responses, bounded by total response size.
+    Values are handed out as stored. Viptela caches the raw responses,
+    whose bodies are bytes, and decodes them again for each hit.
+    """
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttls=None, invalidations=None, disk=None):
+        """
+        Init method for ResponseCache class
+        :param max_bytes: Maximum total size of cached response bodies
+        :param ttls: Dict of path regex to TTL in seconds, checked before CACHE_TTLS
+        :param invalidations: Dict of mutated path regex to invalidated path regex, checked before CACHE_INVALIDATIONS
+        :param disk: DiskCache consulted on a miss and shared by later processes, or a directory for one
+        """
+        if disk is not None and not isinstance(disk, DiskCache):
+            disk = DiskCache(disk, ttls=ttls)
+        self.disk = disk
+        self.max_bytes = max_bytes
+        self.ttls = self._compile(ttls, CACHE_TTLS)
+        self.invalidations = self._compile(invalidations, CACHE_INVALIDATIONS)
+        self.read_only_posts = [re.compile(pattern) for pattern in CACHE_READ_ONLY_POSTS]
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _compile(rules, defaults):
+        compiled = []
+        for table in (rules or {}, defaults):
+            for pattern, value in table.items():
+                compiled.append((re.compile(pattern), value))
+        return compiled
+
+    def ttl(self, path):
+        """
+        TTL of a path
+        :param path: path after /dataservice, with query string
+        :return: TTL in seconds, or None if the path is not cached
+        """
+        path = path.split('?', 1)[0]
+        for pattern, ttl in self.ttls:
+            if pattern.search(path):
+                return ttl
+        return None
+
+    def get(self, path):
+        """
+        Get a cached value
+        :param path: path after /dataservice, with query string
+        :return: cached value, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is None or entry.expires <= _clock():
+                if entry is not None:
+                    self.size -= entry.size
+                self.misses += 1
+                return None
+            # Re-insert as most recently used
+            self._entries[path] = entry
+            self.hits += 1
+            return entry.value
+
+    def set(self, path, value, size, ttl=None):
+        """
+        Cache a value if its path has a TTL
+        :param path: path after /dataservice, with query string
+        :param value: value to cache
+        :param size: size of the value in bytes
+        :param ttl: Seconds the value stays fresh, e.g. what is left of a disk cache entry, defaults to the path's TTL
+        :return: None
+        """
+        if self.ttl(path) is None or size > self.max_bytes:
+            return
+        if ttl is None:
+            ttl = self.ttl(path)
+        elif ttl <= 0:
+            return
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self.size -= old.size
+            self._entries[path] = _Entry(value, size, _clock() + ttl)
+            self.size += size
+            while self.size > self.max_bytes:
+                oldest, entry = self._entries.popitem(last=False)
+                self.size -= entry.size
+
+    def invalidate(self, pattern=None):
+        """
+        Drop cached values
+        :param pattern: regex matched against cached paths, None drops everything
+        :return: number of values dropped
+        """
+        if self.disk is not None:
+            self.disk.invalidate(pattern)
+        with self._lock:
+            if pattern is None:
+                count = len(self._entries)
+                self._entries.clear()
+                self.size = 0
+                return count
+            if not hasattr(pattern, 'search'):
+                pattern = re.compile(pattern)
+            paths = [path for path in self._entries if pattern.search(path)]
+            for path in paths:
+                self.size -= self._entries.pop(path).size
+            return len(paths)
+
+    def invalidate_after(self, path):
+        """
+        Drop the cached values a successful mutating request may have changed
+        :param path: path of the POST, PUT or DELETE request
+        :return: number of values dropped
+        """
+        path = path.split('?', 1)[0]
+        if any(pattern.search(path) for pattern in self.read_only_posts):
+            return 0
+        for pattern, invalidated in self.invalidations:
+            if pattern.search(path):
+                return self.invalidate(invalidated)
+        return 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def stored_response(stored, url):
+    """
+    Rebuild a requests response from the disk cache
+    :param stored: StoredResponse
+    :param url: url of the request
+    :return: requests response object
+    """
+    request = PreparedRequest()
+    request.method = 'GET'
+    request.url = url
+    response = Response()
+    response.status_code = stored.status_code
+    response.reason = 'OK'
+    response.headers = CaseInsensitiveDict(stored.headers)
+    response.url = url
+    response.request = request
+    response.encoding = 'utf-8'
+    response._content = stored.content
+    return response
+
+
+class DiskCache(object):
+    """
+    Cache of GET responses on disk, shared by every process using the same
+    directory, so a new process can answer from it without logging in. Each
+    response is one file with a fixed binary header, so pruning only reads
+    the headers, and is written atomically. Entries expire by wall clock, using the TTLs of
+    ResponseCache. With auto_login False, answers from the disk need no login
+    and the first request that misses logs in through auto_reauth.
+    """
+    def __init__(self, directory, ttls=None, max_bytes=256 * 1024 * 1024):
+        """
+        Init method for DiskCache class
+        :param directory: Directory holding the cache files
+        :param ttls: Dict of path regex to TTL in seconds, checked before CACHE_TTLS
+        :param max_bytes: Maximum total size of the cache files, the oldest are removed first
+        """
+        self.directory = directory
+        self.ttls = ResponseCache._compile(ttls, CACHE_TTLS)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.prune()
+
+    def ttl(self, path):
+        """
+        TTL of a path
+        :param path: path after /dataservice, with query string
+        :return: TTL in seconds, or None if the path is not cached
+        """
+        path = path.split('?', 1)[0]
+        for pattern, ttl in self.ttls:
+            if pattern.search(path):
+                return ttl
+        return None
+
+    def _filename(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.vpc')
+
+    def _files(self):
+        return [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith('.vpc')]
+
+    @staticmethod
+    def _read(filename, body=True):
+        """
+        Read a cache file
+        :param filename: path of the file
+        :param body: Also read the response body
+        :return: StoredResponse, with content None if body is False, or None if the file is unusable
+        """
+        try:
+            with open(filename, 'rb') as fileobj:
+                header = fileobj.read(_DISK_HEADER.size)
+                if len(header) < _DISK_HEADER.size:
+                    return None
+                magic, version, stored, expires, status_code, key_length, path_length, headers_length, \
+                    content_length = _DISK_HEADER.unpack(header)
+                if magic != _DISK_MAGIC or version != _DISK_VERSION:
+                    return None
+                meta_length = key_length + path_length + headers_length
+                meta = fileobj.read(meta_length)
+                if len(meta) != meta_length:
+                    return None
+                key = meta[:key_length].decode('utf-8')
+                path = meta[key_length:key_length + path_length].decode('utf-8')
+                headers = json.loads(meta[key_length + path_length:].decode('utf-8'))
+                content = None
+                if body:
+                    content = fileobj.read(content_length + 1)
+                    if len(content) != content_length:
+                        return None
+        except (IOError, OSError, ValueError):
+            return None
+        return StoredResponse(key, path, status_code, headers, content, stored, expires)
+
+    def get(self, key):
+        """
+        Get a fresh cached response
+        :param key: cache key, including the server and user
+        :return: StoredResponse, or None on a miss
+        """
+        stored = self._read(self._filename(key))
+        if stored is None or stored.key != key or stored.expires <= time.time():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return stored
+
+    def set(self, key, path, response):
+        """
+        Store a response if its path has a TTL
+        :param key: cache key, including the server and user
+        :param path: path after /dataservice, with query string
+        :param response: requests response object
+        :return: None
+        """
+        ttl = self.ttl(path)
+        if ttl is None:
+            return
+        content = response.content
+        if len(content) > self.max_bytes:
+            return
+        key_bytes = key.encode('utf-8')
+        path_bytes = path.encode('utf-8')
+        headers = json.dumps(dict((name, response.headers[name]) for name in DISK_CACHE_HEADERS
+                                  if name in response.headers)).encode('utf-8')
+        now = time.time()
+        header = _DISK_HEADER.pack(_DISK_MAGIC, _DISK_VERSION, now, now + ttl, response.status_code,
+                                   len(key_bytes), len(path_bytes), len(headers), len(content))
+        fd, temporary = tempfile.mkstemp(dir=self.directory, prefix='.vpc')
+        with os.fdopen(fd, 'wb') as fileobj:
+            fileobj.write(header)
+            fileobj.write(key_bytes)
+            fileobj.write(path_bytes)
+            fileobj.write(headers)
+            fileobj.write(content)
+        os.rename(temporary, self._filename(key))
+
+    def invalidate(self, pattern=None):
+        """
+        Remove cached responses
+        :param pattern: regex matched against cached paths, None removes everything
+        :return: number of responses removed
+        """
+        if pattern is not None and not hasattr(pattern, 'search'):
+            pattern = re.compile(pattern)
+        count = 0
+        for filename in self._files():
+            if pattern is not None:
+                stored = self._read(filename, body=False)
+                if stored is not None and not pattern.search(stored.path):
+                    continue
+            try:
+                os.remove(filename)
+                count += 1
+            except OSError:
+                pass
+        return count
+
+    def prune(self):
+        """
+        Remove expired and unreadable responses, then the oldest ones until
+        the cache fits in max_bytes
+        :return: number of responses removed
+        """
+        now = time.time()
+        entries = []
+        count = 0
+        for filename in self._files():
+            stored = self._read(filename, body=False)
+            try:
+                if stored is None or stored.expires <= now:
+                    os.remove(filename)
+                    count += 1
+                else:
+                    entries.append((stored.stored, os.path.getsize(filename), filename))
+            except OSError:
+                pass
+        total = sum(size for stored, size, filename in entries)
+        for stored, size, filename in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(filename)
+                count += 1
+            except OSError:
+                pass
+            total -= size
+        return count
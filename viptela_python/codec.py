@@ -0,0 +1,135 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import rapidjson
+except ImportError:
+    rapidjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+class JSONCodec(object):
+    """
+    JSON codec backed by the standard library json module
+    """
+    name = 'json'
+    module = json
+
+    @classmethod
+    def available(cls):
+        """
+        Check the codec backend is installed
+        :return: True if the backend can be used
+        """
+        return cls.module is not None
+
+    def dumps(self, obj):
+        """
+        Encode an object to JSON
+        :param obj: object to encode
+        :return: JSON string or bytes
+        """
+        return json.dumps(obj)
+
+    def loads(self, data):
+        """
+        Decode JSON
+        :param data: JSON string or bytes
+        :return: decoded object
+        """
+        if isinstance(data, (bytes, bytearray)):
+            data = data.decode('utf-8')
+        return json.loads(data)
+
+
+class OrjsonCodec(JSONCodec):
+    """
+    JSON codec backed by orjson
+    """
+    name = 'orjson'
+    module = orjson
+
+    def dumps(self, obj):
+        return orjson.dumps(obj)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+class RapidjsonCodec(JSONCodec):
+    """
+    JSON codec backed by python-rapidjson
+    """
+    name = 'rapidjson'
+    module = rapidjson
+
+    def dumps(self, obj):
+        return rapidjson.dumps(obj)
+
+    def loads(self, data):
+        if isinstance(data, (bytes, bytearray)):
+            data = data.decode('utf-8')
+        return rapidjson.loads(data)
+
+
+class UjsonCodec(JSONCodec):
+    """
+    JSON codec backed by ujson
+    """
+    name = 'ujson'
+    module = ujson
+
+    def dumps(self, obj):
+        return ujson.dumps(obj)
+
+    def loads(self, data):
+        if isinstance(data, (bytes, bytearray)):
+            data = data.decode('utf-8')
+        return ujson.loads(data)
+
+
+CODECS = {
+    'json': JSONCodec,
+    'orjson': OrjsonCodec,
+    'rapidjson': RapidjsonCodec,
+    'ujson': UjsonCodec,
+}
+
+# Order in which backends are tried when the codec is 'auto'
+AUTO_CODECS = ('orjson', 'rapidjson', 'ujson', 'json')
+
+DEFAULT_CODEC = JSONCodec()
+
+
+def get_codec(codec='auto'):
+    """
+    Get a JSON codec
+    :param codec: codec name, 'auto' for the fastest installed backend, or a codec instance
+    :return: codec object
+    """
+    if codec is None:
+        return DEFAULT_CODEC
+
+    if not isinstance(codec, str):
+        return codec
+
+    if codec == 'auto':
+        for name in AUTO_CODECS:
+            if CODECS[name].available():
+                return CODECS[name]()
+
+    if codec not in CODECS:
+        raise ValueError('Invalid JSON codec: {0}'.format(codec))
+
+    if not CODECS[codec].available():
+        raise ValueError('JSON codec {0} is not installed'.format(codec))
+
+    return CODECS[codec]()
@@ -0,0 +1,180 @@
+import heapq
+import threading
+import time
+import zlib
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from . viptela import failed_result
+
+_clock = getattr(time, 'monotonic', time.time)
+
+# Result of one poll of one getter for one device
+Sample = namedtuple('Sample', ['device_id', 'getter', 'timestamp', 'latency', 'result'])
+
+# Poll that was skipped because the previous poll of the same device and
+# getter was still running, or because the collector fell a whole interval behind
+Overrun = namedtuple('Overrun', ['device_id', 'getter', 'due', 'late'])
+
+
+def poll_phase(device_id, getter, interval):
+    """
+    Offset of a device's polls in the interval. It is derived from the device
+    and getter, so polls are spread evenly and keep their phase across restarts.
+    :param device_id: Device ID
+    :param getter: Getter name
+    :param interval: Seconds between polls
+    :return: seconds after the start of each interval
+    """
+    key = '{0}/{1}'.format(device_id, getter).encode('utf-8')
+    return (zlib.crc32(key) & 0xffffffff) / float(0x100000000) * interval
+
+
+class StatisticsCollector(object):
+    """
+    Polls getters such as get_tunnel_statistics for many devices every
+    interval. Each device and getter pair gets its own phase in the interval
+    so the load on vManage stays flat, at most max_workers polls run at once,
+    and a poll is skipped and reported as an overrun while the previous one
+    is still running. Each Sample is handed to the sink.
+    """
+    def __init__(self, viptela, getters, device_ids, interval=300, max_workers=10, sink=None,
+                 on_overrun=None):
+        """
+        Init method for StatisticsCollector class
+        :param viptela: Viptela object
+        :param getters: List of per-device getter names, e.g. ['get_tunnel_statistics']
+        :param device_ids: Iterable of device IDs
+        :param interval: Seconds between two polls of the same device and getter
+        :param max_workers: Maximum number of concurrent polls
+        :param sink: Callable called with each Sample, from the worker threads
+        :param on_overrun: Callable called with each Overrun
+        """
+        self.viptela = viptela
+        self.getters = list(getters)
+        self.interval = interval
+        self.max_workers = max_workers
+        self.sink = sink
+        self.on_overrun = on_overrun
+        self.polls = 0
+        self.overruns = 0
+        self.sink_errors = 0
+        self._schedule = []
+        # Generation of each polled device and getter pair. Heap entries carry
+        # the generation they were pushed with, so entries left by a pair that
+        # was removed and added again are dropped
+        self._generations = {}
+        self._generation = 0
+        self._running = set()
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(max_workers)
+        self._stop = threading.Event()
+        self._thread = None
+        self.update_devices(device_ids)
+
+    def update_devices(self, device_ids):
+        """
+        Change the devices polled, keeping the phase of devices already polled
+        :param device_ids: Iterable of device IDs
+        :return: None
+        """
+        now = _clock()
+        wanted = set((device_id, getter) for device_id in device_ids for getter in self.getters)
+        with self._lock:
+            for pair in set(self._generations) - wanted:
+                del self._generations[pair]
+            for device_id, getter in wanted - set(self._generations):
+                phase = poll_phase(device_id, getter, self.interval)
+                due = now - now % self.interval + phase
+                if due < now:
+                    due += self.interval
+                self._generation += 1
+                self._generations[(device_id, getter)] = self._generation
+                heapq.heappush(self._schedule, (due, self._generation, device_id, getter))
+
+    def _poll(self, device_id, getter):
+        started = _clock()
+        try:
+            result = getattr(self.viptela, getter)(device_id)[0]
+        except Exception as e:
+            result = failed_result(e)
+        sample = Sample(device_id, getter, time.time(), _clock() - started, result)
+        try:
+            if self.sink is not None:
+                self.sink(sample)
+        except Exception:
+            with self._lock:
+                self.sink_errors += 1
+        finally:
+            with self._lock:
+                self._running.discard((device_id, getter))
+            self._slots.release()
+
+    def _overrun(self, device_id, getter, due, now):
+        with self._lock:
+            self.overruns += 1
+        if self.on_overrun is not None:
+            self.on_overrun(Overrun(device_id, getter, due, now - due))
+
+    def run(self, duration=None):
+        """
+        Poll until stop() is called or duration elapses
+        :param duration: Seconds to run for, None to run until stopped
+        :return: None
+        """
+        self._stop.clear()
+        deadline = None if duration is None else _clock() + duration
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            while not self._stop.is_set():
+                with self._lock:
+                    due = self._schedule[0][0] if self._schedule else None
+                now = _clock()
+                if deadline is not None and now >= deadline:
+                    break
+                wake = min(t for t in (due, deadline, now + 1) if t is not None)
+                if wake > now:
+                    self._stop.wait(wake - now)
+                    continue
+
+                with self._lock:
+                    due, generation, device_id, getter = heapq.heappop(self._schedule)
+                    if self._generations.get((device_id, getter)) != generation:
+                        continue
+                    # Keep the phase, skipping whole intervals the collector fell behind by
+                    missed = int((now - due) // self.interval)
+                    heapq.heappush(self._schedule,
+                                   (due + (missed + 1) * self.interval, generation, device_id, getter))
+                    busy = (device_id, getter) in self._running
+                if busy or missed:
+                    self._overrun(device_id, getter, due, now)
+                    if busy:
+                        continue
+
+                self._slots.acquire()
+                with self._lock:
+                    self._running.add((device_id, getter))
+                    self.polls += 1
+                executor.submit(self._poll, device_id, getter)
+        finally:
+            executor.shutdown(wait=True)
+
+    def start(self):
+        """
+        Run in a background thread
+        :return: the thread
+        """
+        self._thread = threading.Thread(target=self.run)
+        self._thread.daemon = True
+        self._thread.start()
+        return self._thread
+
+    def stop(self, wait=True):
+        """
+        Stop polling
+        :param wait: Wait for the polls in progress to finish
+        :return: None
+        """
+        self._stop.set()
+        if wait and self._thread is not None:
+            self._thread.join()
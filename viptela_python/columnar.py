@@ -0,0 +1,400 @@
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    intern = intern
+except NameError:
+    from sys import intern
+
+try:
+    string_types = (basestring,)
+except NameError:
+    string_types = (str,)
+
+# Column kinds
+INT = 'int'
+FLOAT = 'float'
+STRING = 'string'
+OBJECT = 'object'
+
+# Code of a missing value in a string column
+MISSING = -1
+
+
+def _value_kind(value):
+    """
+    Narrowest column kind holding a value
+    :param value: column value, not None
+    :return: column kind
+    """
+    if isinstance(value, bool):
+        return OBJECT
+    if isinstance(value, int) or type(value).__name__ == 'long':
+        return INT
+    if isinstance(value, float):
+        return FLOAT
+    if isinstance(value, string_types):
+        return STRING
+    return OBJECT
+
+
+class _ColumnBuilder(object):
+    """
+    Typed array of one column filled while the rows are read, widened to
+    float or object values when a value of another kind is seen
+    """
+    def __init__(self, missing=0):
+        """
+        Init method for _ColumnBuilder class
+        :param missing: Number of rows read before the column was first seen
+        """
+        self.kind = None
+        self.values = None
+        # Validity of int values, only kept once a value is missing
+        self.valid = None
+        self.missing = missing
+        self.codes = None
+        self.distinct = None
+
+    def _start(self, kind):
+        self.kind = kind
+        if kind == INT:
+            self.values = array('q', [0] * self.missing)
+            self.valid = array('b', [0] * self.missing) if self.missing else None
+        elif kind == FLOAT:
+            self.values = array('d', [float('nan')] * self.missing)
+        elif kind == STRING:
+            self.values = array('i', [MISSING] * self.missing)
+            self.codes = dict()
+            self.distinct = []
+        else:
+            self.values = [None] * self.missing
+
+    def _decoded(self):
+        if self.kind == STRING:
+            return [None if code == MISSING else self.distinct[code] for code in self.values]
+        if self.kind == FLOAT:
+            return [None if value != value else value for value in self.values]
+        if self.kind == INT and self.valid is not None:
+            return [value if valid else None for value, valid in zip(self.values, self.valid)]
+        return list(self.values)
+
+    def _widen(self, kind):
+        if self.kind == FLOAT and kind == INT:
+            return
+        if self.kind == INT and kind == FLOAT:
+            self.values = array('d', [float('nan') if value is None else value for value in self._decoded()])
+            self.valid = None
+        else:
+            self.values = self._decoded()
+            self.codes = self.distinct = self.valid = None
+            kind = OBJECT
+        self.kind = kind
+
+    def append(self, value):
+        """
+        Append the value of the next row
+        :param value: column value, None if missing
+        :return: None
+        """
+        if value is None:
+            if self.kind is None:
+                self.missing += 1
+            elif self.kind == INT:
+                if self.valid is None:
+                    self.valid = array('b', [1] * len(self.values))
+                self.values.append(0)
+                self.valid.append(0)
+            elif self.kind == FLOAT:
+                self.values.append(float('nan'))
+            elif self.kind == STRING:
+                self.values.append(MISSING)
+            else:
+                self.values.append(None)
+            return
+
+        kind = _value_kind(value)
+        if self.kind is None:
+            self._start(kind)
+        elif kind != self.kind and self.kind != OBJECT:
+            self._widen(kind)
+
+        if self.kind == INT:
+            try:
+                self.values.append(value)
+            except OverflowError:
+                # Larger than int64
+                self._widen(OBJECT)
+                self.values.append(value)
+                return
+            if self.valid is not None:
+                self.valid.append(1)
+        elif self.kind == FLOAT:
+            self.values.append(float(value))
+        elif self.kind == STRING:
+            code = self.codes.get(value)
+            if code is None:
+                code = self.codes[value] = len(self.distinct)
+                self.distinct.append(intern(value) if isinstance(value, str) else value)
+            self.values.append(code)
+        else:
+            self.values.append(value)
+
+    def finish(self, backend):
+        """
+        :param backend: 'numpy' or 'array'
+        :return: column kind, array or list, distinct strings and int validity mask
+        """
+        if self.kind is None:
+            self._start(STRING)
+        values = self.values
+        valid = self.valid
+        if backend == 'numpy':
+            if self.kind == INT:
+                values = numpy.frombuffer(values, dtype=numpy.int64).copy()
+                if valid is not None:
+                    valid = numpy.frombuffer(valid, dtype=numpy.int8).astype(bool)
+            elif self.kind == FLOAT:
+                values = numpy.frombuffer(values, dtype=numpy.float64).copy()
+            elif self.kind == STRING:
+                values = numpy.frombuffer(values, dtype=numpy.int32).copy()
+        return self.kind, values, self.distinct, valid
+
+
+class ColumnarTable(object):
+    """
+    Rows of a tabular result, such as tunnel statistics or ARP entries,
+    stored one typed array per column. Numbers go into int64 or float64
+    arrays, NumPy arrays if it is installed and array.array otherwise, with
+    NaN for missing floats and a validity mask for ints. Strings are interned and stored as int32 codes
+    into a list of distinct values, so repeated colors, states and host
+    names are kept once. Other values stay in plain lists.
+    """
+    def __init__(self, columns, kinds, categories, length, backend, valid=None):
+        """
+        Init method for ColumnarTable class, use from_rows to build one
+        :param columns: Dict of column name to array, string columns holding codes
+        :param kinds: Dict of column name to column kind
+        :param categories: Dict of string column name to list of distinct values
+        :param length: Number of rows
+        :param backend: 'numpy' or 'array'
+        :param valid: Dict of int column name to validity mask, for int columns with missing values
+        """
+        self.columns = columns
+        self.kinds = kinds
+        self.categories = categories
+        self.length = length
+        self.backend = backend
+        self.valid = valid or dict()
+
+    @staticmethod
+    def _backend(backend):
+        if backend == 'auto':
+            return 'numpy' if numpy is not None else 'array'
+        if backend == 'numpy' and numpy is None:
+            raise ValueError('numpy is not installed')
+        if backend not in ('numpy', 'array'):
+            raise ValueError('Unknown backend: {0}'.format(backend))
+        return backend
+
+    @classmethod
+    def from_rows(cls, rows, columns=None, backend='auto'):
+        """
+        Build a table from dict rows
+        :param rows: Iterable of dicts, e.g. Result.data or a streaming iterator
+        :param columns: Column names to keep, defaults to every key seen
+        :param backend: 'numpy', 'array' or 'auto' for numpy if installed
+        :return: ColumnarTable
+        """
+        backend = cls._backend(backend)
+        builders = dict((name, _ColumnBuilder()) for name in columns or [])
+        length = 0
+        for row in rows:
+            if columns is None:
+                for name in row:
+                    if name not in builders:
+                        # Column first seen in a later row, missing from the earlier ones
+                        builders[name] = _ColumnBuilder(missing=length)
+            for name, builder in builders.items():
+                builder.append(row.get(name))
+            length += 1
+
+        table_columns = dict()
+        kinds = dict()
+        categories = dict()
+        valid = dict()
+        for name, builder in builders.items():
+            kinds[name], table_columns[name], distinct, mask = builder.finish(backend)
+            if distinct is not None:
+                categories[name] = distinct
+            if mask is not None:
+                valid[name] = mask
+        return cls(table_columns, kinds, categories, length, backend, valid)
+
+    def __len__(self):
+        return self.length
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    @property
+    def names(self):
+        """
+        :return: list of column names
+        """
+        return list(self.columns)
+
+    def codes(self, name):
+        """
+        Codes of a string column, indexes into categories[name], MISSING for missing values
+        :param name: column name
+        :return: int32 array
+        """
+        if self.kinds[name] != STRING:
+            raise ValueError('{0} is not a string column'.format(name))
+        return self.columns[name]
+
+    def __getitem__(self, name):
+        """
+        Values of a column. Numbers are returned as their typed array, ints
+        with missing values as a NumPy masked array with the numpy backend and
+        a list with None for them otherwise, and strings decoded, as a NumPy
+        object array with the numpy backend.
+        :param name: column name
+        :return: array or list
+        """
+        column = self.columns[name]
+        valid = self.valid.get(name)
+        if valid is not None:
+            if self.backend == 'numpy':
+                return numpy.ma.masked_array(column, mask=~valid)
+            return [value if ok else None for value, ok in zip(column, valid)]
+        if self.kinds[name] != STRING:
+            return column
+        distinct = self.categories[name]
+        if self.backend == 'numpy':
+            lookup = numpy.array(distinct + [None], dtype=object)
+            return lookup[column]
+        return [None if code == MISSING else distinct[code] for code in column]
+
+    @staticmethod
+    def _decode(kind, distinct, value):
+        if kind == STRING:
+            return None if value == MISSING else distinct[value]
+        if kind == FLOAT:
+            return None if value != value else float(value)
+        if kind == INT:
+            return int(value)
+        return value
+
+    def row(self, index):
+        """
+        One row as a dict, missing values left out
+        :param index: row index
+        :return: dict
+        """
+        row = dict()
+        for name, column in self.columns.items():
+            if name in self.valid and not self.valid[name][index]:
+                continue
+            value = self._decode(self.kinds[name], self.categories.get(name), column[index])
+            if value is not None:
+                row[name] = value
+        return row
+
+    def to_rows(self):
+        """
+        Convert back to dict rows, missing and None values left out
+        :return: list of dicts
+        """
+        decoded = []
+        for name, column in self.columns.items():
+            kind = self.kinds[name]
+            distinct = self.categories.get(name)
+            values = column.tolist() if hasattr(column, 'tolist') else column
+            values = [self._decode(kind, distinct, value) for value in values]
+            if name in self.valid:
+                values = [value if ok else None for value, ok in zip(values, self.valid[name])]
+            decoded.append((name, values))
+        rows = [dict() for i in range(self.length)]
+        for name, values in decoded:
+            for row, value in zip(rows, values):
+                if value is not None:
+                    row[name] = value
+        return rows
+
+    def take(self, indexes):
+        """
+        Table of some of the rows, e.g. those where a NumPy mask is True
+        :param indexes: Sequence of row indexes, or boolean mask with the numpy backend
+        :return: ColumnarTable sharing the categories of this one
+        """
+        if self.backend == 'numpy':
+            indexes = numpy.asarray(indexes)
+            if indexes.dtype == bool:
+                indexes = numpy.flatnonzero(indexes)
+            length = len(indexes)
+            columns = dict((name, column[indexes] if self.kinds[name] != OBJECT
+                            else [column[i] for i in indexes]) for name, column in self.columns.items())
+            valid = dict((name, mask[indexes]) for name, mask in self.valid.items())
+        else:
+            indexes = list(indexes)
+            length = len(indexes)
+            columns = dict()
+            for name, column in self.columns.items():
+                taken = [column[i] for i in indexes]
+                columns[name] = array(column.typecode, taken) if isinstance(column, array) else taken
+            valid = dict((name, array(mask.typecode, [mask[i] for i in indexes]))
+                         for name, mask in self.valid.items())
+        return ColumnarTable(columns, dict(self.kinds), dict(self.categories), length, self.backend, valid)
+
+    def sum_by(self, key, value):
+        """
+        Sum a numeric column per value of a string column
+        :param key: string column name, e.g. 'vdevice-name'
+        :param value: numeric column name, e.g. 'tx_octets'
+        :return: dict of key value to sum
+        """
+        codes = self.codes(key)
+        numbers = self.columns[value]
+        distinct = self.categories[key]
+        if self.backend == 'numpy':
+            present = codes != MISSING
+            weights = numpy.nan_to_num(numpy.asarray(numbers, dtype=numpy.float64)[present])
+            sums = numpy.bincount(codes[present], weights=weights, minlength=len(distinct))
+            return dict(zip(distinct, sums.tolist()))
+        sums = [0] * len(distinct)
+        for code, number in zip(codes, numbers):
+            if code != MISSING and number == number:
+                sums[code] += number
+        return dict(zip(distinct, sums))
+
+    @property
+    def nbytes(self):
+        """
+        Approximate memory held by the numeric and code arrays
+        :return: bytes
+        """
+        total = 0
+        for column in list(self.columns.values()) + list(self.valid.values()):
+            if hasattr(column, 'nbytes'):
+                total += column.nbytes
+            elif isinstance(column, array):
+                total += column.itemsize * len(column)
+        return total
+
+
+def columnar(result, columns=None, backend='auto'):
+    """
+    Columnar view of the data rows of a Result
+    :param result: Result whose data is a list of dicts
+    :param columns: Column names to keep, defaults to every key seen
+    :param backend: 'numpy', 'array' or 'auto' for numpy if installed
+    :return: ColumnarTable
+    """
+    rows = result.data if isinstance(result.data, list) else []
+    return ColumnarTable.from_rows(rows, columns=columns, backend=backend)
@@ -11,3 +11,29 @@ class LoginTimeoutError(Error):
 class LoginCredentialsError(Error):
     """Raised when there is a problem with the user credentials"""
     pass
+
+
+class ResponseError(Error):
+    """Raised when vManage answers a streamed request with an error"""
+    def __init__(self, message, result=None):
+        super(ResponseError, self).__init__(message)
+        self.result = result
+
+
+class CircuitOpenError(Error):
+    """Raised when requests are refused because vManage looks down"""
+    pass
+
+
+class JobTimeoutError(Error):
+    """Raised when device action jobs do not finish in time"""
+    def __init__(self, message, pending=None):
+        super(JobTimeoutError, self).__init__(message)
+        self.pending = pending
+
+
+class TemplateValidationError(Error):
+    """Raised when device template input fails local validation"""
+    def __init__(self, message, problems=None):
+        super(TemplateValidationError, self).__init__(message)
+        self.problems = problems
@@ -0,0 +1,193 @@
+import threading
+
+from collections import namedtuple
+
+try:
+    intern = intern
+except NameError:
+    from sys import intern
+
+# Compact view of a device. Fields repeated across many devices are interned.
+DeviceRecord = namedtuple('DeviceRecord', [
+    'uuid', 'system_ip', 'host_name', 'site_id', 'model', 'device_type',
+    'version', 'reachability', 'status'
+])
+
+# Keys of a device dict read into each field, from /device first then /system/device
+RECORD_KEYS = (
+    ('uuid', ('uuid',)),
+    ('system_ip', ('system-ip', 'deviceId')),
+    ('host_name', ('host-name', 'hostName')),
+    ('site_id', ('site-id', 'siteId')),
+    ('model', ('device-model', 'deviceModel')),
+    ('device_type', ('device-type', 'deviceType', 'personality')),
+    ('version', ('version',)),
+    ('reachability', ('reachability',)),
+    ('status', ('status',)),
+)
+
+# Fields whose values are shared by many devices
+INTERNED_FIELDS = frozenset(['site_id', 'model', 'device_type', 'version', 'reachability', 'status'])
+
+
+def device_record(device):
+    """
+    Build a compact record from a device dict
+    :param device: device dict from /device or /system/device
+    :return: DeviceRecord
+    """
+    values = []
+    for field, keys in RECORD_KEYS:
+        value = None
+        for key in keys:
+            value = device.get(key)
+            if value is not None:
+                break
+        if value is not None:
+            value = str(value)
+            if field in INTERNED_FIELDS:
+                value = intern(value)
+        values.append(value)
+    return DeviceRecord(*values)
+
+
+class DeviceInventory(object):
+    """
+    Devices of vManage indexed by uuid, system IP, host name, site ID and
+    model. refresh only touches the indexes for devices that were added,
+    changed or removed since the previous refresh.
+    """
+    def __init__(self, viptela=None, devices=None):
+        """
+        Init method for DeviceInventory class
+        :param viptela: Viptela object used by refresh, None to only load devices passed in
+        :param devices: Iterable of device dicts to load, instead of fetching them
+        """
+        self.viptela = viptela
+        self.by_uuid = dict()
+        self.by_system_ip = dict()
+        self.by_host_name = dict()
+        self.by_site_id = dict()
+        self.by_model = dict()
+        self._sources = dict()
+        self._lock = threading.Lock()
+        if devices is not None:
+            self.refresh(devices=devices)
+
+    def __len__(self):
+        return len(self.by_uuid)
+
+    def __iter__(self):
+        return iter(list(self.by_uuid.values()))
+
+    def __contains__(self, uuid):
+        return uuid in self.by_uuid
+
+    def _add(self, record):
+        self.by_uuid[record.uuid] = record
+        if record.system_ip is not None:
+            self.by_system_ip[record.system_ip] = record
+        if record.host_name is not None:
+            self.by_host_name[record.host_name] = record
+        self.by_site_id.setdefault(record.site_id, dict())[record.uuid] = record
+        self.by_model.setdefault(record.model, dict())[record.uuid] = record
+
+    def _remove(self, record):
+        del self.by_uuid[record.uuid]
+        if self.by_system_ip.get(record.system_ip) is record:
+            del self.by_system_ip[record.system_ip]
+        if self.by_host_name.get(record.host_name) is record:
+            del self.by_host_name[record.host_name]
+        for index, key in ((self.by_site_id, record.site_id), (self.by_model, record.model)):
+            group = index[key]
+            del group[record.uuid]
+            if not group:
+                del index[key]
+
+    def refresh(self, device_type=None, devices=None, prune=True):
+        """
+        Bring the inventory up to date, applying only the records that changed
+        :param device_type: None for every device from /device, or 'vedges' or 'controllers'
+        :param devices: Iterable of device dicts to apply, instead of fetching them
+        :param prune: Remove devices from the same source that are no longer listed
+        :return: tuple of lists of added, changed and removed DeviceRecord
+        """
+        source = device_type or 'all'
+        if devices is None and self.viptela is None:
+            raise ValueError('DeviceInventory has no Viptela object to fetch devices with, pass devices')
+        if devices is None:
+            if device_type is None:
+                devices = self.viptela.iter_all_devices()
+            else:
+                result = self.viptela.get_device_by_type(device_type)[0]
+                if not result.ok:
+                    raise ValueError('Could not get {0}: {1}'.format(device_type, result.error))
+                devices = result.data
+
+        added, changed, removed = [], [], []
+        seen = set()
+        with self._lock:
+            for device in devices:
+                record = device_record(device)
+                if record.uuid is None:
+                    continue
+                seen.add(record.uuid)
+                current = self.by_uuid.get(record.uuid)
+                if current == record:
+                    continue
+                if current is None:
+                    added.append(record)
+                else:
+                    self._remove(current)
+                    changed.append(record)
+                self._add(record)
+
+            if prune:
+                for uuid in self._sources.get(source, set()) - seen:
+                    record = self.by_uuid.get(uuid)
+                    if record is not None:
+                        self._remove(record)
+                        removed.append(record)
+            self._sources[source] = seen
+        return added, changed, removed
+
+    def get(self, key):
+        """
+        Find a device by uuid, system IP or host name
+        :param key: uuid, system IP or host name
+        :return: DeviceRecord or None
+        """
+        return self.by_uuid.get(key) or self.by_system_ip.get(key) or self.by_host_name.get(key)
+
+    def site(self, site_id):
+        """
+        Devices of a site
+        :param site_id: Site ID
+        :return: list of DeviceRecord
+        """
+        return list(self.by_site_id.get(str(site_id), dict()).values())
+
+    def model(self, model):
+        """
+        Devices of a model
+        :param model: Device model, e.g. 'vedge-cloud'
+        :return: list of DeviceRecord
+        """
+        return list(self.by_model.get(model, dict()).values())
+
+    def uuids(self, records=None):
+        """
+        uuids of devices, e.g. to pass to map_devices
+        :param records: Iterable of DeviceRecord, defaults to every device
+        :return: list of uuids
+        """
+        return [record.uuid for record in (self.by_uuid.values() if records is None else records)]
+
+    def system_ips(self, records=None):
+        """
+        System IPs of devices, the device ID taken by most per-device getters
+        :param records: Iterable of DeviceRecord, defaults to every device
+        :return: list of system IPs
+        """
+        records = self.by_uuid.values() if records is None else records
+        return [record.system_ip for record in records if record.system_ip is not None]
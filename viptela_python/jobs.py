@@ -0,0 +1,157 @@
+import time
+
+from collections import namedtuple
+from . exceptions import JobTimeoutError
+
+_clock = getattr(time, 'monotonic', time.time)
+
+# Device statuses of an action that will not change any more
+TERMINAL_STATUSES = frozenset(['success', 'failure', 'failed', 'error', 'skipped', 'cancelled', 'done'])
+
+# Status change of one device of an action, done is True once the whole action finished.
+# A job whose status could not be read max_errors times in a row ends with one update
+# whose device_id is None, status is 'error' and entry is the failed Result.
+JobUpdate = namedtuple('JobUpdate', ['action_id', 'device_id', 'status', 'done', 'entry'])
+
+
+def device_status(entry):
+    """
+    Normalised status of a device entry of an action
+    :param entry: device dict from /device/action/status
+    :return: lower case status string
+    """
+    return (entry.get('statusId') or entry.get('status') or '').lower().replace(' ', '_')
+
+
+def device_key(entry):
+    """
+    Identifier of a device entry of an action
+    :param entry: device dict from /device/action/status
+    :return: device uuid, or system IP if there is none
+    """
+    return entry.get('uuid') or entry.get('deviceID') or entry.get('system-ip') or entry.get('deviceIP')
+
+
+class JobWaiter(object):
+    """
+    Waits on many device action jobs at once. Iterating yields a JobUpdate
+    each time a device of a job changes status, and stops once every job
+    has finished. Pending jobs are polled together, on an interval that
+    grows while nothing changes. A job whose status cannot be read
+    max_errors times in a row is given up on as failed.
+    """
+    def __init__(self, viptela, action_ids, interval=2, max_interval=60, backoff=1.5,
+                 timeout=None, max_workers=4, max_errors=5):
+        """
+        Init method for JobWaiter class
+        :param viptela: Viptela object
+        :param action_ids: Action ID or list of action IDs to wait on
+        :param interval: Seconds between the first polls
+        :param max_interval: Maximum seconds between polls
+        :param backoff: Factor the interval grows by after a poll with no change
+        :param timeout: Seconds to wait before raising JobTimeoutError, None to wait forever
+        :param max_workers: Maximum number of concurrent status requests
+        :param max_errors: Consecutive failed status requests after which a job is failed, None to retry forever
+        """
+        if not isinstance(action_ids, (list, tuple, set)):
+            action_ids = [action_ids]
+        self.viptela = viptela
+        self.interval = interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.max_errors = max_errors
+        self.pending = set(action_ids)
+        self.statuses = dict((action_id, dict()) for action_id in action_ids)
+        self.errors = dict()
+        self._error_counts = dict()
+
+    @staticmethod
+    def _finished(result, entries):
+        summary = (result.document or dict()).get('summary') or dict()
+        if str(summary.get('status', '')).lower() == 'done':
+            return True
+        return bool(entries) and all(device_status(entry) in TERMINAL_STATUSES for entry in entries)
+
+    def record(self, action_id, result):
+        """
+        Apply one status poll of a job
+        :param action_id: Action ID
+        :param result: Result of check_status for the job
+        :return: list of JobUpdate for the devices whose status changed
+        """
+        if not result.ok:
+            self.errors[action_id] = result
+            self._error_counts[action_id] = self._error_counts.get(action_id, 0) + 1
+            if self.max_errors is not None and self._error_counts[action_id] >= self.max_errors:
+                self.pending.discard(action_id)
+                return [JobUpdate(action_id, None, 'error', True, result)]
+            return []
+        self.errors.pop(action_id, None)
+        self._error_counts.pop(action_id, None)
+
+        entries = result.data if isinstance(result.data, list) else []
+        finished = self._finished(result, entries)
+        if finished:
+            self.pending.discard(action_id)
+        statuses = self.statuses[action_id]
+        updates = []
+        for entry in entries:
+            key = device_key(entry)
+            status = device_status(entry)
+            if statuses.get(key) != status:
+                statuses[key] = status
+                updates.append(JobUpdate(action_id, key, status, finished, entry))
+        return updates
+
+    def poll(self):
+        """
+        Poll every pending job once
+        :return: list of JobUpdate for the devices whose status changed
+        """
+        updates = []
+        polled = self.viptela.map_devices('check_status', list(self.pending), max_workers=self.max_workers)
+        for action_id, result in polled:
+            updates.extend(self.record(action_id, result))
+        return updates
+
+    def delay(self, elapsed, interval):
+        """
+        Time to sleep before the next poll
+        :param elapsed: Seconds since the wait started
+        :param interval: Current interval between polls
+        :return: seconds, raising JobTimeoutError once the timeout expired
+        """
+        if self.timeout is None:
+            return interval
+        remaining = self.timeout - elapsed
+        if remaining <= 0:
+            raise JobTimeoutError(
+                '{0} jobs did not finish in {1} seconds'.format(len(self.pending), self.timeout),
+                sorted(self.pending)
+            )
+        return min(interval, remaining)
+
+    def __iter__(self):
+        started = _clock()
+        interval = self.interval
+        while self.pending:
+            updates = self.poll()
+            for update in updates:
+                yield update
+            if not self.pending:
+                return
+
+            if not updates:
+                interval = min(self.max_interval, interval * self.backoff)
+            time.sleep(self.delay(_clock() - started, interval))
+
+    def wait(self):
+        """
+        Wait for every job to finish
+        :return: dict of action ID to dict of device to final status
+        """
+        for update in self:
+            pass
+        return self.statuses
@@ -0,0 +1,188 @@
+import re
+import threading
+import time
+
+_clock = getattr(time, 'monotonic', time.time)
+
+# Methods sent through the read bucket, all others go through the write bucket
+READ_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+
+# Paths of POST requests that only read state, sent through the read bucket
+READ_ONLY_POSTS = (
+    r'^/statistics/',
+    r'^/template/device/config/input/?$',
+    r'^/template/device/config/duplicateip$',
+)
+
+# Status codes vManage answers with when it is overloaded or rate limiting
+THROTTLE_STATUS_CODES = frozenset([429, 503])
+
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket. A request reserves a token and is told how long
+    to wait for it, so the lock is never held while waiting and the bucket
+    can be shared by threads and asyncio tasks.
+    """
+    def __init__(self, rate, burst=None):
+        """
+        Init method for TokenBucket class
+        :param rate: Tokens added per second
+        :param burst: Maximum tokens saved up, defaults to one second worth
+        """
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1, rate))
+        self._tokens = self.burst
+        self._updated = _clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, tokens=1):
+        """
+        Take tokens, going into debt if there are not enough
+        :param tokens: Number of tokens
+        :return: seconds to wait before using them
+        """
+        with self._lock:
+            self._refill(_clock())
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self, tokens=1):
+        """
+        Take tokens, sleeping until they are available
+        :param tokens: Number of tokens
+        :return: None
+        """
+        delay = self.reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+    def set_rate(self, rate):
+        """
+        Change the rate, keeping the tokens earned at the old rate
+        :param rate: Tokens added per second
+        :return: None
+        """
+        with self._lock:
+            self._refill(_clock())
+            self.rate = float(rate)
+
+
+class AdaptiveRateLimiter(object):
+    """
+    Rate limiter with separate token buckets for reads and writes. A bucket's
+    rate is cut when vManage answers 429/503 or when its average time to
+    response headers rises above a threshold, so downloading a large body
+    does not count as vManage being slow. It then climbs back linearly towards the
+    configured maximum while responses stay healthy.
+    """
+    def __init__(self, read_rate=20, write_rate=5, burst=None, min_rate=0.5, decrease=0.5,
+                 recovery=0.05, latency_threshold=5.0, latency_smoothing=0.2, cooldown=1.0,
+                 read_only_posts=READ_ONLY_POSTS):
+        """
+        Init method for AdaptiveRateLimiter class
+        :param read_rate: Maximum GET and read-only POST requests per second
+        :param write_rate: Maximum other POST, PUT and DELETE requests per second
+        :param burst: Maximum requests sent back to back, defaults to one second worth
+        :param min_rate: Rate is never cut below this many requests per second
+        :param decrease: Factor the rate is multiplied by when vManage pushes back
+        :param recovery: Fraction of the maximum rate regained per second while healthy
+        :param latency_threshold: Average time to response headers in seconds above which the rate is cut
+        :param latency_smoothing: Weight of the latest sample in the average latency
+        :param cooldown: Minimum seconds between two cuts of the same bucket
+        :param read_only_posts: Patterns of POST request paths that only read state
+        """
+        self.min_rate = min_rate
+        self.decrease = decrease
+        self.recovery = recovery
+        self.latency_threshold = latency_threshold
+        self.latency_smoothing = latency_smoothing
+        self.cooldown = cooldown
+        self.read_only_posts = [re.compile(pattern) for pattern in read_only_posts]
+        self.max_rates = {'read': float(read_rate), 'write': float(write_rate)}
+        self.buckets = {
+            'read': TokenBucket(read_rate, burst),
+            'write': TokenBucket(write_rate, burst),
+        }
+        self.latency = {'read': None, 'write': None}
+        self._adjusted = {'read': _clock(), 'write': _clock()}
+        self._cut = {'read': 0.0, 'write': 0.0}
+        self._lock = threading.Lock()
+
+    def kind(self, method, path=None):
+        """
+        Bucket used by a request
+        :param method: HTTP method
+        :param path: Request path below /dataservice, used to find read-only POSTs
+        :return: 'read' or 'write'
+        """
+        method = method.upper()
+        if method in READ_METHODS:
+            return 'read'
+        if method == 'POST' and path is not None:
+            for pattern in self.read_only_posts:
+                if pattern.search(path):
+                    return 'read'
+        return 'write'
+
+    def rate(self, method, path=None):
+        """
+        Current rate of the bucket used by a request
+        :param method: HTTP method
+        :param path: Request path below /dataservice
+        :return: requests per second
+        """
+        return self.buckets[self.kind(method, path)].rate
+
+    def reserve(self, method, path=None):
+        """
+        Reserve a request
+        :param method: HTTP method
+        :param path: Request path below /dataservice
+        :return: seconds to wait before sending it
+        """
+        return self.buckets[self.kind(method, path)].reserve()
+
+    def acquire(self, method, path=None):
+        """
+        Wait until a request may be sent
+        :param method: HTTP method
+        :param path: Request path below /dataservice
+        :return: None
+        """
+        self.buckets[self.kind(method, path)].acquire()
+
+    def record(self, method, status_code, latency, path=None):
+        """
+        Adapt the rate to the outcome of a request
+        :param method: HTTP method
+        :param status_code: HTTP status code, None if the request failed
+        :param latency: Seconds until the response headers arrived, or until the request failed
+        :param path: Request path below /dataservice
+        :return: None
+        """
+        kind = self.kind(method, path)
+        bucket = self.buckets[kind]
+        now = _clock()
+        with self._lock:
+            average = self.latency[kind]
+            if average is None:
+                average = latency
+            else:
+                average += self.latency_smoothing * (latency - average)
+            self.latency[kind] = average
+
+            if status_code in THROTTLE_STATUS_CODES or average > self.latency_threshold:
+                if now - self._cut[kind] >= self.cooldown:
+                    self._cut[kind] = now
+                    bucket.set_rate(max(self.min_rate, bucket.rate * self.decrease))
+            elif bucket.rate < self.max_rates[kind]:
+                gained = (now - self._adjusted[kind]) * self.recovery * self.max_rates[kind]
+                bucket.set_rate(min(self.max_rates[kind], bucket.rate + gained))
+            self._adjusted[kind] = now
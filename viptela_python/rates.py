@@ -0,0 +1,300 @@
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from . columnar import ColumnarTable
+
+# Separator of key columns in composite keys
+_KEY_SEPARATOR = u'\x1f'
+
+# Highest plausible rate of a counter, in units per second: 10 Gbit/s in octets
+MAX_RATE = 1.25e9
+
+# Key and counter columns of get_device_interface entries
+INTERFACE_COUNTERS = {
+    'keys': ('vdevice-name', 'vpn-id', 'ifname'),
+    'counters': ('tx-octets', 'rx-octets', 'tx-packets', 'rx-packets', 'tx-drops', 'rx-drops'),
+    'time': 'lastupdated',
+    'octets': ('tx-octets', 'rx-octets'),
+    'drops': ('tx-drops', 'rx-drops'),
+}
+
+# Key and counter columns of get_tunnel_statistics entries
+TUNNEL_COUNTERS = {
+    'keys': ('vdevice-name', 'dest-ip', 'local-color', 'remote-color', 'tunnel-protocol'),
+    'counters': ('tx_octets', 'rx_octets', 'tx_pkts', 'rx_pkts'),
+    'time': 'lastupdated',
+    'octets': ('tx_octets', 'rx_octets'),
+    'drops': (),
+}
+
+
+class RateSample(object):
+    """
+    Deltas and per-second rates of one poll, one array entry per key seen in
+    both this poll and the previous one
+    """
+    def __init__(self, keys, key_columns, interval, deltas, rates, resets, octets, drops):
+        """
+        Init method for RateSample class, built by CounterRates.update
+        :param keys: Array of composite key strings
+        :param key_columns: Names of the columns making up the keys
+        :param interval: Array of seconds since the previous sample of each key
+        :param deltas: Dict of counter name to array of deltas
+        :param rates: Dict of counter name to array of per-second rates
+        :param resets: Boolean array, True where a counter went back to zero
+        :param octets: Names of the byte counters, summed by talkers
+        :param drops: Names of the drop counters, summed by droppers
+        """
+        self.keys = keys
+        self.key_columns = key_columns
+        self.interval = interval
+        self.deltas = deltas
+        self.rates = rates
+        self.resets = resets
+        self.octets = octets
+        self.drops = drops
+
+    def __len__(self):
+        return len(self.keys)
+
+    def key(self, index):
+        """
+        Key of an entry as a dict of key columns
+        :param index: entry index
+        :return: dict
+        """
+        return dict(zip(self.key_columns, self.keys[index].split(_KEY_SEPARATOR)))
+
+    def top(self, values, n=10):
+        """
+        Entries with the largest values, without sorting the whole array
+        :param values: Array of values, e.g. rates['rx-octets'], or counter name
+        :param n: Number of entries
+        :return: list of (key dict, value) tuples, largest first
+        """
+        if not hasattr(values, 'shape'):
+            values = self.rates[values]
+        if not len(values) or n <= 0:
+            return []
+        values = numpy.where(numpy.isnan(values), -numpy.inf, values)
+        n = min(n, len(values))
+        # argpartition finds the n largest in linear time, only those are sorted
+        indexes = numpy.argpartition(values, len(values) - n)[len(values) - n:]
+        indexes = indexes[numpy.argsort(values[indexes])[::-1]]
+        return [(self.key(i), float(values[i])) for i in indexes.tolist() if values[i] > -numpy.inf]
+
+    def _total(self, counters):
+        counters = [self.rates[name] for name in counters if name in self.rates]
+        if not counters:
+            return numpy.zeros(len(self.keys))
+        return numpy.nansum(numpy.vstack(counters), axis=0)
+
+    def talkers(self, n=10):
+        """
+        Keys with the highest byte rate, sent and received together
+        :param n: Number of entries
+        :return: list of (key dict, bytes per second) tuples
+        """
+        return self.top(self._total(self.octets), n)
+
+    def droppers(self, n=10):
+        """
+        Keys with the highest drop rate
+        :param n: Number of entries
+        :return: list of (key dict, drops per second) tuples
+        """
+        return self.top(self._total(self.drops), n)
+
+
+class CounterRates(object):
+    """
+    Turns successive polls of cumulative counters, such as interface or
+    tunnel statistics of a whole fleet, into deltas and rates. The previous
+    sample of every key is kept as a sorted key array and a counter matrix,
+    so each poll, of the whole fleet or of one device, is matched against it
+    with searchsorted and diffed in one vectorised step, then merged into
+    it. A counter that goes backwards is taken to have wrapped only if it
+    was close to the top of its range and the wrap gives a plausible rate,
+    otherwise it was reset.
+    """
+    def __init__(self, keys=INTERFACE_COUNTERS['keys'], counters=INTERFACE_COUNTERS['counters'],
+                 time_column=INTERFACE_COUNTERS['time'], octets=INTERFACE_COUNTERS['octets'],
+                 drops=INTERFACE_COUNTERS['drops'], counter_bits=32, wrap_margin=0.1, max_rate=MAX_RATE,
+                 max_age=None):
+        """
+        Init method for CounterRates class
+        :param keys: Columns identifying a counter set, e.g. device and interface name
+        :param counters: Cumulative counter columns
+        :param time_column: Column with the sample time in milliseconds, None to use the poll time
+        :param octets: Byte counters, summed by talkers
+        :param drops: Drop counters, summed by droppers
+        :param counter_bits: Width of the counters, None if they never wrap
+        :param wrap_margin: Fraction of the counter range below the wrap point a counter must
+                            have been in to have wrapped
+        :param max_rate: Highest plausible rate of a counter in units per second, a wrap giving
+                         a higher rate is a reset. None for no limit
+        :param max_age: Seconds after which the sample of a key missing from the polls is forgotten,
+                        None to keep it until the key is polled again
+        """
+        if numpy is None:
+            raise ImportError('CounterRates requires numpy, install viptela_python[columnar]')
+        self.key_columns = tuple(keys)
+        self.counters = tuple(counters)
+        self.time_column = time_column
+        self.octets = tuple(octets)
+        self.drops = tuple(drops)
+        self.counter_bits = counter_bits
+        self.wrap_margin = wrap_margin
+        self.max_rate = max_rate
+        self.max_age = max_age
+        self._keys = numpy.array([], dtype=numpy.str_)
+        self._values = numpy.zeros((0, len(self.counters)))
+        self._times = numpy.zeros(0)
+        # Poll time each key was last seen at, for max_age
+        self._seen = numpy.zeros(0)
+
+    @classmethod
+    def for_interfaces(cls, **kwargs):
+        """
+        :param kwargs: Other CounterRates arguments, e.g. counter_bits
+        :return: CounterRates for get_device_interface entries
+        """
+        return cls(keys=INTERFACE_COUNTERS['keys'], counters=INTERFACE_COUNTERS['counters'],
+                   time_column=INTERFACE_COUNTERS['time'], octets=INTERFACE_COUNTERS['octets'],
+                   drops=INTERFACE_COUNTERS['drops'], **kwargs)
+
+    @classmethod
+    def for_tunnels(cls, **kwargs):
+        """
+        :param kwargs: Other CounterRates arguments, e.g. counter_bits
+        :return: CounterRates for get_tunnel_statistics entries
+        """
+        return cls(keys=TUNNEL_COUNTERS['keys'], counters=TUNNEL_COUNTERS['counters'],
+                   time_column=TUNNEL_COUNTERS['time'], octets=TUNNEL_COUNTERS['octets'],
+                   drops=TUNNEL_COUNTERS['drops'], **kwargs)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _table(self, rows):
+        if isinstance(rows, ColumnarTable):
+            return rows
+        if hasattr(rows, 'data') and hasattr(rows, 'ok'):
+            rows = rows.data if isinstance(rows.data, list) else []
+        columns = list(self.key_columns) + list(self.counters)
+        if self.time_column is not None:
+            columns.append(self.time_column)
+        return ColumnarTable.from_rows(rows, columns=columns, backend='numpy')
+
+    def _column(self, table, name, length):
+        if name not in table:
+            return numpy.full(length, numpy.nan)
+        # Missing values of int columns are masked, they become NaN
+        return numpy.ma.filled(numpy.ma.asarray(table[name], dtype=numpy.float64), numpy.nan)
+
+    def _merge(self, keys, values, times, timestamp, matched, positions, found):
+        """
+        Store the samples of a poll, replacing those of the keys seen before
+        and inserting the others, so keys missing from the poll keep theirs
+        :param keys: Sorted array of the poll's keys
+        :param values: Counter matrix of the poll
+        :param times: Array of sample times of the poll
+        :param timestamp: Poll time
+        :param matched: Boolean array, True for keys seen before
+        :param positions: Positions of the matched keys in the stored keys
+        :param found: Insert positions of the keys in the stored keys
+        :return: None
+        """
+        stored_values, stored_times, seen = self._values.copy(), self._times.copy(), self._seen.copy()
+        stored_values[positions[matched]] = values[matched]
+        stored_times[positions[matched]] = times[matched]
+        seen[positions[matched]] = timestamp
+
+        new = ~matched
+        if new.any():
+            # The new keys are sorted, inserting each at its searchsorted position keeps the array sorted
+            at = found[new]
+            stored_keys = numpy.insert(self._keys.astype(numpy.result_type(self._keys, keys)), at, keys[new])
+            stored_values = numpy.insert(stored_values, at, values[new], axis=0)
+            stored_times = numpy.insert(stored_times, at, times[new])
+            seen = numpy.insert(seen, at, timestamp)
+        else:
+            stored_keys = self._keys
+
+        if self.max_age is not None:
+            kept = seen >= timestamp - self.max_age
+            stored_keys, stored_values, stored_times, seen = \
+                stored_keys[kept], stored_values[kept], stored_times[kept], seen[kept]
+        self._keys, self._values, self._times, self._seen = stored_keys, stored_values, stored_times, seen
+
+    def update(self, rows, timestamp=None):
+        """
+        Add a poll and compute rates against the previous sample of each key
+        :param rows: Entries of the poll, as dict rows, a Result or a ColumnarTable
+        :param timestamp: Poll time in seconds, used where rows have no time column, defaults to now
+        :return: RateSample for the keys sampled before
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        table = self._table(rows)
+        length = len(table)
+
+        keys = None
+        for name in self.key_columns:
+            column = numpy.asarray(table[name]).astype(numpy.str_)
+            keys = column if keys is None else numpy.char.add(numpy.char.add(keys, _KEY_SEPARATOR), column)
+        if keys is None:
+            keys = numpy.zeros(length, dtype=numpy.str_)
+        values = numpy.column_stack([self._column(table, name, length) for name in self.counters]) \
+            if self.counters else numpy.zeros((length, 0))
+        times = numpy.full(length, float(timestamp))
+        if self.time_column is not None and self.time_column in table:
+            sampled = self._column(table, self.time_column, length) / 1000.0
+            times = numpy.where(numpy.isnan(sampled), times, sampled)
+
+        # Keep one sample per key, the last one, sorted for searchsorted
+        keys, first = numpy.unique(keys[::-1], return_index=True)
+        last = length - 1 - first
+        values = values[last]
+        times = times[last]
+
+        previous_keys, previous_values, previous_times = self._keys, self._values, self._times
+        found = numpy.searchsorted(previous_keys, keys)
+        positions = numpy.minimum(found, max(len(previous_keys) - 1, 0))
+        matched = (previous_keys[positions] == keys) if len(previous_keys) else numpy.zeros(len(keys), dtype=bool)
+        current = values[matched]
+        before = previous_values[positions[matched]]
+        interval = times[matched] - previous_times[positions[matched]]
+
+        deltas = current - before
+        backwards = deltas < 0
+        wrapped = numpy.zeros(backwards.shape, dtype=bool)
+        if self.counter_bits is not None:
+            modulus = 2.0 ** self.counter_bits
+            # Only a counter close to the top of its range can have wrapped
+            wrapped = backwards & (before >= modulus * (1 - self.wrap_margin)) & (before < modulus)
+            if self.max_rate is not None:
+                # and only if it did not count faster than max_rate
+                with numpy.errstate(invalid='ignore'):
+                    wrapped &= deltas + modulus <= self.max_rate * interval[:, None]
+            deltas = numpy.where(wrapped, deltas + modulus, deltas)
+        reset = backwards & ~wrapped
+        deltas = numpy.where(reset, current, deltas)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            rates = numpy.where(interval[:, None] > 0, deltas / interval[:, None], numpy.nan)
+
+        self._merge(keys, values, times, float(timestamp), matched, positions, found)
+        return RateSample(
+            keys[matched].astype(object),
+            self.key_columns,
+            interval,
+            dict((name, deltas[:, i]) for i, name in enumerate(self.counters)),
+            dict((name, rates[:, i]) for i, name in enumerate(self.counters)),
+            reset.any(axis=1) if self.counters else numpy.zeros(len(interval), dtype=bool),
+            self.octets,
+            self.drops,
+        )
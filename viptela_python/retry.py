@@ -0,0 +1,209 @@
+import random
+import threading
+import time
+
+from requests.exceptions import ConnectTimeout
+
+try:
+    from urllib3.exceptions import ConnectTimeoutError
+except ImportError:
+    from requests.packages.urllib3.exceptions import ConnectTimeoutError
+
+from . exceptions import CircuitOpenError
+
+_clock = getattr(time, 'monotonic', time.time)
+
+# Methods that can be sent twice without changing the outcome
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+# Status codes retried by default
+RETRY_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+
+
+def request_not_sent(error):
+    """
+    Check whether a request failed before anything reached the server, which
+    makes it safe to retry whatever its method
+    :param error: exception raised by the request
+    :return: True if the connection could not be established
+    """
+    if isinstance(error, ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    # urllib3 NewConnectionError is a ConnectTimeoutError
+    return isinstance(reason, ConnectTimeoutError)
+
+
+class RetryBudget(object):
+    """
+    Caps retries to a ratio of requests, so a struggling server does not get
+    several times its normal load in retries
+    """
+    def __init__(self, ratio=0.2, min_retries=10, max_retries=100):
+        """
+        Init method for RetryBudget class
+        :param ratio: Retries earned per request
+        :param min_retries: Retries available before any request was made
+        :param max_retries: Maximum retries that can be saved up
+        """
+        self.ratio = ratio
+        self.max_retries = max_retries
+        self._tokens = float(min_retries)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        """
+        Record a request
+        :return: None
+        """
+        with self._lock:
+            self._tokens = min(self._tokens + self.ratio, self.max_retries)
+
+    def withdraw(self):
+        """
+        Take a retry from the budget
+        :return: True if a retry was available
+        """
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class RetryPolicy(object):
+    """
+    Retry policy with exponential backoff and jitter. Requests with a
+    non-idempotent method are only retried if they never reached the server.
+    """
+    def __init__(self, total=3, backoff_factor=0.5, max_backoff=30, jitter=True,
+                 status_codes=RETRY_STATUS_CODES, methods=IDEMPOTENT_METHODS, budget=None):
+        """
+        Init method for RetryPolicy class
+        :param total: Maximum number of retries of one request
+        :param backoff_factor: Backoff of the first retry in seconds, doubled for each retry after it
+        :param max_backoff: Maximum backoff in seconds
+        :param jitter: Sleep a random time up to the backoff instead of the backoff itself
+        :param status_codes: Status codes that are retried
+        :param methods: Methods that are retried after an error or a retried status code
+        :param budget: RetryBudget shared by all requests, None for no budget
+        """
+        self.total = total
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.status_codes = frozenset(status_codes)
+        self.methods = frozenset(method.upper() for method in methods)
+        self.budget = budget
+
+    def backoff(self, attempt, response=None):
+        """
+        Time to sleep before a retry
+        :param attempt: Number of retries already made
+        :param response: response that is retried, whose Retry-After header is honoured
+        :return: seconds
+        """
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.max_backoff)
+        backoff = min(self.backoff_factor * (2 ** attempt), self.max_backoff)
+        if self.jitter:
+            return random.uniform(0, backoff)
+        return backoff
+
+    def delay(self, method, attempt, response=None, error=None, not_sent=None):
+        """
+        Decide whether to retry a request
+        :param method: HTTP method
+        :param attempt: Number of retries already made
+        :param response: response received, if any
+        :param error: exception raised, if any
+        :param not_sent: Whether the request failed before reaching the server, None to work it out from error
+        :return: seconds to sleep before the retry, or None to give up
+        """
+        if attempt == 0 and self.budget is not None:
+            self.budget.deposit()
+        if attempt >= self.total:
+            return None
+        if error is not None:
+            if not_sent is None:
+                not_sent = request_not_sent(error)
+            if method.upper() not in self.methods and not not_sent:
+                return None
+        elif response.status_code not in self.status_codes or method.upper() not in self.methods:
+            return None
+        if self.budget is not None and not self.budget.withdraw():
+            return None
+        return self.backoff(attempt, response)
+
+
+class CircuitBreaker(object):
+    """
+    Fails requests fast while vManage looks down. The circuit opens after
+    failure_threshold consecutive failures, and after recovery_timeout lets
+    one trial request through, which closes it again on success.
+    """
+    def __init__(self, failure_threshold=5, recovery_timeout=30):
+        """
+        Init method for CircuitBreaker class
+        :param failure_threshold: Consecutive failures that open the circuit
+        :param recovery_timeout: Seconds the circuit stays open before a trial request
+        """
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """
+        State of the circuit
+        :return: 'closed', 'open' or 'half-open'
+        """
+        if self.opened_at is None:
+            return 'closed'
+        if _clock() - self.opened_at >= self.recovery_timeout:
+            return 'half-open'
+        return 'open'
+
+    def before_request(self):
+        """
+        Check a request may be sent. Every request let through must end in
+        record(), or in release() if it ended without an outcome.
+        :return: True if the request is the trial request of a half-open circuit
+        """
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return False
+            if state == 'half-open' and not self._trial:
+                self._trial = True
+                return True
+        raise CircuitOpenError('Circuit open after {0} consecutive failures'.format(self.failures))
+
+    def release(self):
+        """
+        End the trial request without an outcome, e.g. when it was cancelled,
+        so another trial request can be made
+        :return: None
+        """
+        with self._lock:
+            self._trial = False
+
+    def record(self, success):
+        """
+        Record the outcome of a request
+        :param success: False for a connection error, timeout or 5xx response
+        :return: None
+        """
+        with self._lock:
+            self._trial = False
+            if success:
+                self.failures = 0
+                self.opened_at = None
+            else:
+                self.failures += 1
+                if self.failures >= self.failure_threshold:
+                    self.opened_at = _clock()
@@ -0,0 +1,307 @@
+import json
+import sqlite3
+import threading
+import time
+
+from collections import OrderedDict
+
+# Collections stored by SnapshotStore: table name to getter and the columns
+# pulled out of each entry as (column, entry key, SQL type). The whole entry
+# is also kept as JSON.
+SNAPSHOT_COLLECTIONS = OrderedDict([
+    ('bgp_neighbours', ('get_bgp_neighbours', [
+        ('peer_addr', 'peer-addr', 'TEXT'),
+        ('state', 'state', 'TEXT'),
+        ('peer_as', 'as', 'INTEGER'),
+        ('vpn_id', 'vpn-id', 'INTEGER'),
+    ])),
+    ('omp_peers', ('get_omp_peers', [
+        ('peer', 'peer', 'TEXT'),
+        ('state', 'state', 'TEXT'),
+        ('type', 'type', 'TEXT'),
+        ('site_id', 'site-id', 'INTEGER'),
+    ])),
+    ('omp_summary', ('get_omp_summary', [
+        ('operstate', 'operstate', 'TEXT'),
+        ('vsmart_peers', 'vsmart-peers', 'INTEGER'),
+        ('routes_received', 'routes-received', 'INTEGER'),
+        ('routes_installed', 'routes-installed', 'INTEGER'),
+        ('tlocs_received', 'tlocs-received', 'INTEGER'),
+    ])),
+    ('tunnel_statistics', ('get_tunnel_statistics', [
+        ('source_ip', 'source-ip', 'TEXT'),
+        ('dest_ip', 'dest-ip', 'TEXT'),
+        ('local_color', 'local-color', 'TEXT'),
+        ('remote_color', 'remote-color', 'TEXT'),
+        ('tunnel_protocol', 'tunnel-protocol', 'TEXT'),
+        ('tx_pkts', 'tx_pkts', 'INTEGER'),
+        ('rx_pkts', 'rx_pkts', 'INTEGER'),
+        ('tx_octets', 'tx_octets', 'INTEGER'),
+        ('rx_octets', 'rx_octets', 'INTEGER'),
+    ])),
+])
+
+# Columns indexed besides (device_id, snapshot_id) to speed up the query helpers
+SNAPSHOT_INDEXES = {
+    'bgp_neighbours': ['state'],
+    'omp_peers': ['state'],
+    'tunnel_statistics': ['dest_ip'],
+}
+
+
+def _column_value(entry, key, sql_type):
+    value = entry.get(key)
+    if value is None or sql_type != 'INTEGER':
+        return value
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class SnapshotStore(object):
+    """
+    SQLite store of fleet operational state. collect fetches BGP neighbours,
+    OMP peers, OMP summary and tunnel statistics of every device into one
+    timestamped snapshot, after which questions are answered locally from
+    indexed tables without calling vManage.
+    """
+    def __init__(self, path=':memory:', collections=None):
+        """
+        Init method for SnapshotStore class
+        :param path: SQLite database file, ':memory:' for a private in-memory database
+        :param collections: Dict like SNAPSHOT_COLLECTIONS, defaults to it
+        """
+        self.path = path
+        self.collections = collections or SNAPSHOT_COLLECTIONS
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._create_tables()
+
+    def close(self):
+        """
+        Close the database
+        :return: None
+        """
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _create_tables(self):
+        with self._lock, self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS snapshots ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, started REAL, finished REAL)'
+            )
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS collections ('
+                'snapshot_id INTEGER, collection TEXT, device_id TEXT, ok INTEGER, error TEXT, '
+                'collected REAL)'
+            )
+            self.connection.execute(
+                'CREATE INDEX IF NOT EXISTS collections_snapshot '
+                'ON collections (snapshot_id, collection, device_id)'
+            )
+            for table, (getter, columns) in self.collections.items():
+                self.connection.execute(
+                    'CREATE TABLE IF NOT EXISTS {0} (snapshot_id INTEGER, device_id TEXT, collected REAL, '
+                    '{1}, entry TEXT)'.format(
+                        table, ', '.join('{0} {1}'.format(column, sql_type) for column, key, sql_type in columns))
+                )
+                self.connection.execute(
+                    'CREATE INDEX IF NOT EXISTS {0}_device ON {0} (device_id, snapshot_id)'.format(table)
+                )
+                for column in SNAPSHOT_INDEXES.get(table, []):
+                    self.connection.execute(
+                        'CREATE INDEX IF NOT EXISTS {0}_{1} ON {0} (snapshot_id, {1})'.format(table, column)
+                    )
+
+    def _insert(self, snapshot_id, table, device_id, result, collected):
+        """
+        Store the result of one getter for one device
+        :return: None
+        """
+        getter, columns = self.collections[table]
+        self.connection.execute(
+            'INSERT INTO collections VALUES (?, ?, ?, ?, ?, ?)',
+            (snapshot_id, table, device_id, int(bool(result.ok)),
+             None if result.ok else str(result.error or result.reason), collected)
+        )
+        if not result.ok or not isinstance(result.data, list):
+            return
+        rows = []
+        for entry in result.data:
+            rows.append([snapshot_id, device_id, collected] +
+                        [_column_value(entry, key, sql_type) for column, key, sql_type in columns] +
+                        [json.dumps(entry)])
+        self.connection.executemany(
+            'INSERT INTO {0} VALUES ({1})'.format(table, ', '.join(['?'] * (len(columns) + 4))),
+            rows
+        )
+
+    def _insert_batch(self, snapshot_id, table, batch):
+        """
+        Store fetched results in one short transaction
+        :param snapshot_id: Snapshot ID
+        :param table: Collection name
+        :param batch: list of (device_id, Result, collected time) tuples
+        :return: None
+        """
+        if not batch:
+            return
+        with self._lock, self.connection:
+            for device_id, result, collected in batch:
+                self._insert(snapshot_id, table, device_id, result, collected)
+
+    def collect(self, viptela, device_ids=None, collections=None, max_workers=10, batch_size=100):
+        """
+        Take a snapshot, fetching every collection for every device
+        :param viptela: Viptela object
+        :param device_ids: Iterable of device system IPs, defaults to every reachable device
+        :param collections: Names of the collections to fetch, defaults to all of them
+        :param max_workers: Maximum number of concurrent requests
+        :param batch_size: Number of results written per transaction
+        :return: snapshot ID
+        """
+        if device_ids is None:
+            inventory = viptela.get_inventory()
+            device_ids = inventory.system_ips(
+                record for record in inventory if record.reachability in (None, 'reachable'))
+        device_ids = list(device_ids)
+
+        with self._lock, self.connection:
+            cursor = self.connection.execute('INSERT INTO snapshots (started) VALUES (?)', (time.time(),))
+            snapshot_id = cursor.lastrowid
+
+        for table in collections or self.collections:
+            getter, columns = self.collections[table]
+            # Results are fetched without holding the lock, so queries are only
+            # blocked while a batch is written
+            batch = []
+            for device_id, result in viptela.map_devices(getter, device_ids, max_workers=max_workers):
+                batch.append((device_id, result, time.time()))
+                if len(batch) >= batch_size:
+                    self._insert_batch(snapshot_id, table, batch)
+                    batch = []
+            self._insert_batch(snapshot_id, table, batch)
+
+        with self._lock, self.connection:
+            self.connection.execute('UPDATE snapshots SET finished = ? WHERE id = ?', (time.time(), snapshot_id))
+        return snapshot_id
+
+    def latest(self):
+        """
+        Latest finished snapshot
+        :return: snapshot ID, or None if there is none
+        """
+        return self.query('SELECT MAX(id) FROM snapshots WHERE finished IS NOT NULL')[0][0]
+
+    def snapshots(self):
+        """
+        Snapshots taken
+        :return: list of rows with id, started and finished
+        """
+        return self.query('SELECT * FROM snapshots ORDER BY id')
+
+    def query(self, sql, params=()):
+        """
+        Run a query against the store
+        :param sql: SQL statement
+        :param params: statement parameters
+        :return: list of sqlite3.Row, usable as tuples or by column name
+        """
+        with self._lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    def _snapshot(self, snapshot_id):
+        return self.latest() if snapshot_id is None else snapshot_id
+
+    def failed_devices(self, snapshot_id=None):
+        """
+        Devices a collection could not be fetched for
+        :param snapshot_id: Snapshot ID, defaults to the latest
+        :return: list of rows with collection, device_id and error
+        """
+        return self.query(
+            'SELECT collection, device_id, error FROM collections WHERE snapshot_id = ? AND ok = 0',
+            (self._snapshot(snapshot_id),)
+        )
+
+    def bgp_neighbours_down(self, snapshot_id=None):
+        """
+        BGP neighbours that are not established
+        :param snapshot_id: Snapshot ID, defaults to the latest
+        :return: list of rows with device_id, peer_addr, state, peer_as and vpn_id
+        """
+        return self.query(
+            'SELECT device_id, peer_addr, state, peer_as, vpn_id FROM bgp_neighbours '
+            'WHERE snapshot_id = ? AND state != ? ORDER BY device_id, peer_addr',
+            (self._snapshot(snapshot_id), 'established')
+        )
+
+    def omp_peers_below(self, minimum=2, snapshot_id=None):
+        """
+        Devices with fewer OMP peers up than a minimum, including devices with none
+        :param minimum: Minimum number of peers up
+        :param snapshot_id: Snapshot ID, defaults to the latest
+        :return: list of rows with device_id and peers_up
+        """
+        return self.query(
+            'SELECT c.device_id, COUNT(p.device_id) AS peers_up FROM collections c '
+            'LEFT JOIN omp_peers p ON p.snapshot_id = c.snapshot_id AND p.device_id = c.device_id '
+            'AND p.state = ? '
+            'WHERE c.snapshot_id = ? AND c.collection = ? AND c.ok = 1 '
+            'GROUP BY c.device_id HAVING COUNT(p.device_id) < ? ORDER BY c.device_id',
+            ('up', self._snapshot(snapshot_id), 'omp_peers', minimum)
+        )
+
+    def tunnels_down(self, snapshot_id=None):
+        """
+        Tunnels with no packets received since the previous snapshot
+        :param snapshot_id: Snapshot ID, defaults to the latest
+        :return: list of rows with device_id, dest_ip, local_color and remote_color
+        """
+        snapshot_id = self._snapshot(snapshot_id)
+        return self.query(
+            'SELECT t.device_id, t.dest_ip, t.local_color, t.remote_color FROM tunnel_statistics t '
+            'JOIN tunnel_statistics p ON p.device_id = t.device_id AND p.dest_ip = t.dest_ip '
+            'AND p.local_color IS t.local_color AND p.remote_color IS t.remote_color '
+            'AND p.snapshot_id = (SELECT MAX(id) FROM snapshots WHERE id < ? AND finished IS NOT NULL) '
+            'WHERE t.snapshot_id = ? AND t.rx_pkts <= p.rx_pkts ORDER BY t.device_id, t.dest_ip',
+            (snapshot_id, snapshot_id)
+        )
+
+    def history(self, table, device_id, since=None):
+        """
+        Rows of a collection for one device across snapshots
+        :param table: Collection name, e.g. 'omp_summary'
+        :param device_id: Device system IP
+        :param since: Only rows collected at or after this time
+        :return: list of rows ordered by snapshot
+        """
+        if table not in self.collections:
+            raise ValueError('Unknown collection: {0}'.format(table))
+        return self.query(
+            'SELECT * FROM {0} WHERE device_id = ? AND collected >= ? ORDER BY snapshot_id'.format(table),
+            (device_id, since or 0)
+        )
+
+    def prune(self, keep=10):
+        """
+        Delete all but the latest snapshots
+        :param keep: Number of snapshots kept
+        :return: number of snapshots deleted
+        """
+        with self._lock, self.connection:
+            ids = [row[0] for row in self.connection.execute(
+                'SELECT id FROM snapshots ORDER BY id DESC LIMIT -1 OFFSET ?', (keep,))]
+            for table in ['collections'] + list(self.collections):
+                self.connection.executemany(
+                    'DELETE FROM {0} WHERE snapshot_id = ?'.format(table), [(i,) for i in ids])
+            self.connection.executemany('DELETE FROM snapshots WHERE id = ?', [(i,) for i in ids])
+        return len(ids)
@@ -0,0 +1,93 @@
+import calendar
+import datetime
+
+# Time format of statistics query rules
+STATISTICS_TIME_FORMAT = '%Y-%m-%dT%H:%M:%S UTC'
+
+# Largest page vManage returns for a statistics query
+STATISTICS_PAGE_SIZE = 10000
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def statistics_time(value):
+    """
+    Format a time for a statistics query
+    :param value: Seconds since the epoch, UTC datetime, or already formatted string
+    :return: formatted time string
+    """
+    if isinstance(value, (int, float)):
+        value = _EPOCH + datetime.timedelta(seconds=value)
+    if isinstance(value, datetime.datetime):
+        return value.strftime(STATISTICS_TIME_FORMAT)
+    return value
+
+
+def epoch_seconds(value):
+    """
+    Seconds since the epoch of a time
+    :param value: Seconds since the epoch or UTC datetime
+    :return: seconds
+    """
+    if isinstance(value, datetime.datetime):
+        return calendar.timegm(value.utctimetuple()) + value.microsecond / 1e6
+    if isinstance(value, (int, float)):
+        return value
+    raise ValueError('Cannot split a time range given as {0!r}, use seconds or datetime'.format(value))
+
+
+def statistics_query(start, end, conditions=None, size=STATISTICS_PAGE_SIZE, field='entry_time'):
+    """
+    Build the body of a statistics query over a time range
+    :param start: Start of the range, seconds since the epoch, UTC datetime or formatted string
+    :param end: End of the range
+    :param conditions: Dict of field to value or list of values the entries must have, e.g. {'vdevice_name': ['1.1.1.1']}
+    :param size: Page size
+    :param field: Time field of the entries
+    :return: query dict
+    """
+    rules = [{
+        'value': [statistics_time(start), statistics_time(end)],
+        'field': field,
+        'type': 'date',
+        'operator': 'between',
+    }]
+    for name, value in sorted((conditions or dict()).items()):
+        rules.append({
+            'value': list(value) if isinstance(value, (list, tuple, set)) else [value],
+            'field': name,
+            'type': 'string',
+            'operator': 'in',
+        })
+    return {'query': {'condition': 'AND', 'rules': rules}, 'size': size}
+
+
+def split_range(start, end, parts):
+    """
+    Split a time range into sub-ranges. Query ranges include both ends and
+    have a resolution of one second, so each sub-range ends one second
+    before the next one starts and no entry is returned twice.
+    :param start: Start of the range, seconds since the epoch or UTC datetime
+    :param end: End of the range
+    :param parts: Number of sub-ranges
+    :return: list of (start, end) tuples in whole seconds since the epoch
+    """
+    start = int(epoch_seconds(start))
+    end = int(epoch_seconds(end))
+    parts = max(1, min(parts, end - start + 1))
+    bounds = [start + (end - start + 1) * i // parts for i in range(parts + 1)]
+    return [(bounds[i], bounds[i + 1] - 1) for i in range(parts)]
+
+
+def page_info(result):
+    """
+    Scroll state of a statistics query response
+    :param result: Result of a statistics query or page request
+    :return: tuple of scroll ID and whether more pages follow
+    """
+    document = result.document if isinstance(result.document, dict) else dict()
+    info = document.get('pageInfo') or dict()
+    more = info.get('hasMoreData')
+    if isinstance(more, str):
+        more = more.lower() == 'true'
+    return info.get('scrollId'), bool(more) and bool(info.get('scrollId'))
@@ -0,0 +1,259 @@
+import re
+
+from . codec import DEFAULT_CODEC
+
+# JSON string, and a run of anything but brackets where strings are skipped whole
+_STR = br'"[^"\\]*(?:\\.[^"\\]*)*"'
+_NOT_BRACKETS = br'[^"\[\]{}]*(?:' + _STR + br'[^"\[\]{}]*)*'
+
+_STRING = re.compile(_STR, re.DOTALL)
+
+_SKIP = re.compile(_NOT_BRACKETS, re.DOTALL)
+
+# Run of complete objects without nested containers, the usual shape of list
+# endpoint records, which can be decoded together in one codec call
+_FLAT_OBJECTS = re.compile(
+    br'\{' + _NOT_BRACKETS + br'\}(?:[\s,]*\{' + _NOT_BRACKETS + br'\})*', re.DOTALL
+)
+
+# Characters that end a scalar (number, true, false, null)
+_SCALAR_END = re.compile(br'[,\]}\s]')
+
+# Whitespace and separators skipped between members and items
+_SEPARATORS = re.compile(br'[\s,]*')
+
+# Default number of bytes read from the socket at a time
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class JSONArrayStreamer(object):
+    """
+    Incremental parser yielding the items of one JSON array, either the
+    top-level document or the array under a key of the top-level object.
+    Only the item currently being parsed is held in memory.
+    """
+    def __init__(self, key='data', codec=None):
+        """
+        Init method for JSONArrayStreamer class
+        :param key: key of the array in the top-level object, None for a top-level array
+        :param codec: JSON codec used to decode each item
+        """
+        self.key = key
+        self.codec = codec or DEFAULT_CODEC
+        self._buffer = bytearray()
+        self._state = 'open'
+        self._member = None
+        # Scan state of the value being read: start offset, resume offset and
+        # bracket depth, which is 0 for a string and -1 for a scalar
+        self._start = None
+        self._pos = 0
+        self._depth = 0
+
+    @property
+    def done(self):
+        """
+        The array has been read completely
+        :return: True once the closing bracket was seen
+        """
+        return self._state == 'done'
+
+    def feed(self, chunk):
+        """
+        Feed a chunk of the document
+        :param chunk: bytes read from the response
+        :return: list of items completed by this chunk
+        """
+        if self._state == 'done':
+            return []
+        self._buffer.extend(chunk)
+        items = []
+        while self._step(items):
+            pass
+        self._compact()
+        return items
+
+    def close(self):
+        """
+        Signal the end of the document
+        :return: list of items completed by the end of the document, always empty
+        """
+        # An array item, even a scalar, is always followed by a comma or the closing bracket
+        if self._state not in ('done', 'closed'):
+            raise ValueError('Truncated JSON document')
+        return []
+
+    def _skip_separators(self):
+        buffer = self._buffer
+        pos = _SEPARATORS.match(buffer, self._pos).end()
+        self._pos = pos
+        if pos >= len(buffer):
+            return None
+        return buffer[pos:pos + 1]
+
+    def _begin_value(self):
+        """
+        Start scanning the value at the current offset
+        """
+        first = self._buffer[self._pos:self._pos + 1]
+        self._start = self._pos
+        if first == b'"':
+            self._depth = 0
+        elif first in (b'{', b'['):
+            self._pos += 1
+            self._depth = 1
+        else:
+            self._depth = -1
+
+    def _scan_value(self):
+        """
+        Resume scanning the current value
+        :return: end offset of the value, or None if more data is needed
+        """
+        buffer = self._buffer
+        pos = self._pos
+        depth = self._depth
+
+        if depth == 0:
+            match = _STRING.match(buffer, pos)
+            return match.end() if match else None
+
+        if depth < 0:
+            match = _SCALAR_END.search(buffer, pos)
+            if match is None:
+                self._pos = len(buffer)
+                return None
+            return match.start()
+
+        size = len(buffer)
+        while True:
+            pos = _SKIP.match(buffer, pos).end()
+            if pos >= size:
+                break
+            char = buffer[pos:pos + 1]
+            if char == b'"':
+                # String not terminated yet, rescan it with the next chunk
+                break
+            pos += 1
+            if char in (b'{', b'['):
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return pos
+
+        self._pos = pos
+        self._depth = depth
+        return None
+
+    def _consume(self, end):
+        """
+        Take the scanned value out of the buffer
+        :param end: end offset of the value
+        :return: bytes of the value
+        """
+        value = bytes(self._buffer[self._start:end])
+        self._start = None
+        self._pos = end
+        return value
+
+    def _compact(self):
+        """
+        Drop the consumed part of the buffer
+        """
+        cut = self._pos if self._start is None else self._start
+        if cut:
+            del self._buffer[:cut]
+            self._pos -= cut
+            if self._start is not None:
+                self._start -= cut
+
+    def _step(self, items):
+        """
+        Advance the parser by one token
+        :param items: list completed items are appended to
+        :return: True if progress was made
+        """
+        state = self._state
+
+        if self._start is not None:
+            end = self._scan_value()
+            if end is None:
+                return False
+            value = self._consume(end)
+            if state == 'key':
+                self._member = self.codec.loads(value)
+                self._state = 'colon'
+            elif state == 'skip':
+                self._state = 'members'
+            else:
+                items.append(self.codec.loads(value))
+            return True
+
+        char = self._skip_separators()
+        if char is None:
+            return False
+
+        if state == 'open':
+            self._pos += 1
+            if char == b'{' and self.key is not None:
+                self._state = 'members'
+            elif char == b'[' and self.key is None:
+                self._state = 'items'
+            else:
+                raise ValueError('Unexpected JSON document start: {0!r}'.format(char))
+        elif state == 'members':
+            if char == b'}':
+                self._pos += 1
+                self._state = 'closed'
+                return False
+            if char != b'"':
+                raise ValueError('Expected object key, got: {0!r}'.format(char))
+            self._state = 'key'
+            self._begin_value()
+        elif state == 'colon':
+            if char != b':':
+                raise ValueError('Expected colon, got: {0!r}'.format(char))
+            self._pos += 1
+            self._state = 'value'
+        elif state == 'value':
+            if self._member == self.key and char == b'[':
+                self._pos += 1
+                self._state = 'items'
+            else:
+                self._state = 'skip'
+                self._begin_value()
+        elif state == 'items':
+            if char == b']':
+                self._pos += 1
+                self._state = 'done'
+                self._buffer = bytearray()
+                return False
+            if char == b'{':
+                match = _FLAT_OBJECTS.match(self._buffer, self._pos)
+                if match:
+                    run = self._buffer[self._pos:match.end()]
+                    items.extend(self.codec.loads(b'[' + bytes(run) + b']'))
+                    self._pos = match.end()
+                    return True
+            self._begin_value()
+        else:
+            return False
+        return True
+
+
+def iter_json_array(chunks, key='data', codec=None):
+    """
+    Iterate over the items of a JSON array read in chunks
+    :param chunks: iterable of bytes
+    :param key: key of the array in the top-level object, None for a top-level array
+    :param codec: JSON codec used to decode each item
+    :return: generator of decoded items
+    """
+    streamer = JSONArrayStreamer(key=key, codec=codec)
+    for chunk in chunks:
+        for item in streamer.feed(chunk):
+            yield item
+        if streamer.done:
+            return
+    for item in streamer.close():
+        yield item
@@ -0,0 +1,98 @@
+import socket
+import threading
+import requests
+
+from requests.adapters import HTTPAdapter
+
+try:
+    from urllib3.connection import HTTPConnection
+except ImportError:
+    from requests.packages.urllib3.connection import HTTPConnection
+
+# Headers sent with every request unless overridden per request
+SESSION_HEADERS = {
+    'Connection': 'keep-alive',
+    'Content-Type': 'application/json',
+}
+
+
+def keepalive_socket_options(idle=60, interval=10, count=6):
+    """
+    Socket options enabling TCP keep-alive probes where the platform supports them
+    :param idle: Seconds a connection is idle before the first probe
+    :param interval: Seconds between probes
+    :param count: Unanswered probes before the connection is dropped
+    :return: list of socket options
+    """
+    options = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+    if hasattr(socket, 'TCP_KEEPIDLE'):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, idle))
+    elif hasattr(socket, 'TCP_KEEPALIVE'):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPALIVE, idle))
+    if hasattr(socket, 'TCP_KEEPINTVL'):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, interval))
+    if hasattr(socket, 'TCP_KEEPCNT'):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPCNT, count))
+    return options
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter with extra socket options on every pooled connection
+    """
+    def __init__(self, socket_options=None, **kwargs):
+        """
+        Init method for PooledHTTPAdapter class
+        :param socket_options: Socket options added to the urllib3 defaults
+        :param kwargs: HTTPAdapter arguments (pool_connections, pool_maxsize, pool_block, max_retries)
+        """
+        # Set before HTTPAdapter.__init__, which creates the pool manager
+        self.socket_options = socket_options
+        super(PooledHTTPAdapter, self).__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        if self.socket_options:
+            kwargs['socket_options'] = HTTPConnection.default_socket_options + self.socket_options
+        super(PooledHTTPAdapter, self).init_poolmanager(*args, **kwargs)
+
+
+class SharedSession(object):
+    """
+    Session usable from many threads at once. Each thread gets its own
+    requests session so per-request state is never shared, while all of them
+    use the same connection pools and cookie jar.
+    """
+    def __init__(self, template):
+        """
+        Init method for SharedSession class
+        :param template: requests session whose adapters, cookies, headers and verify setting are shared
+        """
+        self.template = template
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        """
+        requests session of the calling thread
+        :return: requests session
+        """
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.session()
+            session.headers = self.template.headers.copy()
+            session.verify = self.template.verify
+            session.cookies = self.template.cookies
+            for prefix, adapter in self.template.adapters.items():
+                session.mount(prefix, adapter)
+            self._local.session = session
+        return session
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+    def close(self):
+        """
+        Close the shared connection pools
+        :return: None
+        """
+        self.template.close()
@@ -0,0 +1,184 @@
+import hashlib
+import io
+import os
+import time
+import uuid
+
+# Bytes read from disk at a time when hashing an image
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_md5(filename):
+    """
+    MD5 checksum of a file, read in chunks
+    :param filename: path of the file
+    :return: hex digest
+    """
+    md5 = hashlib.md5()
+    with open(filename, 'rb') as fileobj:
+        for chunk in iter(lambda: fileobj.read(HASH_CHUNK_SIZE), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def lazy_md5(filename):
+    """
+    Callable returning the MD5 checksum of a file, which is only read on the first call
+    :param filename: path of the file
+    :return: callable returning the hex digest
+    """
+    digest = []
+
+    def md5():
+        if not digest:
+            digest.append(file_md5(filename))
+        return digest[0]
+    return md5
+
+
+class MultipartFileStream(io.RawIOBase):
+    """
+    multipart/form-data body holding one file, read from disk as it is sent.
+    Its length is known up front so it is sent with a Content-Length, and it
+    can be rewound to send it again.
+    """
+    def __init__(self, filename, field='file', progress=None):
+        """
+        Init method for MultipartFileStream class
+        :param filename: path of the file to send
+        :param field: form field name of the file
+        :param progress: Callable called with (bytes sent, total bytes, bytes per second) after each read
+        """
+        super(MultipartFileStream, self).__init__()
+        self.filename = filename
+        self.progress = progress
+        boundary = uuid.uuid4().hex
+        self.content_type = 'multipart/form-data; boundary={0}'.format(boundary)
+        self._head = (
+            '--{0}\r\n'
+            'Content-Disposition: form-data; name="{1}"; filename="{2}"\r\n'
+            'Content-Type: application/octet-stream\r\n\r\n'
+        ).format(boundary, field, os.path.basename(filename)).encode('utf-8')
+        self._tail = '\r\n--{0}--\r\n'.format(boundary).encode('utf-8')
+        self._file_size = os.path.getsize(filename)
+        self.size = len(self._head) + self._file_size + len(self._tail)
+        self._file = None
+        self._position = 0
+        self._started = None
+
+    def __len__(self):
+        return self.size - self._position
+
+    @property
+    def throughput(self):
+        """
+        Average upload speed since the first read
+        :return: bytes per second
+        """
+        if self._started is None:
+            return 0.0
+        elapsed = time.time() - self._started
+        return self._position / elapsed if elapsed > 0 else 0.0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset != 0:
+            raise io.UnsupportedOperation('MultipartFileStream can only be rewound')
+        self.rewind()
+        return 0
+
+    def rewind(self):
+        """
+        Start the body again from the beginning
+        :return: None
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._position = 0
+        self._started = None
+
+    def read(self, size=-1):
+        if self._started is None:
+            self._started = time.time()
+        if size is None or size < 0:
+            size = self.size - self._position
+
+        chunks = []
+        head_end = len(self._head)
+        file_end = head_end + self._file_size
+        while size > 0 and self._position < self.size:
+            if self._position < head_end:
+                chunk = self._head[self._position:self._position + size]
+            elif self._position < file_end:
+                if self._file is None:
+                    self._file = open(self.filename, 'rb')
+                    self._file.seek(self._position - head_end)
+                chunk = self._file.read(min(size, file_end - self._position))
+                if not chunk:
+                    raise IOError('{0} shrank while being uploaded'.format(self.filename))
+            else:
+                offset = self._position - file_end
+                chunk = self._tail[offset:offset + size]
+            chunks.append(chunk)
+            self._position += len(chunk)
+            size -= len(chunk)
+
+        if self.progress is not None and chunks:
+            self.progress(self._position, self.size, self.throughput)
+        return b''.join(chunks)
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        super(MultipartFileStream, self).close()
+
+
+def find_software_image(images, filename, version=None, md5=None):
+    """
+    Find an image in the vManage software repository. An image listed with a
+    checksum matches if the checksum is the local image's MD5. Otherwise both
+    its file name and its version must match, as images for other platforms
+    share the version.
+    :param images: list of software image dicts from /device/action/software
+    :param filename: file name of the image
+    :param version: software version of the image, if known
+    :param md5: Callable returning the MD5 of the local image, used when vManage lists checksums
+    :return: matching image dict or None
+    """
+    basename = os.path.basename(filename)
+    local_md5 = []
+    for image in images or []:
+        checksum = image.get('md5') or image.get('checksum')
+        if checksum and md5 is not None:
+            if not local_md5:
+                # Hashing a large image is slow, so it is done once at most
+                local_md5.append(md5().lower())
+            if checksum.lower() == local_md5[0]:
+                return image
+            continue
+
+        files = image.get('availableFiles') or image.get('fileName') or ''
+        if isinstance(files, str):
+            files = [name.strip() for name in files.split(',')]
+        if basename in files and (version is None or image.get('versionName') == version):
+            return image
+    return None
@@ -1,10 +1,28 @@
-import json
 import requests
-import ast
+import threading
+import time
+
+try:
+    from queue import Full, Queue
+except ImportError:
+    from Queue import Full, Queue
 
 from collections import namedtuple
-from requests.exceptions import ConnectionError
-from . exceptions import LoginCredentialsError, LoginTimeoutError
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from requests.exceptions import ConnectionError, Timeout
+from requests.utils import quote
+from . attach import TemplateAttach, attach_device_id, check_template_input, template_input
+from . cache import ResponseCache, stored_response
+from . codec import DEFAULT_CODEC, get_codec
+from . exceptions import LoginCredentialsError, LoginTimeoutError, ResponseError
+from . inventory import DeviceInventory
+from . jobs import JobWaiter
+from . ratelimit import AdaptiveRateLimiter
+from . retry import CircuitBreaker, RetryPolicy
+from . statistics import STATISTICS_PAGE_SIZE, page_info, split_range, statistics_query
+from . stream import STREAM_CHUNK_SIZE, iter_json_array
+from . transport import SESSION_HEADERS, PooledHTTPAdapter, SharedSession, keepalive_socket_options
+from . upload import MultipartFileStream, find_software_image, lazy_md5
 
 HTTP_SUCCESS_CODES = {
     200: 'Success',
@@ -12,11 +30,16 @@ HTTP_SUCCESS_CODES = {
 
 HTTP_ERROR_CODES = {
     400: 'Bad Request',
+    401: 'Unauthorized',
     403: 'Forbidden',
     404: 'API Not found',
     406: 'Not Acceptable Response',
     415: 'Unsupported Media Type',
-    500: 'Internal Server Error'
+    429: 'Too Many Requests',
+    500: 'Internal Server Error',
+    502: 'Bad Gateway',
+    503: 'Service Unavailable',
+    504: 'Gateway Timeout'
 }
 
 HTTP_RESPONSE_CODES = dict()
@@ -25,73 +48,235 @@ HTTP_RESPONSE_CODES.update(HTTP_ERROR_CODES)
 
 
 # parse_response will return a namedtuple object
-Result = namedtuple('Result', [
+_ResultFields = namedtuple('Result', [
     'ok', 'status_code', 'error', 'reason', 'data', 'response', 'text'
 ])
 
+# Keys probed, in order, for the payload of a GET response
+GET_PAYLOAD_KEYS = ('data', 'config', 'templateDefinition')
+
+# Error raised by one sub-range of iter_statistics_ranges, passed to the consumer
+_RangeError = namedtuple('RangeError', ['error'])
+
+
+class ResponseBody(object):
+    """
+    Decodes a response body at most once, on first use
+    """
+    def __init__(self, response, codec=None):
+        """
+        Init method for ResponseBody class
+        :param response: requests response object
+        :param codec: JSON codec used to decode the body
+        """
+        self.response = response
+        self.codec = codec or DEFAULT_CODEC
+        self._text = None
+        self._document = None
+        self._decoded = False
+        self._payload = None
+
+    @property
+    def text(self):
+        """
+        Response body as text
+        :return: string
+        """
+        if self._text is None:
+            self._text = self.response.text
+        return self._text
+
+    @property
+    def document(self):
+        """
+        Response body decoded from JSON
+        :return: decoded JSON document
+        """
+        if not self._decoded:
+            self._document = self.codec.loads(self.response.content)
+            self._decoded = True
+        return self._document
+
+    def _select_payload(self):
+        """
+        Pick the payload out of the decoded document
+        :return: tuple of payload and error message
+        """
+        if self.response.request.method in ['GET']:
+            document = self.document
+            if isinstance(document, dict):
+                for key in GET_PAYLOAD_KEYS:
+                    if document.get(key):
+                        return document[key], ''
+            return document, 'No data received from device'
+        elif self.text in ['']:
+            return self.text, ''
+        else:
+            try:
+                document = self.document
+            except ValueError:
+                return self.text, ''
+            if isinstance(document, dict):
+                if document.get('id'):
+                    return document['id'], ''
+                elif document.get('data'):
+                    return document['data'], ''
+            return self.text, ''
+
+    @property
+    def payload(self):
+        """
+        Payload and error message of the response
+        :return: tuple of payload and error message
+        """
+        if self._payload is None:
+            self._payload = self._select_payload()
+        return self._payload
+
+    @property
+    def data(self):
+        return self.payload[0]
+
+    @property
+    def error(self):
+        return self.payload[1]
+
+
+class _Deferred(object):
+    """
+    Placeholder for a Result field computed from a ResponseBody on access
+    """
+    __slots__ = ('body', 'attr')
+
+    def __init__(self, body, attr):
+        self.body = body
+        self.attr = attr
+
+    def resolve(self):
+        return getattr(self.body, self.attr)
+
+    def __repr__(self):
+        return '<deferred {0}>'.format(self.attr)
+
+
+def _resolve(value):
+    if isinstance(value, _Deferred):
+        return value.resolve()
+    return value
+
+
+def _result_field(index, doc):
+    return property(lambda self: _resolve(tuple.__getitem__(self, index)), doc=doc)
+
 
-def parse_http_success(response):
+class Result(_ResultFields):
+    """
+    Result of an API call. The data, error and text fields may be deferred to
+    a ResponseBody, in which case the body is only decoded when one of them is
+    read.
+    """
+    __slots__ = ()
+
+    ok = _result_field(0, 'Response is a success')
+    status_code = _result_field(1, 'HTTP status code')
+    error = _result_field(2, 'Error message')
+    reason = _result_field(3, 'Reason for the status code')
+    data = _result_field(4, 'Response payload')
+    response = _result_field(5, 'requests response object')
+    text = _result_field(6, 'Response body as text')
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self)[index]
+        return _resolve(tuple.__getitem__(self, index))
+
+    def __iter__(self):
+        for value in tuple.__iter__(self):
+            yield _resolve(value)
+
+    def __repr__(self):
+        return 'Result({0})'.format(', '.join(
+            '{0}={1!r}'.format(name, tuple.__getitem__(self, i))
+            for i, name in enumerate(self._fields)
+        ))
+
+    @property
+    def body(self):
+        """
+        ResponseBody backing the deferred fields
+        :return: ResponseBody object or None
+        """
+        for value in tuple.__iter__(self):
+            if isinstance(value, _Deferred):
+                return value.body
+        return None
+
+    @property
+    def document(self):
+        """
+        Whole decoded JSON document of the response
+        :return: decoded JSON document or None
+        """
+        body = self.body
+        if body is None:
+            return None
+        return body.document
+
+
+def parse_http_success(response, codec=None):
     """
     HTTP 2XX responses
     :param response: requests response object
+    :param codec: JSON codec used to decode the body
     :return: namedtuple result object
     """
-    text = response.text
-    if response.request.method in ['GET']:
-        reason = HTTP_RESPONSE_CODES[response.status_code]
-        error = ''
-        # json_response = response.text
-        if response.json().get('data'):
-            json_response = response.json()['data']
-        elif response.json().get('config'):
-            json_response = response.json()['config']
-        elif response.json().get('templateDefinition'):
-            json_response = response.json()['templateDefinition']
-        else:
-            #json_response = dict()
-            json_response = json.loads(response.text)
-            reason = HTTP_RESPONSE_CODES[response.status_code]
-            error = 'No data received from device'
-    elif response.text in ['']:
-        json_response = response.text  #dict()
-        reason = HTTP_RESPONSE_CODES[response.status_code]
-        error = ''
-    else: #response.request.method in ['POST']:
-        reason = HTTP_RESPONSE_CODES[response.status_code]
-        error = ''
-        if response.json().get('id'):
-            json_response = response.json()['id']
-        elif response.json().get('data'):
-            json_response = response.json()['data']
-        else:
-            json_response = response.text
-
+    body = ResponseBody(response, codec)
     result = Result(
         ok=response.ok,
         status_code=response.status_code,
-        reason=reason,
-        error=error,
-        data=json_response,
+        reason=HTTP_RESPONSE_CODES.get(response.status_code, response.reason),
+        error=_Deferred(body, 'error'),
+        data=_Deferred(body, 'data'),
         response=response,
-        text=text
+        text=_Deferred(body, 'text')
+    )
+    return result
+
+
+def failed_result(error):
+    """
+    Result for a request that raised instead of returning a response
+    :param error: exception raised by the request
+    :return: namedtuple result object
+    """
+    result = Result(
+        ok=False,
+        status_code=None,
+        reason='Request failed',
+        error=error,
+        data=dict(),
+        response=None,
+        text=''
     )
     return result
 
 
-def parse_http_error(response):
+def parse_http_error(response, codec=None):
     """
     HTTP 4XX and 5XX responses
     :param response: requests response object
+    :param codec: JSON codec used to decode the body
     :return: namedtuple result object
     """
     text = response.text
     try:
         json_response = dict()
-        reason = response.json()['error']['details']
-        error = response.json()['error']['message']
-    except ValueError as e:
+        document = (codec or DEFAULT_CODEC).loads(response.content)
+        reason = document['error']['details']
+        error = document['error']['message']
+    except (ValueError, KeyError, TypeError) as e:
         json_response = dict()
-        reason = HTTP_RESPONSE_CODES[response.status_code]
+        reason = HTTP_RESPONSE_CODES.get(response.status_code, response.reason)
         error = e
 
     result = Result(
@@ -106,121 +291,351 @@ def parse_http_error(response):
     return result
 
 
-def parse_response(response):
+def session_expired(response, check_body=True):
+    """
+    Check whether vManage answered with its login page, which it does for
+    any API call made with an expired session
+    :param response: requests response object
+    :param check_body: Also look at the start of the body, which reads it
+    :return: True if the session has expired
+    """
+    if response.status_code == 401:
+        return True
+    if response.status_code not in HTTP_SUCCESS_CODES:
+        return False
+    if response.headers.get('Content-Type', '').startswith('text/html'):
+        return True
+    return check_body and response.content[:64].lstrip().lower().startswith(b'<html')
+
+
+def parse_response(response, codec=None):
     """
     Parse a request response object
     :param response: requests response object
+    :param codec: JSON codec used to decode the body
     :return: namedtuple result object
     """
-    if response.status_code in HTTP_SUCCESS_CODES:
-        return parse_http_success(response)
+    if response.status_code in HTTP_SUCCESS_CODES or 200 <= response.status_code < 300:
+        return parse_http_success(response, codec)
 
-    elif response.status_code in HTTP_ERROR_CODES:
-        return parse_http_error(response)
+    else:
+        return parse_http_error(response, codec)
 
 
 class Viptela(object):
     """
     Class for use with Viptela vManage API.
     """
-    @staticmethod
-    def _get(session, url, headers=None, timeout=10):
+    def _get(self, session, url, headers=None, timeout=10):
         """
         Perform a HTTP get
         :param session: requests session
         :param url: url to get
-        :param headers: HTTP headers
+        :param headers: HTTP headers, added to the session headers
         :param timeout: Timeout for request response
         :return:
         """
-        if headers is None:
-            headers = {'Connection': 'keep-alive', 'Content-Type': 'application/json'}
+        result = self._cached(url)
+        if result is None:
+            result = parse_response(self._send(session, 'GET', url, headers=headers, timeout=timeout), self.codec)
+            self._remember(url, result)
+        return (result, url, '')
 
-        return (parse_response(session.get(url=url, headers=headers, timeout=timeout)), url, '')
-
-    @staticmethod
-    def _put(session, url, headers=None, data=None, timeout=10):
+    def _get_stream(self, session, url, key='data', headers=None, timeout=10):
+        """
+        Perform a streaming HTTP get, decoding one array item at a time
+        :param session: requests session
+        :param url: url to get
+        :param key: key of the array in the response document
+        :param headers: HTTP headers, added to the session headers
+        :param timeout: Timeout for request response
+        :return: generator of the array items
+        """
+        response = self._send(session, 'GET', url, headers=headers, timeout=timeout, stream=True)
+        try:
+            if response.status_code not in HTTP_SUCCESS_CODES:
+                raise ResponseError(
+                    'Request to {0} failed with status {1}'.format(url, response.status_code),
+                    parse_response(response, self.codec)
+                )
+            chunks = response.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+            for item in iter_json_array(chunks, key=key, codec=self.codec):
+                yield item
+        finally:
+            response.close()
+
+    def _put(self, session, url, headers=None, data=None, timeout=10):
         """
         Perform a HTTP put
         :param session: requests session
         :param url: url to get
-        :param headers: HTTP headers
+        :param headers: HTTP headers, added to the session headers
         :param data: Data payload
         :param timeout: Timeout for request response
         :return:
         """
-        if headers is None:
-            # add default headers for put
-            headers = {'Connection': 'keep-alive', 'Content-Type': 'application/json'}
-
         if data is None:
             data = dict()
 
-        return (parse_response(session.put(url=url, headers=headers, data=data, timeout=timeout)), url, data)
+        result = parse_response(self._send(session, 'PUT', url, headers=headers, data=data, timeout=timeout), self.codec)
+        self._invalidate_after(url, result)
+        return (result, url, data)
 
-    @staticmethod
-    def _post(session, url, headers=None, data=None, timeout=10):
+    def _post(self, session, url, headers=None, data=None, timeout=10):
         """
         Perform a HTTP post
         :param session: requests session
         :param url: url to post
-        :param headers: HTTP headers
+        :param headers: HTTP headers, added to the session headers
         :param data: Data payload
         :param timeout: Timeout for request response
         :return:
         """
-        if headers is None:
-            # add default headers for post
-            headers = {'Connection': 'keep-alive', 'Content-Type': 'application/json'}
-
         if data is None:
             data = dict()
 
-        return (parse_response(session.post(url=url, headers=headers, data=data, timeout=timeout)), url, data)
+        result = parse_response(self._send(session, 'POST', url, headers=headers, data=data, timeout=timeout), self.codec)
+        self._invalidate_after(url, result)
+        return (result, url, data)
 
-    @staticmethod
-    def _upload(session, url, files, headers=None, data=None, timeout=15):
+    def _upload(self, session, url, files, headers=None, data=None, timeout=15):
         """
         Perform a HTTP post file upload
         :param session: requests session
         :param url: url to post
-        :param headers: HTTP headers
+        :param headers: HTTP headers, added to the session headers
         :param data: Data payload
         :param timeout: Timeout for request response
         :return:
         """
         if headers is None:
-            # add default headers for post
-            headers = {'Accept-Encoding': 'gzip'}
+            # add default headers for post, letting requests set the multipart content type
+            headers = {'Accept-Encoding': 'gzip', 'Content-Type': None}
 
         if data is None:
             data = dict()
 
-        return (parse_response(session.post(url=url, headers=headers, files=files, timeout=timeout)), url, '')
+        def rewind():
+            for fileobj in files.values():
+                fileobj.seek(0)
 
-    @staticmethod
-    def _delete(session, url, headers=None, data=None, timeout=10):
+        response = self._send(session, 'POST', url, rewind=rewind, headers=headers, files=files, timeout=timeout)
+        return (parse_response(response, self.codec), url, '')
+
+    def _upload_stream(self, session, url, body, headers=None, timeout=(10, 3600)):
+        """
+        Perform a HTTP post of a streamed multipart body
+        :param session: requests session
+        :param url: url to post
+        :param body: MultipartFileStream object
+        :param headers: HTTP headers, added to the session headers
+        :param timeout: Timeout for request response
+        :return:
+        """
+        if headers is None:
+            headers = {'Accept-Encoding': 'gzip'}
+        headers = dict(headers, **{'Content-Type': body.content_type})
+
+        response = self._send(session, 'POST', url, rewind=body.rewind, headers=headers, data=body, timeout=timeout)
+        return (parse_response(response, self.codec), url, '')
+
+    def _delete(self, session, url, headers=None, data=None, timeout=10):
         """
         Perform a HTTP delete
         :param session: requests session
         :param url: url to delete
-        :param headers: HTTP headers
+        :param headers: HTTP headers, added to the session headers
         :param data: Data payload
         :param timeout: Timeout for request response
         :return:
         """
-        if headers is None:
-            # add default headers for delete
-            headers = {'Connection': 'keep-alive', 'Content-Type': 'application/json'}
-
         if data is None:
             data = dict()
 
         #pass
-        return (parse_response(session.delete(url=url, headers=headers, timeout=timeout)), url, '')
+        result = parse_response(self._send(session, 'DELETE', url, headers=headers, timeout=timeout), self.codec)
+        self._invalidate_after(url, result)
+        return (result, url, '')
+
+    def _send(self, session, method, url, rewind=None, **kwargs):
+        """
+        Send a request at the pace the rate limiter allows, retrying it as the
+        retry policy allows while the circuit breaker is closed
+        :param session: requests session
+        :param method: HTTP method
+        :param url: url of the request
+        :param rewind: Callable resetting the request body before a retry
+        :param kwargs: requests arguments
+        :return: requests response object
+        """
+        attempt = 0
+        while True:
+            breaker = self._circuit_breaker(url)
+            trial = breaker is not None and breaker.before_request()
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(method, url[len(self.base_url):])
+            started = time.time()
+            try:
+                response = self._send_authenticated(session, method, url, rewind, **kwargs)
+            except (ConnectionError, Timeout) as e:
+                self._record_outcome(breaker, method, url, None, time.time() - started)
+                delay = self._retry_delay(method, attempt, error=e)
+                if delay is None:
+                    raise
+            except Exception:
+                # Other errors, e.g. a broken chunked body or a failed re-login,
+                # also end the request and must reach the circuit breaker
+                self._record_outcome(breaker, method, url, None, time.time() - started)
+                raise
+            except BaseException:
+                if trial:
+                    breaker.release()
+                raise
+            else:
+                # Time to the response headers, without reading the body
+                self._record_outcome(breaker, method, url, response.status_code, response.elapsed.total_seconds())
+                delay = self._retry_delay(method, attempt, response=response)
+                if delay is None:
+                    return response
+                response.close()
+
+            time.sleep(delay)
+            attempt += 1
+            if rewind is not None:
+                rewind()
+
+    def _circuit_breaker(self, url):
+        """
+        Circuit breaker guarding a request. Logins are not guarded, so the
+        trial request of a half-open circuit can login again.
+        :param url: url of the request
+        :return: CircuitBreaker object or None
+        """
+        if url.endswith('/j_security_check'):
+            return None
+        return self.circuit_breaker
+
+    def _record_outcome(self, breaker, method, url, status_code, latency):
+        """
+        Record the outcome of a request in the circuit breaker and rate limiter
+        :param breaker: CircuitBreaker guarding the request, or None
+        :param method: HTTP method
+        :param url: url of the request
+        :param status_code: HTTP status code, None if the request failed
+        :param latency: Seconds until the response headers arrived, or until the request failed
+        :return: None
+        """
+        if breaker is not None:
+            breaker.record(status_code is not None and status_code < 500)
+        if self.rate_limiter is not None:
+            self.rate_limiter.record(method, status_code, latency, url[len(self.base_url):])
+
+    def _retry_delay(self, method, attempt, response=None, error=None, not_sent=None):
+        """
+        Time to sleep before retrying a request
+        :param method: HTTP method
+        :param attempt: Number of retries already made
+        :param response: response received, if any
+        :param error: exception raised, if any
+        :param not_sent: Whether the request failed before reaching the server, None to work it out from error
+        :return: seconds, or None to give up
+        """
+        if self.retry is None:
+            return None
+        return self.retry.delay(method, attempt, response=response, error=error, not_sent=not_sent)
+
+    def _send_authenticated(self, session, method, url, rewind=None, **kwargs):
+        """
+        Send a request. If the session has expired, login again once for all
+        concurrent callers and replay the request.
+        :param session: requests session
+        :param method: HTTP method
+        :param url: url of the request
+        :param rewind: Callable resetting the request body before a replay
+        :param kwargs: requests arguments
+        :return: requests response object
+        """
+        generation = self._login_generation
+        response = session.request(method, url, **kwargs)
+        if not self.auto_reauth or url.endswith('/j_security_check'):
+            return response
+        if not session_expired(response, check_body=not kwargs.get('stream')):
+            return response
+
+        response.close()
+        self._relogin(generation)
+        if rewind is not None:
+            rewind()
+        return session.request(method, url, **kwargs)
+
+    def _relogin(self, generation):
+        """
+        Login again unless another caller already did since generation
+        :param generation: login generation the expired request was sent with
+        :return: None
+        """
+        with self._login_lock:
+            if self._login_generation == generation:
+                self.login_result = self.login()
+
+    def _cached(self, url):
+        """
+        Get a GET result from the response cache, then from its disk tier
+        :param url: url of the request
+        :return: cached Result or None
+        """
+        if self.cache is None:
+            return None
+        path = url[len(self.base_url):]
+        response = self.cache.get(path)
+        if response is None and self.cache.disk is not None:
+            stored = self.cache.disk.get(self._disk_cache_key(url))
+            if stored is not None:
+                response = stored_response(stored, url)
+                # Kept in memory only for what is left of the disk entry's TTL
+                self.cache.set(path, response, len(stored.content), ttl=stored.expires - time.time())
+        if response is None:
+            return None
+        # Each hit decodes the cached body into its own Result, so callers
+        # changing the data they got cannot change what later callers get
+        return parse_response(response, self.codec)
+
+    def _remember(self, url, result):
+        """
+        Store a successful GET result in the response cache and its disk tier
+        :param url: url of the request
+        :param result: Result of the request
+        :return: None
+        """
+        if self.cache is not None and result is not None and result.status_code in HTTP_SUCCESS_CODES:
+            path = url[len(self.base_url):]
+            self.cache.set(path, result.response, len(result.response.content))
+            if self.cache.disk is not None:
+                self.cache.disk.set(self._disk_cache_key(url), path, result.response)
+
+    def _disk_cache_key(self, url):
+        """
+        Disk cache key of a url, which other users and servers must not share
+        :param url: url of the request
+        :return: key string
+        """
+        return '{0}@{1}'.format(self.user, url)
+
+    def _invalidate_after(self, url, result):
+        """
+        Drop cached results a successful mutating request may have changed
+        :param url: url of the request
+        :param result: Result of the request
+        :return: None
+        """
+        if self.cache is not None and result is not None and result.status_code in HTTP_SUCCESS_CODES:
+            self.cache.invalidate_after(url[len(self.base_url):])
 
     def __init__(self, user, user_pass, vmanage_server, vmanage_server_port=8443,
-                 verify=False, disable_warnings=False, timeout=10, auto_login=True):
+                 verify=False, disable_warnings=False, timeout=10, auto_login=True, codec='auto',
+                 pool_connections=10, pool_maxsize=10, pool_block=False, tcp_keepalive=True,
+                 thread_safe=False, cache=None, auto_reauth=True, retry=None, circuit_breaker=None,
+                 rate_limiter=None):
         """
         Init method for Viptela class
         :param user: API user name
@@ -231,6 +646,17 @@ class Viptela(object):
         :param disable_warnings: Disable console warnings if ssl cert invalid
         :param timeout: Timeout for request response
         :param auto_login: Automatically login to vManage server
+        :param codec: JSON codec name ('auto', 'orjson', 'rapidjson', 'ujson', 'json') or codec object
+        :param pool_connections: Number of connection pools (one per host) to cache
+        :param pool_maxsize: Maximum number of connections kept alive per host
+        :param pool_block: Wait for a free connection instead of opening one that is discarded after use
+        :param tcp_keepalive: Enable TCP keep-alive probes on pooled connections
+        :param thread_safe: Give each thread its own session over the shared connection pool and cookies
+        :param cache: ResponseCache for slow-changing inventory and template endpoints, True for the defaults
+        :param auto_reauth: Login again and replay requests when the session expires
+        :param retry: RetryPolicy for failed requests, True for the defaults
+        :param circuit_breaker: CircuitBreaker failing requests fast while vManage is down, True for the defaults
+        :param rate_limiter: AdaptiveRateLimiter pacing requests, True for the defaults
         """
         self.user = user
         self.user_pass = user_pass
@@ -239,25 +665,122 @@ class Viptela(object):
         self.verify = verify
         self.timeout = timeout
         self.disable_warnings = disable_warnings
+        self.codec = get_codec(codec)
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.tcp_keepalive = tcp_keepalive
+        self.thread_safe = thread_safe
+        if cache is True:
+            cache = ResponseCache()
+        elif cache is False:
+            cache = None
+        self.cache = cache
+        if retry is True:
+            retry = RetryPolicy()
+        self.retry = retry or None
+        if circuit_breaker is True:
+            circuit_breaker = CircuitBreaker()
+        self.circuit_breaker = circuit_breaker or None
+        if rate_limiter is True:
+            rate_limiter = AdaptiveRateLimiter()
+        self.rate_limiter = rate_limiter or None
 
         if self.disable_warnings:
             requests.packages.urllib3.disable_warnings()
 
         self.auto_login = auto_login
+        self.auto_reauth = auto_reauth
+        self.login_result = None
+        self._login_lock = threading.Lock()
+        self._login_generation = 0
 
         self.base_url = 'https://{0}:{1}/dataservice'.format(
             self.vmanage_server,
             self.vmanage_server_port
         )
 
-        self.session = requests.session()
-        if not self.verify:
-            self.session.verify = self.verify
+        self.session = self._create_session()
 
         # login
         if self.auto_login:
             self.login_result = self.login()
 
+    def _create_session(self):
+        """
+        Create the HTTP session shared by all requests
+        :return: requests session
+        """
+        adapter = PooledHTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block,
+            socket_options=keepalive_socket_options() if self.tcp_keepalive else None
+        )
+        session = requests.session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update(SESSION_HEADERS)
+        if not self.verify:
+            session.verify = self.verify
+
+        if self.thread_safe:
+            return SharedSession(session)
+        return session
+
+    def invalidate_cache(self, pattern=None):
+        """
+        Drop cached responses
+        :param pattern: regex matched against the cached paths after /dataservice, None drops everything
+        :return: number of responses dropped
+        """
+        if self.cache is None:
+            return 0
+        return self.cache.invalidate(pattern)
+
+    def map_devices(self, method, device_ids, max_workers=10, **kwargs):
+        """
+        Run a per-device getter for many devices on a bounded thread pool
+        :param method: Getter name, e.g. 'get_arp_table', or bound method
+        :param device_ids: Iterable of device IDs
+        :param max_workers: Maximum number of concurrent requests
+        :param kwargs: Extra arguments passed to the getter
+        :return: generator of (device_id, Result) tuples in completion order
+        """
+        if not callable(method):
+            method = getattr(self, method)
+
+        def call(device_id):
+            try:
+                return method(device_id, **kwargs)[0]
+            except Exception as e:
+                return failed_result(e)
+
+        device_ids = iter(device_ids)
+        end = object()
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        pending = dict()
+
+        def submit():
+            device_id = next(device_ids, end)
+            if device_id is not end:
+                pending[executor.submit(call, device_id)] = device_id
+
+        try:
+            # Keep a bounded number of calls queued so results do not pile up
+            for i in range(max_workers * 2):
+                submit()
+            while pending:
+                done, not_done = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    device_id = pending.pop(future)
+                    submit()
+                    yield device_id, future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
     def login(self):
         """
         Login to vManage server
@@ -277,25 +800,73 @@ class Viptela(object):
         if login_result.response.text.startswith('<html>'):
             raise LoginCredentialsError('Could not login to device, check user credentials')
         else:
+            self._login_generation += 1
             return login_result
 
-    def firmware_upload(self, filename):
+    def get_software_images(self):
         """
-        Get software install status
+        Get the software images in the vManage repository
+        :return: Result named tuple
+        """
+        url = '{0}/device/action/software'.format(self.base_url)
+        return self._get(self.session, url)
+
+    def _uploaded_image(self, filename, version, images, md5):
+        """
+        Result for an image already in the vManage repository
+        :param filename: path of the image
+        :param version: software version of the image
+        :param images: Result of get_software_images
+        :param md5: Callable returning the MD5 of the image, see lazy_md5
+        :return: Result named tuple, or None if the image is not in the repository
+        """
+        if not images.ok or not isinstance(images.data, list):
+            return None
+        image = find_software_image(images.data, filename, version, md5=md5)
+        if image is None:
+            return None
+        return Result(ok=True, status_code=200, reason='Already uploaded', error='',
+                      data=image, response=None, text='')
+
+    def firmware_upload(self, filename, version=None, progress=None, skip_existing=True,
+                        attempts=1, timeout=(10, 3600)):
+        """
+        Upload a software image to the vManage repository, streamed from disk
+        :param filename: path of the image
+        :param version: software version of the image, used to find it in the repository
+        :param progress: Callable called with (bytes sent, total bytes, bytes per second) as the upload goes
+        :param skip_existing: Do not upload an image the repository already has
+        :param attempts: Number of times the upload is tried when the connection fails
+        :param timeout: (connect, read) timeout of the upload
         :return: Result named tuple
         """
-        files = {'file': open(filename)}
         url = '{0}/device/action/software/package'.format(self.base_url)
-        return self._upload(self.session, url, files)
+        body = MultipartFileStream(filename, progress=progress)
+        md5 = lazy_md5(filename)
+        try:
+            for attempt in range(attempts):
+                if skip_existing or attempt > 0:
+                    # After a failed attempt vManage may still have received the whole image
+                    uploaded = self._uploaded_image(filename, version, self.get_software_images()[0], md5)
+                    if uploaded is not None:
+                        return (uploaded, url, '')
+                body.rewind()
+                try:
+                    return self._upload_stream(self.session, url, body, timeout=timeout)
+                except (ConnectionError, Timeout):
+                    if attempt == attempts - 1:
+                        raise
+        finally:
+            body.close()
 
-    def activate(self, version, ip_address, device_uuid):
+    @staticmethod
+    def _activate_payload(version, devices):
         """
-        Change Partition
-        :return: Result named tuple
+        Change Partition payload
+        :param version: Software version to activate
+        :param devices: List of (ip_address, device_uuid) tuples
+        :return: payload dict
         """
-        #ip_array = ip_address.split(",")
-        #device_array = []
-        #devices=json.load(self.get_all_devices().data)
         payload={
             'action':'changepartition',
             'devices':[
@@ -304,20 +875,20 @@ class Viptela(object):
                     'deviceId':device_uuid,
                     'version':version
                 }
+                for ip_address, device_uuid in devices
             ],
             'deviceType':'vedge'
         }
-        url = '{0}/device/action/changepartition'.format(self.base_url)
-        return (self._post(self.session, url, data=json.dumps(payload)))
+        return payload
 
-    def upgrade(self, version, ip_address, device_uuid):
+    @staticmethod
+    def _upgrade_payload(version, devices):
         """
-        Upload firmware to device
-        :return: Result named tuple
+        Software install payload
+        :param version: Software version to install
+        :param devices: List of (ip_address, device_uuid) tuples
+        :return: payload dict
         """
-        #ip_array = ip_address.split(",")
-        #device_array = []
-        #devices=json.load(self.get_all_devices().data)
         payload={
             'action':'install',
             'input':{
@@ -333,12 +904,111 @@ class Viptela(object):
                     'deviceIP':ip_address,
                     'deviceId':device_uuid
                 }
+                for ip_address, device_uuid in devices
             ],
             'deviceType':'vedge'
         }
+        return payload
+
+    def activate(self, version, ip_address, device_uuid):
+        """
+        Change Partition
+        :return: Result named tuple
+        """
+        payload = self._activate_payload(version, [(ip_address, device_uuid)])
+        url = '{0}/device/action/changepartition'.format(self.base_url)
+        return (self._post(self.session, url, data=self.codec.dumps(payload)))
+
+    def upgrade(self, version, ip_address, device_uuid):
+        """
+        Upload firmware to device
+        :return: Result named tuple
+        """
+        payload = self._upgrade_payload(version, [(ip_address, device_uuid)])
         url = '{0}/device/action/install'.format(self.base_url)
-        return (self._post(self.session, url, data=json.dumps(payload)))
-            #, payload, self.session.cookies)
+        return (self._post(self.session, url, data=self.codec.dumps(payload)))
+
+    @staticmethod
+    def _action_devices(devices):
+        """
+        Normalise devices for a device action
+        :param devices: List of (ip_address, device_uuid) tuples, or dicts with deviceIP/system-ip and uuid/deviceId
+        :return: list of (ip_address, device_uuid) tuples
+        """
+        normalised = []
+        for device in devices:
+            if isinstance(device, dict):
+                # In /device records deviceId is the system IP, so it is only
+                # taken as the uuid of action payload style dicts without uuid
+                device = (device.get('deviceIP') or device.get('system-ip'),
+                          device.get('uuid') or device.get('deviceId'))
+            normalised.append(tuple(device))
+        return normalised
+
+    @staticmethod
+    def _installed_versions(result):
+        """
+        Running and installed software versions of vEdges
+        :param result: Result of check_firmware
+        :return: dict of device uuid to (running version, set of available versions)
+        """
+        versions = dict()
+        if result.ok and isinstance(result.data, list):
+            for device in result.data:
+                available = device.get('availableVersions') or []
+                versions[device.get('uuid')] = (device.get('version'), set(available))
+        return versions
+
+    def _device_action_waves(self, action, version, devices, chunk_size, firmware=None):
+        """
+        Split a device action into waves of many devices each
+        :param action: 'install' or 'changepartition'
+        :param version: Software version
+        :param devices: List of (ip_address, device_uuid) tuples, or device dicts
+        :param chunk_size: Maximum number of devices per request
+        :param firmware: Result of check_firmware used to skip devices already done, None to skip none
+        :return: list of (url, payload) tuples, one per wave
+        """
+        versions = self._installed_versions(firmware) if firmware is not None else dict()
+        if action == 'install':
+            build = self._upgrade_payload
+            done = lambda running, available: running == version or version in available
+        else:
+            build = self._activate_payload
+            done = lambda running, available: running == version
+
+        devices = [
+            device for device in self._action_devices(devices)
+            if not done(*versions.get(device[1], (None, ())))
+        ]
+        url = '{0}/device/action/{1}'.format(self.base_url, action)
+        return [(url, build(version, devices[i:i + chunk_size])) for i in range(0, len(devices), chunk_size)]
+
+    def upgrade_devices(self, version, devices, chunk_size=200, skip_installed=True):
+        """
+        Upload firmware to many devices, one request per wave of chunk_size devices
+        :param version: Software version to install
+        :param devices: List of (ip_address, device_uuid) tuples, or device dicts
+        :param chunk_size: Maximum number of devices per request
+        :param skip_installed: Skip devices that check_firmware shows already have the version
+        :return: list of (Result, url, payload) tuples, one per wave, whose data is the action ID
+        """
+        firmware = self.check_firmware()[0] if skip_installed else None
+        waves = self._device_action_waves('install', version, devices, chunk_size, firmware)
+        return [self._post(self.session, url, data=self.codec.dumps(payload)) for url, payload in waves]
+
+    def activate_devices(self, version, devices, chunk_size=200, skip_active=True):
+        """
+        Change Partition on many devices, one request per wave of chunk_size devices
+        :param version: Software version to activate
+        :param devices: List of (ip_address, device_uuid) tuples, or device dicts
+        :param chunk_size: Maximum number of devices per request
+        :param skip_active: Skip devices that check_firmware shows already run the version
+        :return: list of (Result, url, payload) tuples, one per wave, whose data is the action ID
+        """
+        firmware = self.check_firmware()[0] if skip_active else None
+        waves = self._device_action_waves('changepartition', version, devices, chunk_size, firmware)
+        return [self._post(self.session, url, data=self.codec.dumps(payload)) for url, payload in waves]
 
     def check_status(self, status_url):
         """
@@ -349,6 +1019,39 @@ class Viptela(object):
             status_url)
         return self._get(self.session, url)
 
+    def wait_for_jobs(self, action_ids, interval=2, max_interval=60, backoff=1.5, timeout=None, max_workers=4,
+                      max_errors=5):
+        """
+        Wait on device action jobs, such as those started by upgrade, activate or attach_feature_to_devices
+        :param action_ids: Action ID or list of action IDs
+        :param interval: Seconds between the first polls
+        :param max_interval: Maximum seconds between polls
+        :param backoff: Factor the interval grows by after a poll with no change
+        :param timeout: Seconds to wait before raising JobTimeoutError, None to wait forever
+        :param max_workers: Maximum number of concurrent status requests
+        :param max_errors: Consecutive failed status requests after which a job is failed, None to retry forever
+        :return: JobWaiter, iterate over it for per-device JobUpdate tuples or call wait()
+        """
+        return JobWaiter(self, action_ids, interval=interval, max_interval=max_interval, backoff=backoff,
+                         timeout=timeout, max_workers=max_workers, max_errors=max_errors)
+
+    def attach_template(self, template_id, template, chunk_size=100, max_workers=4, interval=2,
+                        max_interval=60, timeout=None, validate=True):
+        """
+        Attach a device template to many devices in concurrent chunks
+        :param template_id: Device template ID
+        :param template: List of device input dicts, or its Python-literal string
+        :param chunk_size: Maximum number of devices per attach request
+        :param max_workers: Maximum number of chunks submitted concurrently
+        :param interval: Seconds between the first job status polls
+        :param max_interval: Maximum seconds between job status polls
+        :param timeout: Seconds to wait for the jobs, None to wait forever
+        :param validate: Validate the input locally before sending it, raising TemplateValidationError
+        :return: TemplateAttach, call run() for a dict of device ID to AttachOutcome
+        """
+        return TemplateAttach(self, template_id, template, chunk_size=chunk_size, max_workers=max_workers,
+                              interval=interval, max_interval=max_interval, timeout=timeout, validate=validate)
+
     def check_firmware(self):
         """
         Get software install status
@@ -384,21 +1087,28 @@ class Viptela(object):
     def set_policy_in_template(self, template_id, template, policy_id):
         """
         Set Policy into Template
+        :param template_id: Device template ID
+        :param template: Device template definition dict, or its Python-literal string
+        :param policy_id: Policy ID
         :return: Result named tuple
         """
-        payload=ast.literal_eval(template)
+        payload = dict(template_input(template))
         payload["policyId"] = policy_id
 
         url = '{0}/template/device/{1}'.format(self.base_url,template_id)
-        return (self._put(self.session, url, data=json.dumps(payload)))
+        return (self._put(self.session, url, data=self.codec.dumps(payload)))
 
-    def set_policy_in_template2(self, template_id, template, policy_id):
+    def set_policy_in_template2(self, template_id, template, policy_id=None):
         """
         Set Policy into Template Intermediary Steps
+        :param template_id: Device template ID
+        :param template: List of device input dicts, or its Python-literal string
+        :param policy_id: Unused, kept for compatibility
         :return: Result named tuple
         """
-        template_dict = ast.literal_eval(template)
-        deviceIds=([(e['uuid']) for e in template_dict])
+        template_dict = template_input(template)
+        # Input from /template/device/config/input only has the uuid as csv-deviceId
+        deviceIds=[attach_device_id(e) for e in template_dict]
         payload={ 
             "deviceIds":deviceIds, 
             "isEdited": True,
@@ -407,52 +1117,68 @@ class Viptela(object):
         }
 
         url = '{0}/template/device/config/input/'.format(self.base_url)
-        return (self._post(self.session, url, data=json.dumps(payload)))
+        return (self._post(self.session, url, data=self.codec.dumps(payload)))
 
-    def set_policy_in_template3(self, template_id, template, policy_id):
+    def set_policy_in_template3(self, template_id, template, policy_id=None):
         """
         Set Policy into Template Intermediary Steps
+        :param template_id: Device template ID
+        :param template: List of device input dicts, or its Python-literal string
+        :param policy_id: Unused, kept for compatibility
         :return: Result named tuple
         """
-        template_dict = ast.literal_eval(template)
+        template_dict = template_input(template)
         array=['csv-deviceId','csv-deviceIP','csv-host-name']
-        devices=[{array[i]: e[array[i]] for i in range(0,len(array))} for e in template_dict]
+        devices=[{key: e[key] for key in array} for e in template_dict]
 
         payload={
             "device":devices
         }
 
         url = '{0}/template/device/config/duplicateip'.format(self.base_url)
-        return (self._post(self.session, url, data=json.dumps(payload)))
+        return (self._post(self.session, url, data=self.codec.dumps(payload)))
 
-    def attach_feature_to_devices(self, template_id, template, policy_id):
+    def attach_feature_to_devices(self, template_id, template, policy_id=None):
         """
         Attaches feature templates to devices
+        :param template_id: Device template ID
+        :param template: List of device input dicts, or its Python-literal string. The dicts are not modified.
+        :param policy_id: Unused, kept for compatibility
         :return: Result named tuple
         """
-        template_dict = ast.literal_eval(template)
-        #payload2=[{array[i]: e[array[i]] for i in range(0,3)} for e in template_dict]
-
-        #array=['csv-deviceId','csv-deviceIP','csv-host-name','csv-status']
-        #[template_dict[i].pop(array[j], 0) for j in range(0,len(array)) for i in range(0,len(template_dict))]
-
-        for i in range(0,len(template_dict)):
-          template_dict[i]["csv-templateId"]=template_id #for i in range(0,len(template_dict))
+        template_dict = template_input(template)
+        devices = [dict(e, **{"csv-templateId": template_id}) for e in template_dict]
 
         payload={
           "deviceTemplateList":[{
-            "device":template_dict,
+            "device":devices,
             "isEdited":True,
             "isMasterEdited":True,
             "templateId":template_id
           }]
         }
-        #payload = {'mode': 'on', 'bannerDetail': payload} #template_dict}
-        #url = '{0}/settings/configuration/banner'.format(self.base_url)
-        #return self._put(self.session, url, data=json.dumps(payload))
 
         url = '{0}/template/device/config/attachfeature'.format(self.base_url)
-        return (self._post(self.session, url, data=json.dumps(payload)))
+        return (self._post(self.session, url, data=self.codec.dumps(payload)))
+
+    def attach_devices_to_template(self, template_id, template, validate=True):
+        """
+        Run the config input, duplicate IP check and attach steps for a device
+        template, parsing the device list once and stopping at the first failed step
+        :param template_id: Device template ID
+        :param template: List of device input dicts, or its Python-literal string
+        :param validate: Validate the input locally before sending it, raising TemplateValidationError
+        :return: list of (Result, url, payload) tuples of the steps run
+        """
+        devices = template_input(template)
+        if validate:
+            check_template_input(devices)
+        steps = []
+        for step in (self.set_policy_in_template2, self.set_policy_in_template3, self.attach_feature_to_devices):
+            steps.append(step(template_id, devices))
+            if not steps[-1][0].ok:
+                break
+        return steps
 
     def delete_push_feature(self, status_url):
         """
@@ -464,7 +1190,7 @@ class Viptela(object):
 
         #payload = {'mode': 'on', 'bannerDetail': payload2}
         #url = '{0}/settings/configuration/banner'.format(self.base_url)
-        #return self._put(self.session, url, data=json.dumps(payload))
+        #return self._put(self.session, url, data=self.codec.dumps(payload))
         
         url = '{0}/template/lock/{1}'.format(self.base_url,status_url)
         return (self._delete(self.session, url))
@@ -485,7 +1211,7 @@ class Viptela(object):
         """
         payload = {'mode': 'on', 'bannerDetail': banner}
         url = '{0}/settings/configuration/banner'.format(self.base_url)
-        return self._put(self.session, url, data=json.dumps(payload))
+        return self._put(self.session, url, data=self.codec.dumps(payload))
 
     def get_device_by_type(self, device_type='vedges'):
         """
@@ -506,6 +1232,38 @@ class Viptela(object):
         url = '{0}/device'.format(self.base_url)
         return self._get(self.session, url)
 
+    def get_inventory(self, device_type=None):
+        """
+        Get devices as an indexed inventory
+        :param device_type: None for every device, or 'vedges' or 'controllers'
+        :return: DeviceInventory, call its refresh() to bring it up to date later
+        """
+        inventory = DeviceInventory(self)
+        inventory.refresh(device_type)
+        return inventory
+
+    def iter_all_devices(self):
+        """
+        Iterate over all devices without buffering the whole list
+        :return: generator of device dicts
+        """
+        url = '{0}/device'.format(self.base_url)
+        return self._get_stream(self.session, url)
+
+    def get_raw(self, url_path, stream=True, timeout=None):
+        """
+        GET an API path and return the response unparsed, e.g. to stream a
+        large body to disk. The request is retried, rate limited and guarded
+        by the circuit breaker like any other, but never cached.
+        :param url_path: path after /dataservice, e.g. '/template/config/running/<uuid>'
+        :param stream: Leave the body on the socket until it is read
+        :param timeout: Timeout for request response, defaults to the client timeout
+        :return: requests response object, close it once the body is read
+        """
+        url = '{0}{1}'.format(self.base_url, url_path)
+        return self._send(self.session, 'GET', url, headers=None, stream=stream,
+                          timeout=self.timeout if timeout is None else timeout)
+
     def get_running_config(self, device_uuid, attached=False):
         """
         Get running config of a device
@@ -554,6 +1312,15 @@ class Viptela(object):
         url = '{0}/device/bgp/routes?deviceId={1}'.format(self.base_url, device_id)
         return self._get(self.session, url)
 
+    def iter_bgp_routes(self, device_id):
+        """
+        Iterate over BGP routes without buffering the whole table
+        :param device_id: device ID
+        :return: generator of route dicts
+        """
+        url = '{0}/device/bgp/routes?deviceId={1}'.format(self.base_url, device_id)
+        return self._get_stream(self.session, url)
+
     def get_bgp_neighbours(self, device_id):
         """
         Get BGP neighbours
@@ -594,6 +1361,19 @@ class Viptela(object):
             url = '{0}/device/ospf/database?deviceId={1}'.format(self.base_url, device_id)
         return self._get(self.session, url)
 
+    def iter_ospf_database(self, device_id, summary=False):
+        """
+        Iterate over the OSPF database without buffering it whole
+        :param device_id: device ID
+        :param summary: get OSPF database summary
+        :return: generator of database entry dicts
+        """
+        if summary:
+            url = '{0}/device/ospf/databasesummary?deviceId={1}'.format(self.base_url, device_id)
+        else:
+            url = '{0}/device/ospf/database?deviceId={1}'.format(self.base_url, device_id)
+        return self._get_stream(self.session, url)
+
     def get_ospf_interfaces(self, device_id):
         """
         Get OSPF interfaces
@@ -737,6 +1517,14 @@ class Viptela(object):
             url = '{0}/template/feature'.format(self.base_url)
         return self._get(self.session, url)
 
+    def iter_template_feature(self):
+        """
+        Iterate over feature templates without buffering the whole list
+        :return: generator of feature template dicts
+        """
+        url = '{0}/template/feature'.format(self.base_url)
+        return self._get_stream(self.session, url)
+
     def get_device_interface(self, device_id):
         """
         Get device interface statistics
@@ -746,4 +1534,118 @@ class Viptela(object):
         url = '{0}/device/interface/?deviceId={1}'.format(self.base_url, device_id)
         return self._get(self.session, url)
 
+    def get_statistics(self, stat_type, query):
+        """
+        Run a statistics query, returning its first page
+        :param stat_type: Statistics type, e.g. 'interface', 'approute' or 'dpi'
+        :param query: Query dict, see statistics_query
+        :return: Result named tuple, whose document holds the pageInfo with the scroll ID
+        """
+        url = '{0}/statistics/{1}'.format(self.base_url, stat_type)
+        return self._post(self.session, url, data=self.codec.dumps(query))
 
+    def get_statistics_page(self, stat_type, query, scroll_id):
+        """
+        Get the next page of a statistics query
+        :param stat_type: Statistics type
+        :param query: Query dict the scroll was started with
+        :param scroll_id: Scroll ID from the pageInfo of the previous page
+        :return: Result named tuple
+        """
+        url = '{0}/statistics/{1}/page?scrollId={2}'.format(self.base_url, stat_type, quote(scroll_id, safe=''))
+        return self._post(self.session, url, data=self.codec.dumps(query))
+
+    def iter_statistics(self, stat_type, start, end, conditions=None, page_size=STATISTICS_PAGE_SIZE,
+                        prefetch=True):
+        """
+        Iterate over the entries of a statistics query, following its scroll
+        across pages. The next page is fetched while the current one is consumed.
+        :param stat_type: Statistics type, e.g. 'interface', 'approute' or 'dpi'
+        :param start: Start of the range, seconds since the epoch, UTC datetime or formatted string
+        :param end: End of the range
+        :param conditions: Dict of field to value or list of values the entries must have
+        :param page_size: Entries per page
+        :param prefetch: Fetch the next page in the background
+        :return: generator of entry dicts
+        """
+        query = statistics_query(start, end, conditions, size=page_size)
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        try:
+            result = self.get_statistics(stat_type, query)[0]
+            while True:
+                if not result.ok:
+                    raise ResponseError(
+                        'Statistics query of {0} failed with status {1}'.format(stat_type, result.status_code),
+                        result
+                    )
+                scroll_id, more = page_info(result)
+                rows = result.data if isinstance(result.data, list) else []
+                more = more and bool(rows)
+                if more:
+                    pending = executor.submit(self.get_statistics_page, stat_type, query, scroll_id) \
+                        if executor is not None else None
+                for row in rows:
+                    yield row
+                if not more:
+                    return
+                if pending is not None:
+                    result = pending.result()[0]
+                else:
+                    result = self.get_statistics_page(stat_type, query, scroll_id)[0]
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+    def iter_statistics_ranges(self, stat_type, start, end, parts=4, conditions=None,
+                               page_size=STATISTICS_PAGE_SIZE, max_workers=None):
+        """
+        Iterate over the entries of a statistics query split into sub-ranges
+        queried in parallel. Entries come in no particular order.
+        :param stat_type: Statistics type, e.g. 'interface', 'approute' or 'dpi'
+        :param start: Start of the range, seconds since the epoch or UTC datetime
+        :param end: End of the range
+        :param parts: Number of sub-ranges
+        :param conditions: Dict of field to value or list of values the entries must have
+        :param page_size: Entries per page
+        :param max_workers: Maximum number of sub-ranges queried at once, defaults to parts
+        :return: generator of entry dicts
+        """
+        ranges = split_range(start, end, parts)
+        rows = Queue(maxsize=page_size * 2)
+        stop = threading.Event()
+        end_of_range = object()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    rows.put(item, timeout=0.5)
+                    return True
+                except Full:
+                    pass
+            return False
+
+        def query(sub_range):
+            try:
+                for row in self.iter_statistics(stat_type, sub_range[0], sub_range[1], conditions, page_size):
+                    if not put(row):
+                        return
+            except Exception as e:
+                put(_RangeError(e))
+            put(end_of_range)
+
+        executor = ThreadPoolExecutor(max_workers=max_workers or len(ranges))
+        try:
+            for sub_range in ranges:
+                executor.submit(query, sub_range)
+            remaining = len(ranges)
+            while remaining:
+                row = rows.get()
+                if row is end_of_range:
+                    remaining -= 1
+                elif isinstance(row, _RangeError):
+                    raise row.error
+                else:
+                    yield row
+        finally:
+            stop.set()
+            executor.shutdown(wait=False)